@@ -0,0 +1,520 @@
+# async_node.py
+"""
+Modo de ejecución asíncrono (asyncio + aiohttp) para QuorumNode.
+
+AsyncQuorumNode sirve las mismas rutas con la misma semántica que el servidor WSGI, pero cada
+solicitud de cliente es una corrutina en lugar de un hilo: el reparto a las réplicas usa un
+cliente HTTP asíncrono con conexiones persistentes y un tope de conexiones por par, por lo que
+un solo proceso puede atender miles de solicitudes concurrentes en un núcleo.
+
+La lógica de quórum, Read Repair, Hinted Handoff y anti-entropía es la de QuorumNode (los
+métodos start_*, *_tracker y resolve_*); los servicios de fondo (heartbeats, entrega de hints,
+anti-entropía) siguen en sus hilos con el transporte síncrono.
+
+Requiere aiohttp (`pip install aiohttp`). Uso:
+    python quorum_consistency.py --id 1 --port 5001 --peers 5002,5003 --server async
+"""
+import time
+import asyncio
+from urllib.parse import urlencode
+
+from aiohttp import web, ClientError, ClientSession, ClientTimeout, TCPConnector
+
+from quorum_consistency import QuorumNode, record_peer_rpc, SCAN_DEFAULT_LIMIT, BOOTSTRAP_CHUNK_SIZE
+from replica_selection import HedgePlan
+from binary_protocol import BinaryTransport, TRANSPORT_ERRORS
+from storage_engine import DictStorage
+
+
+class AsyncPeerTransport:
+    """
+    Versión asíncrona de PeerTransport: una sola sesión aiohttp con hasta `pool_size`
+    conexiones persistentes por par (las solicitudes que exceden el tope esperan una libre).
+    """
+    def __init__(self, pool_size=16, host="localhost", metrics=None, latency=None):
+        self.pool_size = pool_size
+        self.host = host
+        self.metrics = metrics
+        self.latency = latency
+        self.session = None
+
+    async def start(self):
+        # limit=0: sin tope global, solo el tope por (host, puerto)
+        connector = TCPConnector(limit=0, limit_per_host=self.pool_size)
+        self.session = ClientSession(connector=connector)
+
+    async def request(self, method, port, path, timeout=3, json=None):
+        """Retorna (código HTTP, cuerpo JSON si es 200 o texto en otro caso)."""
+        started = time.perf_counter()
+        failed = True
+        try:
+            async with self.session.request(
+                method, f"http://{self.host}:{port}{path}", json=json, timeout=ClientTimeout(total=timeout)
+            ) as response:
+                failed = response.status >= 500
+                if response.status == 200:
+                    return response.status, await response.json(content_type=None)
+                return response.status, await response.text()
+        finally:
+            if self.metrics is not None:
+                record_peer_rpc(self.metrics, port, path, time.perf_counter() - started, failed, self.latency)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+class AsyncQuorumNode(QuorumNode):
+    """QuorumNode servido por aiohttp: mismas rutas y semántica, sin un hilo por solicitud."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.async_transport = AsyncPeerTransport(pool_size=self.transport.pool_size, metrics=self.metrics, latency=self.latency)
+        # Con el motor en memoria las operaciones locales son inmediatas; con el durable
+        # (que espera el fsync del group commit) o con valores movidos a disco se ejecutan
+        # fuera del bucle de eventos
+        self.inline_store = self.store_is_inline()
+        # Solicitudes a pares que siguen en curso tras alcanzar el quórum (referencias fuertes)
+        self.background_tasks = set()
+        # Con transport='binary', cliente y servidor del protocolo binario en el bucle de aiohttp
+        # (self.binary, en su propio hilo, queda para los servicios de fondo síncronos)
+        self.async_binary = None
+
+        self.web_app = web.Application(middlewares=[self.metrics_middleware])
+        self.web_app.on_startup.append(lambda app: self.async_transport.start())
+        self.web_app.on_cleanup.append(lambda app: self.async_transport.close())
+        if self.binary is not None:
+            self.web_app.on_startup.append(self.start_binary)
+        self.setup_async_routes()
+
+    async def start_binary(self, app):
+        self.async_binary = BinaryTransport(asyncio.get_running_loop(), self.binary_port_offset, on_rpc=self.record_binary_rpc)
+        server = self.binary_server()
+        await server.start()
+        app.on_cleanup.append(lambda app: server.close())
+        print(f"[{self.node_id}] Protocolo binario entre nodos en el puerto {self.port + self.binary_port_offset}.")
+
+    async def local(self, func, *args):
+        """Ejecuta una operación sobre el almacén local sin bloquear el bucle de eventos."""
+        if self.inline_store:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.rpc_executor, func, *args)
+
+    def handle_hinted_handoff(self, key, value, timestamp, write_results):
+        """Los hints se escriben en disco: se registran desde el executor de hints, no desde el bucle."""
+        if any(r.get("status") == "error" for r in write_results):
+            self.hint_executor.submit(super().handle_hinted_handoff, key, value, timestamp, write_results)
+
+    # --- Reparto asíncrono a las réplicas ---
+    async def gather_until_async(self, coroutines, on_result, is_done, on_late_result=None, normalize=None, hedge=None):
+        """Versión asíncrona de gather_until: las solicitudes son corrutinas ({puerto: corrutina})."""
+        normalize = normalize or (lambda port, result: result)
+        if not coroutines:
+            return
+
+        task_to_port = {asyncio.ensure_future(coroutine): port for port, coroutine in coroutines.items()}
+
+        def result_of(task):
+            port = task_to_port[task]
+            try:
+                return normalize(port, task.result())
+            except Exception as e:
+                print(f"Error comunicando con nodo en puerto {port}: {e}")
+                return normalize(port, None)
+
+        pending = set(task_to_port)
+        pending_ports = lambda: {task_to_port[t] for t in pending}
+        reachable_ports = lambda launches=(): hedge.reachable(pending_ports(), launches) if hedge else pending_ports()
+
+        def launch(launches):
+            if launches and not is_done(reachable_ports(launches)):
+                for spare, replaced in launches:
+                    task = asyncio.ensure_future(hedge.make_task(spare, replaced))
+                    task_to_port[task] = spare
+                    pending.add(task)
+
+        if hedge:
+            hedge.start(coroutines.keys(), time.monotonic())
+        while pending and not is_done(reachable_ports()):
+            timeout = hedge.timeout(pending_ports(), time.monotonic()) if hedge else None
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            # Primero se cuentan todas las respuestas llegadas: una reserva solo se descarta si el
+            # quórum ya no la necesita, contando los aciertos que llegaron junto con el fallo
+            answered = [(task_to_port[task], result_of(task)) for task in done]
+            for port, result in answered:
+                on_result(port, result)
+            if hedge:
+                for port, result in answered:
+                    launch(hedge.on_result(port, result, pending_ports()))
+                launch(hedge.due(pending_ports(), time.monotonic()))
+
+        # Los rezagados alimentan Read Repair / Hinted Handoff cuando terminan
+        for task in pending:
+            self.background_tasks.add(task)
+            task.add_done_callback(self.background_tasks.discard)
+            task.add_done_callback(
+                lambda t: on_late_result(result_of(t)) if on_late_result else None
+            )
+
+    async def read_from_peers_async(self, key, required=None, on_late_result=None, digest=False):
+        results, contact, spares, remote_required = await self.local(self.start_read, key, required)
+        data_port = self.plan_digest_read(results, contact) if digest else None
+        is_ack = lambda r: r is not None and "error" not in r
+        hedge = HedgePlan(
+            spares,
+            lambda spare, replaced: self.read_from_node_async(spare, key, digest=digest and replaced != data_port),
+            is_ack, self.latency, self.metrics, hedging=self.hedging
+        )
+        remote, on_result, is_done = self.quorum_tracker(remote_required, is_ack=is_ack)
+        await self.gather_until_async(
+            {port: self.read_from_node_async(port, key, digest=digest and port != data_port) for port in contact},
+            on_result, is_done, on_late_result, hedge=hedge
+        )
+        results.extend(remote)
+        results = [r for r in results if r is not None]
+        return await self.resolve_digests_async(key, results) if digest else results
+
+    async def resolve_digests_async(self, key, results):
+        """Versión asíncrona de resolve_digests."""
+        while True:
+            stale = self.pending_refetch(results)
+            if stale is None:
+                return results
+            self.metrics.inc("digest_mismatches_total")
+            full = await self.read_from_node_async(stale["node_id"], key)
+            results = [r for r in results if r is not stale]
+            if full and "error" not in full:
+                results.append(full)
+
+    async def write_to_peers_async(self, key, value, timestamp, required=None, on_late_result=None):
+        results, contact, remote_required = await self.local(self.start_write, key, value, timestamp, required)
+        remote, on_result, is_done = self.quorum_tracker(remote_required, is_ack=lambda r: r.get("status") == "success")
+        await self.gather_until_async(
+            {port: self.write_to_node_async(port, key, value, timestamp) for port in contact},
+            on_result, is_done, on_late_result, normalize=self.normalize_write_result
+        )
+        results.extend(remote)
+        return results
+
+    async def read_batch_from_peers_async(self, keys, required, on_late_result=None):
+        results, acks, keys_by_port = await self.local(self.start_batch_read, keys, required)
+        remote, on_result, is_done = self.batch_quorum_tracker(keys_by_port, acks, required, is_ack=lambda r: "error" not in r)
+        await self.gather_until_async(
+            {port: self.read_batch_from_node_async(port, port_keys) for port, port_keys in keys_by_port.items()},
+            on_result, is_done, on_late_result,
+            normalize=lambda port, result: self.normalize_batch_read_result(port, keys_by_port[port], result)
+        )
+        for key, key_results in remote.items():
+            results[key].extend(r for r in key_results if r is not None)
+        return results
+
+    async def write_batch_to_peers_async(self, items, required, on_late_result=None):
+        results, acks, keys_by_port = await self.local(self.start_batch_write, items, required)
+        remote, on_result, is_done = self.batch_quorum_tracker(keys_by_port, acks, required, is_ack=lambda r: r.get("status") == "success")
+        await self.gather_until_async(
+            {port: self.write_batch_to_node_async(port, {k: items[k] for k in port_keys})
+             for port, port_keys in keys_by_port.items()},
+            on_result, is_done, on_late_result,
+            normalize=lambda port, result: self.normalize_batch_write_result(port, keys_by_port[port], result)
+        )
+        for key, key_results in remote.items():
+            results[key].extend(key_results)
+        return results
+
+    async def scan_from_peers_async(self, start, end, limit):
+        responses, contact = await self.local(self.start_scan, start, end, limit)
+        await self.gather_until_async(
+            {port: self.scan_from_node_async(port, start, end, limit) for port in contact},
+            on_result=responses.__setitem__,
+            is_done=lambda pending_ports: False
+        )
+        return responses
+
+    # --- Solicitudes a un par (mismos resultados que las versiones síncronas) ---
+    async def read_from_node_async(self, port, key, digest=False):
+        if self.async_binary is not None:
+            try:
+                status, body = await self.async_binary.request(port, "read_request", [key, digest])
+            except TRANSPORT_ERRORS:
+                return None
+            if status == 200:
+                body["node_id"] = port
+                return body
+            return {"error": body, "node_id": port, "timestamp": 0}
+        try:
+            status, body = await self.async_transport.request("GET", port, f"/read_request/{key}" + ("?digest=1" if digest else ""))
+        except (ClientError, asyncio.TimeoutError):
+            return None # El nodo está caído
+        if status == 200:
+            body["node_id"] = port
+            return body
+        return {"error": body, "node_id": port, "timestamp": 0}
+
+    async def write_to_node_async(self, port, key, value, timestamp):
+        if self.async_binary is not None:
+            try:
+                status, body = await self.async_binary.request(
+                    port, "write_request", [{"key": key, "value": value, "timestamp": timestamp}]
+                )
+            except TRANSPORT_ERRORS:
+                return None
+            return body if status == 200 else {"status": "error", "message": body}
+        try:
+            status, body = await self.async_transport.request(
+                "POST", port, "/write_request", json={"key": key, "value": value, "timestamp": timestamp}
+            )
+        except (ClientError, asyncio.TimeoutError):
+            return None
+        if status == 200:
+            return body
+        return {"status": "error", "message": body}
+
+    async def scan_from_node_async(self, port, start, end, limit):
+        query = urlencode({name: value for name, value in (("start", start), ("end", end), ("limit", limit)) if value is not None})
+        try:
+            status, body = await self.async_transport.request("GET", port, f"/scan_request?{query}")
+        except (ClientError, asyncio.TimeoutError):
+            return None
+        return body if status == 200 else {"error": body}
+
+    async def read_batch_from_node_async(self, port, keys):
+        try:
+            status, body = await self.async_transport.request("POST", port, "/read_request_batch", json={"keys": keys})
+        except (ClientError, asyncio.TimeoutError):
+            return None
+        return body if status == 200 else {"error": body}
+
+    async def write_batch_to_node_async(self, port, items):
+        try:
+            status, body = await self.async_transport.request(
+                "POST", port, "/write_request_batch",
+                json={"items": [{"key": k, "value": v, "timestamp": t} for k, (v, t) in items.items()]}
+            )
+        except (ClientError, asyncio.TimeoutError):
+            return None
+        return body if status == 200 else {"status": "error", "message": body}
+
+    # --- Rutas ---
+    async def read_json(self, request):
+        """Cuerpo JSON de la solicitud ({} si no hay cuerpo)."""
+        if not request.can_read_body:
+            return {}
+        try:
+            return await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text="Invalid JSON body")
+
+    @web.middleware
+    async def metrics_middleware(self, request, handler):
+        """Latencia por ruta; la plantilla se escribe como en Flask (/get/<key>) para que ambos modos coincidan."""
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            resource = request.match_info.route.resource
+            route = resource.canonical.replace("{", "<").replace("}", ">") if resource else "unmatched"
+            self.record_request(route, status, time.perf_counter() - started)
+
+    def setup_async_routes(self):
+
+        async def home(request):
+            return web.Response(text=self.describe())
+
+        async def ring_info(request):
+            return web.json_response(self.ring_info(request.query.get('key')))
+
+        async def client_read(request):
+            key = request.match_info['key']
+            level = request.query.get('consistency', 'QUORUM').upper()
+            required_r = self.get_required_quorum_size(level, 'read')
+            digest = request.query.get('read_mode', self.read_mode) == 'digest'
+            late_state = self.new_late_state()
+            with self.metrics.timer("quorum_wait_seconds", op="read", level=level):
+                results = await self.read_from_peers_async(
+                    key,
+                    required=required_r,
+                    on_late_result=lambda result: self.handle_late_read(late_state, result),
+                    digest=digest
+                )
+            payload, status = self.resolve_read(key, level, required_r, results, late_state)
+            return web.json_response(payload, status=status)
+
+        async def client_write(request):
+            data = await self.read_json(request)
+            key = data.get('key')
+            value = data.get('value')
+            level = data.get('consistency', 'QUORUM').upper()
+            if not key or not value:
+                return web.json_response({"error": "Missing key or value in request"}, status=400)
+
+            timestamp = time.time()
+            try:
+                value = self.stored_value(value, data.get('ttl'), timestamp)
+            except ValueError as e:
+                return web.json_response({"error": str(e)}, status=400)
+            required_w = self.get_required_quorum_size(level, 'write')
+            with self.metrics.timer("quorum_wait_seconds", op="write", level=level):
+                results = await self.write_to_peers_async(
+                    key, value, timestamp,
+                    required=required_w,
+                    on_late_result=lambda result: self.handle_hinted_handoff(key, value, timestamp, [result])
+                )
+            payload, status = self.resolve_write(key, value, timestamp, level, required_w, results)
+            return web.json_response(payload, status=status)
+
+        async def client_delete(request):
+            key = request.match_info['key']
+            level = request.query.get('consistency', 'QUORUM').upper()
+            timestamp = time.time()
+            required_w = self.get_required_quorum_size(level, 'write')
+            with self.metrics.timer("quorum_wait_seconds", op="delete", level=level):
+                results = await self.write_to_peers_async(
+                    key, None, timestamp,
+                    required=required_w,
+                    on_late_result=lambda result: self.handle_hinted_handoff(key, None, timestamp, [result])
+                )
+            payload, status = self.resolve_write(key, None, timestamp, level, required_w, results)
+            return web.json_response(payload, status=status)
+
+        async def client_multi_read(request):
+            data = await self.read_json(request)
+            keys = data.get('keys') or [k for k in request.query.get('keys', '').split(',') if k]
+            level = (data.get('consistency') or request.query.get('consistency', 'QUORUM')).upper()
+            if not keys:
+                return web.json_response({"error": "Missing keys in request"}, status=400)
+
+            keys = list(dict.fromkeys(keys))
+            required_r = self.get_required_quorum_size(level, 'read')
+            late_states = {key: self.new_late_state() for key in keys}
+            with self.metrics.timer("quorum_wait_seconds", op="mget", level=level):
+                results = await self.read_batch_from_peers_async(keys, required_r, on_late_result=self.late_batch_read_handler(late_states))
+            payload, status = self.resolve_batch_read(keys, level, required_r, results, late_states)
+            return web.json_response(payload, status=status)
+
+        async def client_multi_write(request):
+            data = await self.read_json(request)
+            level = data.get('consistency', 'QUORUM').upper()
+            raw_items = data.get('items') or []
+            if not raw_items:
+                return web.json_response({"error": "Missing items in request"}, status=400)
+
+            items, response, timestamp = self.parse_batch_write(raw_items)
+            required_w = self.get_required_quorum_size(level, 'write')
+            with self.metrics.timer("quorum_wait_seconds", op="mput", level=level):
+                results = await self.write_batch_to_peers_async(
+                    items, required_w, on_late_result=self.late_batch_write_handler(items, timestamp)
+                ) if items else {}
+            payload, status = self.resolve_batch_write(items, timestamp, level, required_w, results, response)
+            return web.json_response(payload, status=status)
+
+        async def client_scan(request):
+            level = request.query.get('consistency', 'QUORUM').upper()
+            try:
+                start, end, limit = self.parse_scan(request.query)
+            except ValueError as e:
+                return web.json_response({"error": str(e)}, status=400)
+            required_r = self.get_required_quorum_size(level, 'read')
+            with self.metrics.timer("quorum_wait_seconds", op="scan", level=level):
+                responses = await self.scan_from_peers_async(start, end, limit)
+            payload, status = self.resolve_scan(level, required_r, limit, responses)
+            return web.json_response(payload, status=status)
+
+        async def metrics(request):
+            if request.query.get('format') == 'prometheus':
+                return web.Response(text=self.metrics_view(prometheus=True), content_type="text/plain")
+            return web.json_response(self.metrics_view())
+
+        async def heartbeat(request):
+            return web.json_response({"node_id": self.node_id, "port": self.port})
+
+        async def health(request):
+            return web.json_response({"node_id": self.node_id, "peers": self.failure_detector.table(), "read_latency": self.latency.table()})
+
+        async def anti_entropy_hashes(request):
+            data = await self.read_json(request)
+            return web.json_response({"hashes": self.merkle.hashes_for(data["peer"], data["indices"])})
+
+        async def anti_entropy_bucket(request):
+            data = await self.read_json(request)
+            return web.json_response(await self.local(self.anti_entropy_exchange, data["peer"], data["buckets"]))
+
+        async def read_request(request):
+            payload, status = await self.local(self.local_read, request.match_info['key'], request.query.get('digest') == '1')
+            return web.json_response(payload, status=status)
+
+        async def write_request(request):
+            payload, status = await self.local(self.local_write, await self.read_json(request))
+            return web.json_response(payload, status=status)
+
+        async def scan_request(request):
+            limit = int(request.query.get('limit', SCAN_DEFAULT_LIMIT))
+            return web.json_response(await self.local(self.local_scan, request.query.get('start'), request.query.get('end'), limit))
+
+        async def stats(request):
+            return web.json_response(await self.local(self.storage_stats))
+
+        async def bootstrap(request):
+            if request.method == 'POST':
+                data = await self.read_json(request) if request.can_read_body else {}
+                payload, status = self.start_bootstrap(data.get('sources'))
+            else:
+                payload, status = self.bootstrap_status()
+            return web.json_response(payload, status=status)
+
+        async def bootstrap_snapshot(request):
+            sources = [int(port) for port in request.query.get('sources', '').split(',') if port]
+            payload = await asyncio.get_running_loop().run_in_executor(
+                self.rpc_executor, self.snapshot_chunk, int(request.query['target']), sources,
+                request.query.get('after'), int(request.query.get('limit', BOOTSTRAP_CHUNK_SIZE))
+            )
+            return web.json_response(payload)
+
+        async def read_request_batch(request):
+            data = await self.read_json(request)
+            return web.json_response(await self.local(self.local_read_batch, data.get('keys', [])))
+
+        async def write_request_batch(request):
+            data = await self.read_json(request)
+            return web.json_response(await self.local(self.local_write_batch, data.get('items', [])))
+
+        self.web_app.add_routes([
+            web.get('/', home),
+            web.get('/ring', ring_info),
+            web.get('/get/{key}', client_read),
+            web.post('/put', client_write),
+            web.delete('/delete/{key}', client_delete),
+            web.get('/mget', client_multi_read),
+            web.post('/mget', client_multi_read),
+            web.post('/mput', client_multi_write),
+            web.get('/scan', client_scan),
+            web.get('/metrics', metrics),
+            web.get('/heartbeat', heartbeat),
+            web.get('/health', health),
+            web.get('/stats', stats),
+            web.get('/bootstrap', bootstrap),
+            web.post('/bootstrap', bootstrap),
+            web.get('/bootstrap/snapshot', bootstrap_snapshot),
+            web.post('/anti_entropy/hashes', anti_entropy_hashes),
+            web.post('/anti_entropy/bucket', anti_entropy_bucket),
+            web.get('/read_request/{key}', read_request),
+            web.post('/write_request', write_request),
+            web.get('/scan_request', scan_request),
+            web.post('/read_request_batch', read_request_batch),
+            web.post('/write_request_batch', write_request_batch),
+        ])
+
+    def run(self, bootstrap=False):
+        if bootstrap:
+            self.start_bootstrap(delay=4 * self.heartbeat_interval)
+        try:
+            web.run_app(
+                self.web_app, host='0.0.0.0', port=self.port, backlog=1024, access_log=None,
+                print=lambda _: print(f"[{self.node_id}] Servidor asíncrono (aiohttp) escuchando en el puerto {self.port}.")
+            )
+        finally:
+            self.close()
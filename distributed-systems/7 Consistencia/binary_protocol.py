@@ -0,0 +1,231 @@
+# binary_protocol.py
+"""
+Protocolo binario entre nodos para el camino caliente de QuorumNode (read_request / write_request).
+
+Cada mensaje es un frame con prefijo de longitud sobre una conexión TCP persistente:
+    [4 bytes: longitud del payload, big-endian][payload]
+El payload se codifica con msgpack si está instalado (`pip install msgpack`) y si no con JSON
+compacto; el códec se negocia una vez por conexión con un frame de saludo en JSON.
+
+    solicitud: [id, operación, argumentos]      respuesta: [id, código, cuerpo]
+
+Los ids permiten multiplexar muchas solicitudes en curso sobre una sola conexión por par:
+el servidor puede responder en cualquier orden y el cliente asocia cada respuesta a su
+solicitud por el id. Los códigos y cuerpos son los mismos que los de las rutas HTTP internas.
+
+Las rutas de cliente y el resto del tráfico entre nodos (heartbeats, lotes, hints,
+anti-entropía) siguen en HTTP.
+"""
+import json
+import struct
+import asyncio
+import itertools
+import threading
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+HEADER = struct.Struct(">I")
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+# {nombre: (codificar, decodificar)}
+CODECS = {
+    "json": (lambda obj: json.dumps(obj, separators=(",", ":")).encode(), json.loads),
+}
+if msgpack is not None:
+    CODECS["msgpack"] = (lambda obj: msgpack.packb(obj, use_bin_type=True), lambda data: msgpack.unpackb(data, raw=False))
+# Orden de preferencia al negociar
+PREFERRED_CODECS = [name for name in ("msgpack", "json") if name in CODECS]
+
+# Errores de transporte: el par no está disponible (equivalen a un RequestException en HTTP)
+TRANSPORT_ERRORS = (OSError, EOFError, asyncio.TimeoutError)
+
+
+def frame(payload):
+    return HEADER.pack(len(payload)) + payload
+
+
+async def read_frame(reader):
+    (size,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if size > MAX_FRAME_BYTES:
+        raise ConnectionError(f"Frame de {size} bytes excede el máximo permitido")
+    return await reader.readexactly(size)
+
+
+def start_loop_thread(name):
+    """Bucle de eventos en un hilo propio, para usar el protocolo desde código síncrono."""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name=name, daemon=True).start()
+    return loop
+
+
+class BinaryServer:
+    """
+    Atiende el protocolo binario. `handlers` = {operación: función(*args) -> (cuerpo, código)}.
+    Con `inline` las operaciones se ejecutan en el bucle de eventos (almacén en memoria);
+    si no, en `executor`, y varias solicitudes de una conexión avanzan en paralelo.
+    """
+    def __init__(self, handlers, port, host="0.0.0.0", inline=True, executor=None):
+        self.handlers = handlers
+        self.host = host
+        self.port = port
+        self.inline = inline
+        self.executor = executor
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.serve, self.host, self.port, backlog=1024)
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def dispatch(self, request_id, op, args):
+        handler = self.handlers.get(op)
+        if handler is None:
+            return [request_id, 400, {"error": f"Operación desconocida: {op}"}]
+        try:
+            body, status = handler(*args)
+        except Exception as e:
+            return [request_id, 500, {"error": str(e)}]
+        return [request_id, status, body]
+
+    async def serve(self, reader, writer):
+        in_flight = set()   # referencias fuertes a las solicitudes que corren en el executor
+        try:
+            hello = json.loads(await read_frame(reader))
+            codec = next((name for name in PREFERRED_CODECS if name in hello.get("codecs", [])), "json")
+            writer.write(frame(json.dumps({"codec": codec}).encode()))
+            encode, decode = CODECS[codec]
+
+            while True:
+                request_id, op, args = decode(await read_frame(reader))
+                if self.inline:
+                    writer.write(frame(encode(self.dispatch(request_id, op, args))))
+                    await writer.drain()
+                else:
+                    task = asyncio.ensure_future(self.dispatch_in_executor(writer, encode, request_id, op, args))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass # El par cerró la conexión o el servidor se está deteniendo
+        except Exception as e:
+            print(f"Error en conexión binaria entrante: {e}")
+        finally:
+            writer.close()
+
+    async def dispatch_in_executor(self, writer, encode, request_id, op, args):
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(self.executor, self.dispatch, request_id, op, args)
+        if not writer.is_closing():
+            writer.write(frame(encode(response)))
+            await writer.drain()
+
+
+class BinaryConnection:
+    """Conexión persistente a un par: muchas solicitudes en curso, respuestas asociadas por id."""
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.ids = itertools.count()
+        self.pending = {}        # {id: future}
+        self.writer = None
+        self.reader_task = None
+        self.encode = self.decode = None
+        self.connect_lock = asyncio.Lock()
+
+    async def connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(frame(json.dumps({"codecs": PREFERRED_CODECS}).encode()))
+            reply = json.loads(await read_frame(reader))
+            self.encode, self.decode = CODECS[reply["codec"]]
+        except BaseException:
+            writer.close()
+            raise
+        self.writer = writer
+        self.reader_task = asyncio.ensure_future(self.read_responses(reader, writer))
+
+    async def request(self, op, args, timeout=3):
+        """Retorna (código, cuerpo). Lanza uno de TRANSPORT_ERRORS si el par no responde."""
+        if self.writer is None:
+            async with self.connect_lock:
+                if self.writer is None:
+                    await asyncio.wait_for(self.connect(), timeout)
+        writer = self.writer
+        if writer is None:
+            raise ConnectionError(f"Conexión con el puerto {self.port} perdida")
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            writer.write(frame(self.encode([request_id, op, args])))
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def read_responses(self, reader, writer):
+        error = ConnectionError(f"Conexión con el puerto {self.port} cerrada")
+        try:
+            while True:
+                request_id, status, body = self.decode(await read_frame(reader))
+                future = self.pending.pop(request_id, None)
+                if future is not None and not future.done():
+                    future.set_result((status, body))
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            error = ConnectionError(f"Conexión con el puerto {self.port} perdida: {e}")
+        except Exception as e:
+            error = ConnectionError(f"Respuesta inválida del puerto {self.port}: {e}")
+        finally:
+            # Se descarta la conexión (la próxima solicitud reconecta) y fallan las solicitudes en curso
+            if self.writer is writer:
+                self.writer = None
+            writer.close()
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.pending.clear()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class BinaryTransport:
+    """
+    Cliente del protocolo binario: una conexión por par, en el puerto HTTP del par + `port_offset`.
+    Las conexiones viven en `loop` (p. ej. el de aiohttp); las llamadas síncronas (`call`) se
+    despachan a ese bucle desde otros hilos. `on_rpc(port, op, segundos, falló)` registra métricas.
+    """
+    def __init__(self, loop, port_offset, host="localhost", on_rpc=None):
+        self.loop = loop
+        self.port_offset = port_offset
+        self.host = host
+        self.on_rpc = on_rpc
+        self.connections = {}
+
+    async def request(self, port, op, args, timeout=3):
+        connection = self.connections.get(port)
+        if connection is None:
+            connection = self.connections[port] = BinaryConnection(self.host, port + self.port_offset)
+        started = self.loop.time()
+        failed = True
+        try:
+            status, body = await connection.request(op, args, timeout)
+            failed = status >= 500
+            return status, body
+        finally:
+            if self.on_rpc is not None:
+                self.on_rpc(port, op, self.loop.time() - started, failed)
+
+    def call(self, port, op, args, timeout=3):
+        """Versión síncrona de `request` (no debe llamarse desde el hilo del bucle)."""
+        return asyncio.run_coroutine_threadsafe(self.request(port, op, args, timeout), self.loop).result()
+
+    def close(self):
+        for connection in self.connections.values():
+            self.loop.call_soon_threadsafe(connection.close)
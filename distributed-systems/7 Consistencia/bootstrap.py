@@ -0,0 +1,117 @@
+# bootstrap.py
+"""
+Bootstrap por snapshot para una réplica de QuorumNode que arranca vacía o perdió su disco.
+
+El nodo nuevo pide a cada fuente (pares sanos) su parte del snapshot en trozos ordenados por
+clave: cada clave que le corresponde se pide a una sola fuente (la primera de sus réplicas en la
+lista de fuentes), así nada se transfiere dos veces. Cada trozo se aplica con una carga masiva
+(put_many) respetando Last-Writer-Wins, por lo que reintentar o recibir versiones viejas es seguro.
+
+El snapshot no es de un instante: las escrituras que llegan durante la transferencia se aplican
+directamente (el nodo ya es réplica) y, al terminar, una ronda de anti-entropía con cada fuente
+recupera las que se perdió mientras tanto. El progreso se consulta en GET /bootstrap.
+"""
+import time
+import threading
+
+
+class SnapshotBootstrap:
+    """
+    `fetch_chunk(source, after)` retorna {"entries": [...], "next": cursor o None, "bytes": n}
+    o None si la fuente no respondió; `apply(entries)` carga un trozo y retorna las claves
+    aplicadas; `catch_up(source)` sincroniza lo escrito durante la transferencia y retorna
+    las claves recibidas.
+    """
+    def __init__(self, fetch_chunk, apply, catch_up, retries=3, retry_delay=1.0, metrics=None):
+        self.sources = []
+        self.fetch_chunk = fetch_chunk
+        self.apply = apply
+        self.catch_up = catch_up
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.metrics = metrics
+        self.state = "pending"
+        self.started = None
+        self.finished = None
+        self.per_source = {}
+        self.lock = threading.Lock()
+
+    def run(self, sources):
+        with self.lock:
+            self.sources = list(sources)
+            self.per_source = {
+                port: {"state": "pending", "chunks": 0, "keys": 0, "applied": 0, "bytes": 0, "caught_up": 0}
+                for port in self.sources
+            }
+        self.started = time.time()
+        self.state = "streaming"
+        print(f"[bootstrap] Transfiriendo snapshot desde {self.sources}")
+        for source in self.sources:
+            self.stream(source)
+
+        # Recupera lo escrito durante la transferencia (y lo de las fuentes que fallaron)
+        self.state = "catching_up"
+        for source in self.sources:
+            try:
+                received = self.catch_up(source)
+            except Exception as e:
+                print(f"[bootstrap] Error sincronizando con el nodo {source} tras el snapshot: {e}")
+                continue
+            with self.lock:
+                self.per_source[source]["caught_up"] = received
+
+        self.finished = time.time()
+        failed = [port for port, progress in self.per_source.items() if progress["state"] != "done"]
+        self.state = "failed" if failed else "done"
+        report = self.progress()
+        print(f"[bootstrap] {self.state}: {report['applied']} claves aplicadas de {report['keys']} recibidas "
+              f"({report['bytes'] / 1e6:.1f} MB) en {report['elapsed']:.1f}s, {report['keys_per_second']:.0f} claves/s"
+              + (f"; fuentes con error: {failed}" if failed else ""))
+
+    def stream(self, source):
+        """Pide los trozos de una fuente hasta agotar su cursor (reintenta los que fallan)."""
+        progress = self.per_source[source]
+        progress["state"] = "streaming"
+        after = None
+        failures = 0
+        while True:
+            chunk = self.fetch_chunk(source, after)
+            if chunk is None:
+                failures += 1
+                if failures > self.retries:
+                    progress["state"] = "failed"
+                    print(f"[bootstrap] El nodo {source} no responde: se abandona su parte del snapshot")
+                    return
+                time.sleep(self.retry_delay * failures)
+                continue
+            failures = 0
+            applied = self.apply(chunk["entries"])
+            with self.lock:
+                progress["chunks"] += 1
+                progress["keys"] += len(chunk["entries"])
+                progress["applied"] += applied
+                progress["bytes"] += chunk.get("bytes", 0)
+            if self.metrics is not None:
+                self.metrics.inc("bootstrap_keys_total", len(chunk["entries"]), source=source)
+                self.metrics.inc("bootstrap_bytes_total", chunk.get("bytes", 0), source=source)
+            after = chunk["next"]
+            if after is None:
+                progress["state"] = "done"
+                return
+
+    def progress(self):
+        with self.lock:
+            sources = {port: dict(progress) for port, progress in self.per_source.items()}
+        elapsed = ((self.finished or time.time()) - self.started) if self.started else 0.0
+        keys = sum(progress["keys"] for progress in sources.values())
+        total_bytes = sum(progress["bytes"] for progress in sources.values())
+        return {
+            "state": self.state,
+            "elapsed": round(elapsed, 3),
+            "keys": keys,
+            "applied": sum(progress["applied"] for progress in sources.values()),
+            "bytes": total_bytes,
+            "keys_per_second": round(keys / elapsed, 1) if elapsed else 0.0,
+            "mb_per_second": round(total_bytes / 1e6 / elapsed, 3) if elapsed else 0.0,
+            "sources": sources
+        }
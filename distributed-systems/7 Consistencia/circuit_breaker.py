@@ -0,0 +1,63 @@
+# circuit_breaker.py
+"""
+Backoff exponencial y circuit breaker por par para la sincronización del Node de eventual_consistency.py.
+
+    closed   el par responde: se le envía en cada ronda
+    open     falló `failure_threshold` veces seguidas: no se le envía nada hasta que pase el
+             backoff, base_delay * 2^(fallos - umbral) con jitter y como máximo max_delay
+    (prueba) pasado el backoff se permite un intento: si responde el circuito se cierra y si
+             no se vuelve a abrir con el doble de espera
+
+Los fallos sueltos por debajo del umbral no se penalizan: un timeout aislado no debe dejar a un
+par sano sin deltas. Solo cuentan los errores de transporte (el par no respondió); una respuesta
+con error demuestra que el par está vivo.
+"""
+import time
+import random
+import threading
+
+CLOSED = "closed"
+OPEN = "open"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=3, base_delay=1.0, max_delay=60.0):
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.state = CLOSED
+        self.failures = 0
+        self.retry_at = 0.0
+        self.lock = threading.Lock()
+
+    def available(self, now=None):
+        """True si se puede contactar al par ahora (cerrado, o abierto con el backoff vencido)."""
+        now = now if now is not None else time.monotonic()
+        return self.state == CLOSED or now >= self.retry_at
+
+    def retry_in(self, now=None):
+        """Segundos hasta el próximo intento permitido (0 si el par está disponible)."""
+        now = now if now is not None else time.monotonic()
+        return 0.0 if self.state == CLOSED else max(0.0, self.retry_at - now)
+
+    def success(self):
+        """Registra una respuesta; retorna True si el par se recuperó (el circuito estaba abierto)."""
+        with self.lock:
+            recovered = self.state == OPEN
+            self.state = CLOSED
+            self.failures = 0
+            return recovered
+
+    def failure(self, now=None):
+        """Registra un fallo; retorna True si el circuito se acaba de abrir."""
+        now = now if now is not None else time.monotonic()
+        with self.lock:
+            self.failures += 1
+            if self.failures < self.failure_threshold:
+                return False
+            delay = min(self.max_delay, self.base_delay * 2 ** (self.failures - self.failure_threshold))
+            # Jitter: los nodos que perdieron al mismo par no reintentan todos a la vez
+            self.retry_at = now + delay * random.uniform(0.5, 1.0)
+            opened = self.state == CLOSED
+            self.state = OPEN
+            return opened
@@ -0,0 +1,333 @@
+# cluster_benchmark.py
+"""
+Benchmark de carga estilo YCSB para un clúster de QuorumNode con inyección de fallos.
+
+Lanza N nodos de quorum_consistency.py como subprocesos locales, precarga las claves y
+ejecuta una mezcla de lecturas y escrituras desde muchos clientes concurrentes. Durante
+la corrida puede matar (SIGKILL) y reiniciar nodos. El reporte JSON incluye el throughput,
+las latencias p50/p95/p99/p999 por operación, la tasa de 503 y la tasa de lecturas
+obsoletas: lecturas que devolvieron una versión más vieja que una escritura ya
+confirmada antes de iniciar la lectura.
+
+Uso:
+    python cluster_benchmark.py --nodes 3 --clients 32 --duration 30 --read-ratio 0.9 \\
+        --distribution zipfian --fault 10:kill:2 --fault 20:restart:2 --output report.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+
+import requests
+
+NODE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "quorum_consistency.py")
+
+
+class ZipfianGenerator:
+    """Rangos en [0, items) con distribución Zipf(theta), 0 < theta < 1; algoritmo de Gray et al. (el de YCSB)."""
+    def __init__(self, items, theta=0.99):
+        self.items = items
+        self.theta = theta
+        self.zetan = sum(1 / (i ** theta) for i in range(1, items + 1))
+        zeta2 = 1 + 1 / (2 ** theta)
+        self.alpha = 1 / (1 - theta)
+        self.eta = (1 - (2 / items) ** (1 - theta)) / (1 - zeta2 / self.zetan)
+
+    def next(self, rng):
+        u = rng.random()
+        uz = u * self.zetan
+        if uz < 1:
+            return 0
+        if uz < 1 + 0.5 ** self.theta:
+            return 1
+        return min(self.items - 1, int(self.items * (self.eta * u - self.eta + 1) ** self.alpha))
+
+
+class Cluster:
+    """Nodos de QuorumNode como subprocesos en `work_dir` (ahí quedan sus logs, hints y datos)."""
+    def __init__(self, nodes, base_port, work_dir, node_args):
+        self.ports = [base_port + i for i in range(nodes)]
+        self.work_dir = work_dir
+        self.node_args = node_args
+        self.processes = {}
+        self.alive = set()
+        self.lock = threading.Lock()
+
+    def start_node(self, node_id):
+        port = self.ports[node_id - 1]
+        peers = ",".join(str(p) for p in self.ports if p != port)
+        log = open(os.path.join(self.work_dir, f"node-{node_id}.log"), "ab")
+        process = subprocess.Popen(
+            [sys.executable, NODE_SCRIPT, "--id", str(node_id), "--port", str(port), "--peers", peers] + self.node_args,
+            cwd=self.work_dir, stdout=log, stderr=subprocess.STDOUT
+        )
+        with self.lock:
+            self.processes[node_id] = process
+        self.wait_ready(port)
+        with self.lock:
+            self.alive.add(node_id)
+
+    def wait_ready(self, port, timeout=30):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                requests.get(f"http://localhost:{port}/", timeout=1)
+                return
+            except requests.exceptions.RequestException:
+                time.sleep(0.2)
+        raise RuntimeError(f"El nodo del puerto {port} no respondió en {timeout}s (ver sus logs en {self.work_dir})")
+
+    def kill_node(self, node_id):
+        with self.lock:
+            self.alive.discard(node_id)
+            process = self.processes.pop(node_id, None)
+        if process:
+            process.kill()
+            process.wait()
+
+    def live_ports(self):
+        with self.lock:
+            return [self.ports[node_id - 1] for node_id in self.alive]
+
+    def start(self):
+        for node_id in range(1, len(self.ports) + 1):
+            self.start_node(node_id)
+
+    def stop(self):
+        for node_id in list(self.processes):
+            self.kill_node(node_id)
+
+
+class Recorder:
+    """Resultados de un cliente (cada hilo tiene el suyo; se combinan al final)."""
+    def __init__(self):
+        self.latencies = {"read": [], "write": []}
+        self.statuses = {"read": {}, "write": {}}
+        self.stale_reads = 0
+        self.timeline = {}   # {segundo: [operaciones, errores]}
+
+    def record(self, op, status, latency, second):
+        self.latencies[op].append(latency)
+        self.statuses[op][status] = self.statuses[op].get(status, 0) + 1
+        bucket = self.timeline.setdefault(second, [0, 0])
+        bucket[0] += 1
+        if status != 200:
+            bucket[1] += 1
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run_client(client_id, args, cluster, key_chooser, acked, acked_lock, stop_at, started, recorder):
+    """Bucle de un cliente: elige operación, clave y coordinador (un nodo vivo al azar)."""
+    rng = random.Random(args.seed * 1000 + client_id)
+    session = requests.Session()
+    padding = "x" * args.value_size
+    sequence = 0
+    while time.time() < stop_at:
+        ports = cluster.live_ports()
+        if not ports:
+            time.sleep(0.05)
+            continue
+        port = rng.choice(ports)
+        key = f"user{key_chooser(rng)}"
+        op = "read" if rng.random() < args.read_ratio else "write"
+        op_started = time.perf_counter()
+        second = int(time.time() - started)
+        try:
+            if op == "read":
+                with acked_lock:
+                    expected = acked.get(key, 0)
+                response = session.get(f"http://localhost:{port}/get/{key}", params={"consistency": args.consistency}, timeout=args.timeout)
+                status = response.status_code
+                if status == 200 and response.json()["timestamp"] < expected:
+                    recorder.stale_reads += 1
+            else:
+                sequence += 1
+                value = f"{client_id}-{sequence}-{padding}"[:max(args.value_size, 1)]
+                response = session.post(
+                    f"http://localhost:{port}/put",
+                    json={"key": key, "value": value, "consistency": args.consistency},
+                    timeout=args.timeout
+                )
+                status = response.status_code
+                if status == 200:
+                    timestamp = response.json()["timestamp"]
+                    with acked_lock:
+                        if timestamp > acked.get(key, 0):
+                            acked[key] = timestamp
+        except requests.exceptions.RequestException:
+            # Coordinador caído o sin respuesta dentro del timeout
+            status = "connection_error"
+        recorder.record(op, status, time.perf_counter() - op_started, second)
+
+
+def preload(cluster, args, acked):
+    """Escribe todas las claves (con /mput en lotes) para que las lecturas encuentren datos."""
+    port = cluster.ports[0]
+    value = "x" * args.value_size
+    for start in range(0, args.keys, 100):
+        items = [{"key": f"user{i}", "value": value} for i in range(start, min(start + 100, args.keys))]
+        response = requests.post(f"http://localhost:{port}/mput", json={"items": items, "consistency": "ALL"}, timeout=30)
+        for key, result in response.json()["results"].items():
+            if result.get("status") == "success":
+                acked[key] = result["timestamp"]
+
+
+def run_faults(cluster, faults, started, applied):
+    """Aplica los fallos programados [(segundo, acción, nodo)] en orden."""
+    for at, action, node_id in sorted(faults):
+        delay = started + at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        if action == "kill":
+            cluster.kill_node(node_id)
+        else:
+            cluster.start_node(node_id)
+        applied.append({"at": round(time.time() - started, 2), "action": action, "node": node_id})
+        print(f"[benchmark] t={time.time() - started:.1f}s {action} nodo {node_id}")
+
+
+def parse_fault(text):
+    at, action, node_id = text.split(":")
+    if action not in ("kill", "restart"):
+        raise argparse.ArgumentTypeError(f"Acción de fallo inválida: {action} (kill o restart)")
+    return float(at), action, int(node_id)
+
+
+def build_report(args, recorders, elapsed, applied_faults):
+    report = {
+        "label": args.label,
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "label")},
+        "duration": round(elapsed, 3),
+        "operations": {},
+        "faults": applied_faults,
+    }
+    total_ops = 0
+    for op in ("read", "write"):
+        latencies = sorted(l for r in recorders for l in r.latencies[op])
+        statuses = {}
+        for r in recorders:
+            for status, count in r.statuses[op].items():
+                statuses[str(status)] = statuses.get(str(status), 0) + count
+        count = len(latencies)
+        total_ops += count
+        summary = {
+            "count": count,
+            "throughput": round(count / elapsed, 1),
+            "statuses": statuses,
+            "rate_503": round(statuses.get("503", 0) / count, 5) if count else 0,
+            "error_rate": round((count - statuses.get("200", 0)) / count, 5) if count else 0,
+        }
+        for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("p999", 0.999)):
+            summary[name] = round(percentile(latencies, q) * 1000, 3)
+        summary["max"] = round(latencies[-1] * 1000, 3) if latencies else 0
+        report["operations"][op] = summary
+
+    successful_reads = report["operations"]["read"]["statuses"].get("200", 0)
+    stale_reads = sum(r.stale_reads for r in recorders)
+    report["throughput"] = round(total_ops / elapsed, 1)
+    report["stale_reads"] = stale_reads
+    report["stale_read_rate"] = round(stale_reads / successful_reads, 5) if successful_reads else 0
+
+    timeline = {}
+    for r in recorders:
+        for second, (ops, errors) in r.timeline.items():
+            bucket = timeline.setdefault(second, [0, 0])
+            bucket[0] += ops
+            bucket[1] += errors
+    report["timeline"] = [{"second": s, "ops": ops, "errors": errors} for s, (ops, errors) in sorted(timeline.items())]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de carga y fallos para un clúster de QuorumNode')
+    parser.add_argument('--nodes', type=int, default=3, help='Nodos del clúster')
+    parser.add_argument('--base-port', type=int, default=7100, help='Puerto del primer nodo (los demás son consecutivos)')
+    parser.add_argument('--replication-factor', type=int, help='Réplicas por clave (RF); por defecto todos los nodos')
+    parser.add_argument('--read-quorum', type=int, default=2, help='Tamaño del quórum de lectura (R)')
+    parser.add_argument('--write-quorum', type=int, default=2, help='Tamaño del quórum de escritura (W)')
+    parser.add_argument('--server', choices=['threaded', 'async'], default='threaded', help='Modo de servidor de los nodos')
+    parser.add_argument('--storage', choices=['memory', 'lsm'], default='memory', help='Motor de almacenamiento de los nodos')
+    parser.add_argument('--clients', type=int, default=32, help='Clientes concurrentes (hilos)')
+    parser.add_argument('--duration', type=float, default=30, help='Duración de la carga, en segundos')
+    parser.add_argument('--read-ratio', type=float, default=0.5, help='Fracción de lecturas (el resto son escrituras)')
+    parser.add_argument('--keys', type=int, default=10000, help='Número de claves')
+    parser.add_argument('--distribution', choices=['uniform', 'zipfian'], default='zipfian', help='Distribución de las claves')
+    parser.add_argument('--zipf-theta', type=float, default=0.99, help='Sesgo de la distribución zipfian')
+    parser.add_argument('--value-size', type=int, default=100, help='Tamaño del valor en bytes')
+    parser.add_argument('--consistency', choices=['ONE', 'QUORUM', 'ALL'], default='QUORUM', help='Nivel de consistencia de las operaciones')
+    parser.add_argument('--timeout', type=float, default=5, help='Timeout de cada operación del cliente, en segundos')
+    parser.add_argument('--fault', type=parse_fault, action='append', default=[],
+                        help='Fallo programado segundo:acción:nodo (acción kill o restart), p. ej. 10:kill:2')
+    parser.add_argument('--seed', type=int, default=1, help='Semilla de los generadores aleatorios')
+    parser.add_argument('--label', type=str, default='', help='Etiqueta de la corrida (p. ej. la versión medida)')
+    parser.add_argument('--output', type=str, default='benchmark-report.json', help='Archivo del reporte JSON')
+    parser.add_argument('--keep-dir', action='store_true', help='Conserva el directorio de trabajo (logs de los nodos)')
+    args = parser.parse_args()
+
+    node_args = ["--read-quorum", str(args.read_quorum), "--write-quorum", str(args.write_quorum),
+                 "--server", args.server, "--storage", args.storage]
+    if args.replication_factor:
+        node_args += ["--replication-factor", str(args.replication_factor)]
+
+    if args.distribution == "zipfian":
+        zipf = ZipfianGenerator(args.keys, args.zipf_theta)
+        key_chooser = zipf.next
+    else:
+        key_chooser = lambda rng: rng.randrange(args.keys)
+
+    work_dir = tempfile.mkdtemp(prefix="quorum-bench-")
+    cluster = Cluster(args.nodes, args.base_port, work_dir, node_args)
+    try:
+        print(f"[benchmark] Iniciando {args.nodes} nodos en {work_dir}...")
+        cluster.start()
+        acked = {}
+        acked_lock = threading.Lock()
+        print(f"[benchmark] Precargando {args.keys} claves...")
+        preload(cluster, args, acked)
+
+        started = time.time()
+        stop_at = started + args.duration
+        recorders = [Recorder() for _ in range(args.clients)]
+        threads = [
+            threading.Thread(target=run_client, args=(i, args, cluster, key_chooser, acked, acked_lock, stop_at, started, recorders[i]))
+            for i in range(args.clients)
+        ]
+        applied_faults = []
+        fault_thread = threading.Thread(target=run_faults, args=(cluster, args.fault, started, applied_faults), daemon=True)
+        fault_thread.start()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.time() - started
+
+        report = build_report(args, recorders, elapsed, applied_faults)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+        print(f"\n{report['throughput']} ops/s en {elapsed:.1f}s, lecturas obsoletas: {report['stale_reads']} ({report['stale_read_rate']:.3%})")
+        print(f"{'op':<6} {'ops':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'p999 ms':>9} {'503':>8} {'errores':>8}")
+        for op, s in report["operations"].items():
+            print(f"{op:<6} {s['count']:>8} {s['p50']:>9} {s['p95']:>9} {s['p99']:>9} {s['p999']:>9} {s['rate_503']:>8.2%} {s['error_rate']:>8.2%}")
+        print(f"Reporte escrito en {args.output}")
+    finally:
+        cluster.stop()
+        if args.keep_dir:
+            print(f"[benchmark] Logs de los nodos en {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
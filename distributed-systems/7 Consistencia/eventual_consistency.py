@@ -2,48 +2,148 @@ import time
 import json
 import threading
 import requests
+from requests.adapters import HTTPAdapter
 from flask import Flask, request, jsonify
 import random
 import argparse
+import uuid
+import concurrent.futures
+from collections import OrderedDict
 from datetime import datetime
+from merkle_tree import MerkleTree, entry_hash, key_bucket
+from version_vectors import VersionVector, VersionedValue
+from circuit_breaker import CircuitBreaker, CLOSED
+
+# Segundos entre rondas de sincronización sin cambios (antes de alargarlas) y timeout de cada envío
+SYNC_INTERVAL = 5
+SYNC_TIMEOUT = 5
+# Rumores enviados por mensaje de gossip como máximo (los más recientes primero)
+GOSSIP_MAX_RUMORS = 500
 
 class Node:
     """
     Representa un nodo en un sistema distribuido con consistencia eventual,
     utilizando Vector Clocks para la detección y resolución de conflictos.
+
+    Cada clave se guarda como un dotted version vector (version_vectors.py): un contexto causal
+    compacto indexado por el ID entero de cada nodo y los hermanos concurrentes, cada uno con el
+    dot de la escritura que lo creó. Las escrituras concurrentes se conservan como hermanos
+    (GET muestra el del nodo con el ID más alto y lista todos en "siblings") hasta que una
+    escritura con un contexto que los cubra los reemplace. Un PUT sin vector_clock reemplaza lo
+    que este nodo ya vio. Los contextos con más de `max_clock_entries` escritores se podan
+    descartando los que no escriben la clave hace más de `clock_prune_age` segundos.
+
+    Sincronización por deltas: cada cambio local (escritura o valor aceptado de un par) recibe
+    un número de secuencia creciente, y por cada par se guarda hasta qué secuencia confirmó
+    haber recibido (su watermark). Cada ronda envía solo las claves cambiadas después del
+    watermark del par; si no hay ninguna, no se envía nada. Como cada nodo le envía sus
+    escrituras a todos los pares, las versiones recibidas de un par no se reenvían (solo las
+    fusiones que producen una versión nueva). Un par nuevo, o uno que se reinició (su
+    `incarnation` cambió y perdió lo recibido), se pone al día con anti-entropía, y cada
+    `anti_entropy_every` rondas se compara con un par al azar para recuperar las escrituras
+    que un nodo caído no llegó a enviar a todos.
+
+    Anti-entropía por digest: el nodo mantiene un árbol de Merkle incremental (merkle_tree.py)
+    sobre hash(clave, versión) de todas sus claves. Dos nodos comparan el árbol nivel a
+    nivel pidiendo solo los hashes de los hijos de nodos distintos y, al llegar a las hojas,
+    intercambian los contextos de las claves de los buckets distintos: cada uno recibe las
+    versiones que le faltan en una sola ronda. Dos réplicas iguales se comparan con un mensaje
+    y las casi iguales transfieren bytes proporcionales a sus diferencias.
+
+    Modo gossip (`sync_mode="gossip"`): en lugar de enviar a todos los pares, cada ronda elige
+    `fanout` pares al azar e intercambia rumores en ambos sentidos (push-pull): cada cambio es un
+    rumor caliente que se envía hasta que `rumor_limit` pares respondan que ya lo conocían
+    (rumor mongering con contador y feedback). Cada `anti_entropy_every` rondas, además, se
+    ejecuta la anti-entropía con un par al azar para recuperar los
+    cambios cuyos rumores se extinguieron antes de llegar a todos. Los mensajes por ronda son
+    O(N * fanout) en lugar de O(N²). Ver gossip_simulator.py.
+
+    Envíos en paralelo: cada ronda reparte los envíos entre los pares en un pool de
+    `sync_workers` hilos, con una sesión HTTP con conexiones persistentes por par, y no espera
+    a que terminen: un par lento solo retrasa sus propios envíos (se salta mientras tenga uno
+    en curso). Los pares que no responden pasan por un circuit breaker con backoff exponencial
+    (circuit_breaker.py). Las rondas se adaptan a las escrituras: un cambio dispara una ronda
+    tras `min_sync_delay` (que agrupa la ráfaga en un solo delta) y, sin cambios, el intervalo
+    se duplica hasta `max_sync_interval`.
     """
-    def __init__(self, node_id, port, peer_ports=None):
+    def __init__(self, node_id, port, peer_ports=None, sync_mode="all", fanout=3, rumor_limit=3,
+                 gossip_interval=1.0, anti_entropy_every=10, merkle_depth=12, max_clock_entries=10,
+                 clock_prune_age=3600, sync_workers=8, min_sync_delay=0.05, max_sync_interval=30.0,
+                 max_backoff=60.0):
         self.node_id = node_id
         self.port = port
         self.peer_ports = peer_ports or []
-        self.data = {}           # Almacén clave-valor (diccionario)
-        self.vector_clocks = {}  # Vector clocks para cada clave (diccionario de diccionarios)
-        self.lock = threading.Lock() # Bloqueo para proteger el acceso a 'data' y 'vector_clocks'
+        self.data = {}           # Almacén clave-valor: {key: VersionedValue} (contexto causal y hermanos)
+        self.lock = threading.Lock() # Bloqueo para proteger el acceso a 'data' y el registro de cambios
+        self.max_clock_entries = max_clock_entries
+        self.clock_prune_age = clock_prune_age
+        # Contador de los dots de este nodo, común a todas las claves: la poda puede olvidar la
+        # entrada del nodo en el contexto de una clave, pero sus dots nuevos no se repiten
+        self.dot_counter = 0
+
+        # Registro de cambios: {key: (secuencia, puerto del par que lo envió o None)}, ordenado por secuencia
+        self.seq = 0
+        self.changes = OrderedDict()
+        # Identifica esta ejecución del nodo: si cambia, los watermarks que tenían los pares ya no valen
+        self.incarnation = uuid.uuid4().hex
+        # {puerto: (incarnation del par, última secuencia confirmada)}
+        self.watermarks = {}
+
+        # Gossip: {key: pares que ya conocían el rumor}, del más viejo al más reciente
+        self.sync_mode = sync_mode
+        self.fanout = fanout
+        self.rumor_limit = rumor_limit
+        self.gossip_interval = gossip_interval
+        self.anti_entropy_every = anti_entropy_every
+        self.rumors = OrderedDict()
+        self.rounds = 0
+
+        # Anti-entropía: árbol de Merkle y {bucket: {key: hash de su versión}} de las claves locales
+        self.merkle = MerkleTree(merkle_depth)
+        self.buckets = {}
+
+        # Mensajes entre nodos: {ruta: manejador(payload) -> respuesta}
+        self.handlers = {
+            "/sync": self.handle_sync,
+            "/gossip": self.handle_gossip,
+            "/anti_entropy/hashes": self.handle_merkle_hashes,
+            "/anti_entropy/buckets": self.handle_merkle_buckets,
+        }
         
         # Inicializar la aplicación Flask
         self.app = Flask(f"node-{node_id}")
         self.setup_routes()
         
-        # Iniciar hilo de sincronización
+        # Envíos a los pares: pool de hilos, sesión por par, pares con un envío en curso y circuit breakers
+        self.sync_executor = concurrent.futures.ThreadPoolExecutor(max_workers=sync_workers, thread_name_prefix=f"sync-{node_id}")
+        self.sessions = {}       # {puerto: requests.Session}
+        self.sessions_lock = threading.Lock()
+        self.in_flight = set()
+        self.in_flight_lock = threading.Lock()
+        self.breakers = {port: CircuitBreaker(max_delay=max_backoff) for port in self.peer_ports}
+        # Intervalo adaptativo: record_change avisa al hilo de sincronización
+        self.changed = threading.Event()
+        self.min_sync_delay = min_sync_delay
+        self.max_sync_interval = max_sync_interval
+
+        # Hilo de sincronización (se inicia en run)
         self.sync_thread = threading.Thread(target=self.sync_with_peers)
         self.sync_thread.daemon = True
-        self.sync_thread.start()
+    
+    def log(self, message):
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] Nodo {self.port}: {message}")
     
     def setup_routes(self):
         # Ruta de estado (para evitar 404 al visitar la raíz)
         @self.app.route('/', methods=['GET'])
         def home():
-            return f"Nodo {self.node_id} activo en puerto {self.port}. Rutas disponibles: /get/<key>, /put, /sync. Peers: {', '.join(map(str, self.peer_ports))}"
+            return f"Nodo {self.node_id} activo en puerto {self.port}. Rutas disponibles: /get/<key>, /put, /sync, /gossip, /anti_entropy/hashes, /anti_entropy/buckets. Modo: {self.sync_mode}. Peers: {', '.join(map(str, self.peer_ports))}"
 
         @self.app.route('/get/<key>', methods=['GET'])
         def get_value(key):
             with self.lock:
                 if key in self.data:
-                    return jsonify({
-                        "key": key,
-                        "value": self.data[key],
-                        "vector_clock": self.vector_clocks.get(key, {})
-                    })
+                    return jsonify({"key": key, **self.client_view(self.data[key])})
                 else:
                     return jsonify({"error": "Key not found"}), 404
         
@@ -55,150 +155,372 @@ class Node:
                 
             key = data.get('key')
             value = data.get('value')
-            client_vector_clock = data.get('vector_clock', {})
-            
-            with self.lock:
-                # 1. Obtener el Vector Clock actual
-                current_vector_clock = self.vector_clocks.get(key, {})
-                
-                # 2. Si hay un clock del cliente (sincronización o actualización con conocimiento previo)
-                if client_vector_clock:
-                    # Fusionar el clock local con el clock del cliente (tomar el máximo)
-                    for node_id, count in client_vector_clock.items():
-                        current_vector_clock[node_id] = max(current_vector_clock.get(node_id, 0), count)
-                
-                # 3. Incrementar el contador para este nodo (El evento acaba de ocurrir aquí)
-                current_vector_clock[str(self.node_id)] = current_vector_clock.get(str(self.node_id), 0) + 1
-                
-                # 4. Actualizar datos y vector clock
-                self.data[key] = value
-                self.vector_clocks[key] = current_vector_clock
-                
-                return jsonify({
-                    "status": "success",
-                    "key": key,
-                    "value": value,
-                    "vector_clock": current_vector_clock
-                })
+            version = self.local_put(key, value, data.get('vector_clock', {}))
+            return jsonify({"status": "success", "key": key, **self.client_view(version)})
         
         @self.app.route('/sync', methods=['POST'])
         def receive_sync():
-            sync_data = request.json
-            if not sync_data:
-                 return jsonify({"status": "no_data"})
+            return jsonify(self.handle_sync(request.json))
 
-            with self.lock:
-                for key, item in sync_data.items():
-                    remote_value = item['value']
-                    remote_vector_clock = item['vector_clock']
-                    
-                    if key not in self.data:
-                        # Caso 1: Clave nueva, simplemente la añadimos
-                        self.data[key] = remote_value
-                        self.vector_clocks[key] = remote_vector_clock
-                    else:
-                        # Caso 2: Clave existente, comparamos vector clocks
-                        local_vector_clock = self.vector_clocks[key]
-                        
-                        if self.is_concurrent(local_vector_clock, remote_vector_clock):
-                            # Conflicto: Los dos valores son actualizaciones simultáneas.
-                            
-                            # Fusionar clocks antes de resolver, para no perder información de causalidad.
-                            merged_clock = self.merge_vector_clocks(local_vector_clock, remote_vector_clock)
-                            self.vector_clocks[key] = merged_clock
-
-                            # Regla de desempate: Si los valores son diferentes, el nodo con el ID más alto 'gana'.
-                            if self.data[key] != remote_value:
-                                print(f"[Conflict for {key}] Local: {self.data[key]} vs Remote: {remote_value}. Merging clocks.")
-                            
-                                # Si el nodo local tiene un ID menor que el nodo que generó la última versión remota, usa el valor remoto.
-                                if self.node_id < int(max(remote_vector_clock.keys(), key=int)):
-                                     self.data[key] = remote_value
-                                
-                        elif self.happens_before(local_vector_clock, remote_vector_clock):
-                            # El valor remoto es causalmente posterior (más reciente)
-                            self.data[key] = remote_value
-                            self.vector_clocks[key] = remote_vector_clock
-                            # Si el valor local es más reciente, no hacemos nada (self.happens_before es False)
-            
-            return jsonify({"status": "sync_received"})
-    
-    def is_concurrent(self, vc1, vc2):
-        """Determina si dos eventos son concurrentes según sus vector clocks."""
-        less = False
-        greater = False
-        
-        for node_id in set(vc1.keys()) | set(vc2.keys()):
-            count1 = vc1.get(node_id, 0)
-            count2 = vc2.get(node_id, 0)
-            
-            if count1 < count2:
-                less = True
-            elif count1 > count2:
-                greater = True
-            
-        return less and greater  # Concurrentes si hay componentes donde vc1 > vc2 Y vc2 > vc1
-    
-    def happens_before(self, vc1, vc2):
-        """Determina si vc1 sucedió causalmente antes que vc2 (vc1 -> vc2)."""
-        less_equal = True
-        strictly_less = False
-        
-        for node_id in set(vc1.keys()) | set(vc2.keys()):
-            count1 = vc1.get(node_id, 0)
-            count2 = vc2.get(node_id, 0)
-            
-            if count1 > count2:
-                return False  # Si hay un componente donde vc1 es mayor, no hay relación causal (o es concurrente)
-            if count1 < count2:
-                strictly_less = True
-        
-        return strictly_less # vc1 es causalmente anterior a vc2 si es menor o igual en todas partes y estrictamente menor en al menos una.
-    
-    def merge_vector_clocks(self, vc1, vc2):
-        """Fusiona dos vector clocks tomando el máximo para cada componente."""
-        result = vc1.copy()
-        
-        for node_id, count in vc2.items():
-            result[node_id] = max(result.get(node_id, 0), count)
+        @self.app.route('/gossip', methods=['POST'])
+        def receive_gossip():
+            return jsonify(self.handle_gossip(request.json))
+
+        @self.app.route('/anti_entropy/hashes', methods=['POST'])
+        def merkle_hashes():
+            return jsonify(self.handle_merkle_hashes(request.json))
+
+        @self.app.route('/anti_entropy/buckets', methods=['POST'])
+        def merkle_buckets():
+            return jsonify(self.handle_merkle_buckets(request.json))
+
+    def local_put(self, key, value, client_vector_clock=None):
+        """
+        Escritura de un cliente; retorna la versión nueva de la clave. Reemplaza los hermanos que
+        cubre el vector clock del cliente (el que obtuvo con GET) o, si no envía uno, todo lo que
+        este nodo ya vio de la clave.
+        """
+        with self.lock:
+            current = self.data.get(key, VersionedValue())
+            if client_vector_clock:
+                context = VersionVector.from_wire(client_vector_clock)
+            else:
+                context = current.context
+            self.dot_counter = max(self.dot_counter, current.context.get(self.node_id)) + 1
+            version = current.update(context, self.node_id, self.dot_counter, value, int(time.time()))
+            self.data[key] = version.pruned(self.max_clock_entries, self.clock_prune_age)
+            self.record_change(key)
+            return self.data[key]
+
+    def client_view(self, version):
+        """Valor, hermanos y vector clock de una versión tal como se muestran a los clientes."""
+        view = {"value": version.winner(), "vector_clock": version.context.to_dict()}
+        if len(version.siblings) > 1:
+            view["siblings"] = version.values()
+        return view
+
+    def entry(self, key):
+        """Versión local de una clave tal como se envía a los pares (requiere self.lock)."""
+        return self.data[key].to_wire()
+
+    def handle_sync(self, sync_data):
+        """
+        Recibe un delta {"sender": puerto, "upto": secuencia, "entries": {key: versión}} y confirma
+        hasta qué secuencia del emisor quedó aplicado.
+        """
+        if not sync_data:
+             return {"status": "no_data", "incarnation": self.incarnation}
+
+        with self.lock:
+            for key, item in sync_data.get('entries', {}).items():
+                self.merge_remote(key, item, sync_data.get('sender'))
         
-        return result
+        return {"status": "sync_received", "ack": sync_data.get('upto'), "incarnation": self.incarnation}
+
+    def handle_gossip(self, payload):
+        """
+        Push-pull: aplica los rumores del emisor, responde cuáles ya conocía (feedback para su
+        contador) y le envía los rumores propios que el emisor no trajo en la misma versión.
+        """
+        sender = payload.get("sender")
+        incoming = payload.get("rumors", {})
+        known = []
+        with self.lock:
+            reply = {
+                key: item for key, item in self.hot_rumors().items()
+                if key not in incoming or incoming[key] != item
+            }
+            for key, item in incoming.items():
+                if not self.merge_remote(key, item, sender):
+                    known.append(key)
+        return {"known": known, "rumors": reply}
+
+    def handle_merkle_hashes(self, payload):
+        """Hashes de los nodos pedidos del árbol de Merkle (y la incarnation, para los watermarks)."""
+        with self.lock:
+            return {"hashes": self.merkle.hashes(payload["indices"]), "incarnation": self.incarnation}
+
+    def handle_merkle_buckets(self, payload):
+        """
+        Recibe {bucket: {key: contexto}} de los buckets distintos del emisor y responde las
+        versiones locales que el contexto del emisor no cubre ("entries") y las claves cuyo
+        contexto remoto este nodo no cubre ("wanted").
+        """
+        entries = {}
+        wanted = []
+        with self.lock:
+            for bucket, remote_contexts in payload["buckets"].items():
+                remote_contexts = {key: VersionVector.from_wire(context) for key, context in remote_contexts.items()}
+                for key in self.buckets.get(int(bucket), {}):
+                    remote_context = remote_contexts.get(key)
+                    if remote_context is None or not remote_context.descends(self.data[key].context):
+                        entries[key] = self.entry(key)
+                for key, remote_context in remote_contexts.items():
+                    if key not in self.data or not self.data[key].context.descends(remote_context):
+                        wanted.append(key)
+        return {"entries": entries, "wanted": wanted}
+
+    def merge_remote(self, key, item, source=None):
+        """Aplica una versión recibida de un par (requiere self.lock). Retorna True si cambió el estado local."""
+        remote = VersionedValue.from_wire(item)
+        # Dots propios emitidos antes de un reinicio: los nuevos deben superarlos
+        self.dot_counter = max(self.dot_counter, remote.context.get(self.node_id))
+        local = self.data.get(key)
+        if local is None:
+            # Caso 1: Clave nueva, simplemente la añadimos
+            merged = remote.pruned(self.max_clock_entries, self.clock_prune_age)
+        else:
+            # Caso 2: Clave existente: sobreviven los hermanos que el contexto del otro lado no cubre
+            merged = local.merge(remote).pruned(self.max_clock_entries, self.clock_prune_age)
+            if merged == local:
+                return False # La versión local ya incluía la remota
+            if len(merged.siblings) > 1 and merged.dots() != remote.dots():
+                print(f"[Conflict for {key}] Local: {local.values()} vs Remote: {remote.values()}. Keeping siblings {merged.values()}.")
+        self.data[key] = merged
+        # Si el resultado es distinto de lo que envió el par (hermanos fusionados) es una versión nueva que hay que enviar
+        self.record_change(key, source if merged == remote else None)
+        return True
+
+    def record_change(self, key, source=None):
+        """
+        Marca la clave como cambiada con una secuencia nueva (requiere self.lock). `source` es el par
+        que envió la versión tal cual; None si es una escritura local o una fusión con hermanos.
+        """
+        self.seq += 1
+        self.changes.pop(key, None)
+        self.changes[key] = (self.seq, source)
+        if source is None or self.sync_mode == "gossip":
+            # En modo all una versión recibida de un par no genera envíos (ver changes_since)
+            self.changed.set()
+
+        # Árbol de Merkle: se reemplaza el hash de la versión anterior por el de la nueva
+        bucket = key_bucket(key, self.merkle.depth)
+        versions = self.buckets.setdefault(bucket, {})
+        version = entry_hash(key, self.data[key].signature())
+        self.merkle.apply(bucket, versions.get(key, 0) ^ version)
+        versions[key] = version
+        if self.sync_mode == "gossip":
+            # Un cambio es un rumor caliente nuevo (o vuelve a serlo)
+            self.rumors.pop(key, None)
+            self.rumors[key] = 0
+
+    def hot_rumors(self):
+        """Los rumores calientes más recientes con su versión actual (requiere self.lock)."""
+        rumors = {}
+        for key in reversed(self.rumors):
+            if len(rumors) >= GOSSIP_MAX_RUMORS:
+                break
+            rumors[key] = self.entry(key)
+        return rumors
+
+    def changes_since(self, watermark):
+        """
+        Claves cambiadas después de la secuencia `watermark` por este nodo (requiere self.lock).
+        Se omiten las versiones recibidas tal cual de un par: su autor ya se las envió a todos.
+        """
+        keys = []
+        for key in reversed(self.changes):
+            seq, source = self.changes[key]
+            if seq <= watermark:
+                break
+            if source is None:
+                keys.append(key)
+        return keys
     
+    def build_delta(self, watermark):
+        """Payload de /sync para un par: las claves cambiadas desde su watermark."""
+        with self.lock:
+            entries = {key: self.entry(key) for key in self.changes_since(watermark)}
+            return {"sender": self.port, "upto": self.seq, "entries": entries}
+
+    def session_for(self, port):
+        """Retorna (creándola si hace falta) la sesión con conexiones persistentes del par."""
+        with self.sessions_lock:
+            session = self.sessions.get(port)
+            if session is None:
+                session = requests.Session()
+                # Cada par tiene a lo sumo un envío en curso (ver run_on_peers)
+                session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0))
+                self.sessions[port] = session
+            return session
+
+    def post(self, port, path, payload):
+        """Envía un mensaje a un par; retorna su respuesta o None si no respondió."""
+        breaker = self.breakers.setdefault(port, CircuitBreaker())
+        try:
+            response = self.session_for(port).post(f"http://localhost:{port}{path}", json=payload, timeout=SYNC_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            probing = breaker.state != CLOSED
+            if breaker.failure():
+                self.log(f"Error: No se pudo conectar con el nodo en puerto {port}. El peer está caído; "
+                         f"se reintentará en {breaker.retry_in():.1f}s. ({e})")
+            elif probing:
+                self.log(f"El Nodo {port} sigue sin responder; se reintentará en {breaker.retry_in():.1f}s")
+            else:
+                self.log(f"Error: No se pudo conectar con el nodo en puerto {port}. ({e})")
+            return None
+
+        if breaker.success():
+            self.log(f"El Nodo {port} volvió a responder")
+        if response.status_code != 200:
+            self.log(f"Advertencia: {path} con Nodo {port} falló con estado {response.status_code}")
+            return None
+        return response.json()
+
+    def sync_with_peer(self, port):
+        """
+        Envía el delta de un par y avanza su watermark si lo confirma. Sin watermark (par nuevo o
+        reiniciado) compara los árboles de Merkle y transfiere solo las diferencias.
+        """
+        with self.lock:
+            watermark = self.watermarks.get(port)
+            upto = self.seq
+        if watermark is None:
+            # Lo cambiado durante la anti-entropía (secuencia > upto) viaja en el siguiente delta
+            incarnation = self.anti_entropy_with(port)
+            if incarnation is not None:
+                with self.lock:
+                    self.watermarks[port] = (incarnation, upto)
+            return
+
+        payload = self.build_delta(watermark[1])
+        if not payload["entries"]:
+            return # Nada nuevo para este par
+        body = self.post(port, "/sync", payload)
+        if body is None:
+            return
+
+        incarnation = body.get("incarnation")
+        with self.lock:
+            if watermark[0] != incarnation:
+                # El par se reinició y perdió lo que ya había confirmado: la próxima ronda usa anti-entropía
+                self.watermarks.pop(port, None)
+                self.log(f"El Nodo {port} se reinició; se comparará con anti-entropía")
+                return
+            self.watermarks[port] = (incarnation, payload["upto"])
+        self.log(f"Sincronización delta con el Nodo {port} ({len(payload['entries'])} claves)")
+
+    def gossip_with(self, port):
+        """Intercambio push-pull de rumores con un par."""
+        with self.lock:
+            rumors = self.hot_rumors()
+        body = self.post(port, "/gossip", {"sender": self.port, "rumors": rumors})
+        if body is None:
+            return
+        with self.lock:
+            for key in body["known"]:
+                if key in self.rumors:
+                    self.rumors[key] += 1
+                    if self.rumors[key] >= self.rumor_limit:
+                        # Suficientes pares ya lo conocían: el rumor deja de propagarse
+                        del self.rumors[key]
+            for key, item in body["rumors"].items():
+                self.merge_remote(key, item, port)
+
+    def anti_entropy_with(self, port):
+        """
+        Desciende por los árboles de Merkle pidiendo al par solo los hashes de los hijos de nodos
+        distintos; al llegar a las hojas intercambia las claves de los buckets distintos en ambas
+        direcciones. Retorna la incarnation del par, o None si no respondió.
+        """
+        depth = self.merkle.depth
+        indices = [1]
+        for level in range(depth + 1):
+            body = self.post(port, "/anti_entropy/hashes", {"sender": self.port, "indices": indices})
+            if body is None:
+                return None
+            incarnation = body["incarnation"]
+            with self.lock:
+                local_hashes = self.merkle.hashes(indices)
+            differing = [i for i, local, remote in zip(indices, local_hashes, body["hashes"]) if local != remote]
+            if not differing:
+                return incarnation
+            if level < depth:
+                indices = [child for i in differing for child in (2 * i, 2 * i + 1)]
+
+        with self.lock:
+            buckets = {}
+            for index in differing:
+                bucket = index - 2 ** depth
+                buckets[str(bucket)] = {key: self.data[key].context.to_wire() for key in self.buckets.get(bucket, {})}
+        body = self.post(port, "/anti_entropy/buckets", {"sender": self.port, "buckets": buckets})
+        if body is None:
+            return None
+        with self.lock:
+            for key, item in body["entries"].items():
+                self.merge_remote(key, item, port)
+            wanted = {key: self.entry(key) for key in body["wanted"] if key in self.data}
+        if wanted and self.post(port, "/sync", {"sender": self.port, "upto": None, "entries": wanted}) is None:
+            return None
+        self.log(f"Anti-entropía con el Nodo {port}: {len(differing)} buckets distintos, "
+                 f"{len(body['entries'])} claves recibidas, {len(wanted)} enviadas")
+        return incarnation
+
+    def then_anti_entropy(self, task):
+        """Tarea que ejecuta `task` con el par y después la anti-entropía con él."""
+        def run(port):
+            task(port)
+            self.anti_entropy_with(port)
+        return run
+
+    def sync_round(self):
+        """
+        Una ronda de sincronización según el modo (all: deltas a todos los pares; gossip: `fanout`
+        pares al azar), solo con los pares cuyo circuit breaker permite contactarlos. Cada
+        `anti_entropy_every` rondas suma la anti-entropía con un par al azar.
+        """
+        self.rounds += 1
+        available = [port for port in self.peer_ports if self.breakers[port].available()]
+        if self.sync_mode != "gossip":
+            tasks = {port: self.sync_with_peer for port in available}
+        else:
+            tasks = {port: self.gossip_with for port in random.sample(available, min(self.fanout, len(available)))}
+        if self.anti_entropy_every and self.rounds % self.anti_entropy_every == 0 and available:
+            port = random.choice(available)
+            tasks[port] = self.then_anti_entropy(tasks[port]) if port in tasks else self.anti_entropy_with
+        self.run_on_peers(tasks)
+
+    def run_on_peers(self, tasks):
+        """
+        Lanza `task(port)` para cada {port: task} en el pool de sincronización sin esperar a que
+        terminen; se saltan los pares que todavía tienen un envío en curso.
+        """
+        for port, task in tasks.items():
+            with self.in_flight_lock:
+                if port in self.in_flight:
+                    continue
+                self.in_flight.add(port)
+            self.sync_executor.submit(self.run_peer_task, task, port)
+
+    def run_peer_task(self, task, port):
+        try:
+            task(port)
+        except Exception as e:
+            self.log(f"Error sincronizando con el Nodo {port}: {e}")
+        finally:
+            with self.in_flight_lock:
+                self.in_flight.discard(port)
+
     def sync_with_peers(self):
-        """Sincroniza periódicamente con otros nodos."""
+        """
+        Sincroniza en segundo plano con intervalo adaptativo: tras un cambio la ronda sale en
+        `min_sync_delay`; sin cambios (ni rumores calientes) el intervalo se duplica desde el base
+        hasta `max_sync_interval`. Un par en backoff acorta la espera hasta su reintento.
+        """
+        base = self.gossip_interval if self.sync_mode == "gossip" else SYNC_INTERVAL
+        interval = base
         while True:
-            # Aumentamos el timeout a 5 segundos para reducir la probabilidad de ConnectTimeoutError 
-            SYNC_TIMEOUT = 5 
-            
-            # Esperar 5 segundos antes de intentar sincronizar
-            time.sleep(5) 
-            
-            with self.lock:
-                # Sólo enviamos los datos que tenemos localmente
-                sync_data = {
-                    key: {
-                        'value': self.data[key],
-                        'vector_clock': self.vector_clocks.get(key, {})
-                    }
-                    for key in self.data
-                }
-            
-            # Enviar datos a todos los peers
-            for port in self.peer_ports:
-                try:
-                    # Usamos el timeout ajustado
-                    response = requests.post(f"http://localhost:{port}/sync", json=sync_data, timeout=SYNC_TIMEOUT)
-                    
-                    if response.status_code == 200:
-                         print(f"[{datetime.now().strftime('%H:%M:%S')}] Nodo {self.port}: Sincronización exitosa con el Nodo {port}")
-                    else:
-                         print(f"[{datetime.now().strftime('%H:%M:%S')}] Nodo {self.port}: Advertencia: Sincronización con Nodo {port} falló con estado {response.status_code}")
-
-                except requests.exceptions.RequestException as e:
-                    # Este error ahora usa el timeout de 5 segundos.
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Nodo {self.port}: Error: No se pudo conectar con el nodo en puerto {port}. El peer está caído. ({e})")
+            retries = [wait for wait in (breaker.retry_in() for breaker in self.breakers.values()) if wait > 0]
+            changed = self.changed.wait(min([interval] + retries))
+            if changed:
+                time.sleep(self.min_sync_delay) # Agrupa las escrituras de una ráfaga en un solo delta
+                self.changed.clear()
+            self.sync_round()
+            busy = changed or (self.sync_mode == "gossip" and self.rumors)
+            interval = base if busy else min(interval * 2, self.max_sync_interval)
     
     def run(self):
+        self.sync_thread.start()
         self.app.run(host='0.0.0.0', port=self.port, debug=False, use_reloader=False)
 
 def main():
@@ -206,6 +528,27 @@ def main():
     parser.add_argument('--id', type=int, required=True, help='ID del nodo')
     parser.add_argument('--port', type=int, required=True, help='Puerto del nodo')
     parser.add_argument('--peers', type=str, help='Puertos de los nodos pares (separados por comas)')
+    parser.add_argument('--sync-mode', choices=['all', 'gossip'], default='all',
+                        help='all: deltas a todos los pares cada ronda; gossip: push-pull con `fanout` pares al azar')
+    parser.add_argument('--fanout', type=int, default=3, help='Pares por ronda en modo gossip')
+    parser.add_argument('--rumor-limit', type=int, default=3,
+                        help='Pares que deben conocer ya un rumor para dejar de propagarlo')
+    parser.add_argument('--gossip-interval', type=float, default=1.0, help='Segundos entre rondas de gossip')
+    parser.add_argument('--anti-entropy-every', type=int, default=10,
+                        help='Rondas entre intercambios de anti-entropía con un par al azar (0 los desactiva)')
+    parser.add_argument('--merkle-depth', type=int, default=12,
+                        help='Niveles del árbol de Merkle de anti-entropía (2^depth buckets)')
+    parser.add_argument('--max-clock-entries', type=int, default=10,
+                        help='Escritores por vector clock antes de podar los inactivos (0 desactiva la poda)')
+    parser.add_argument('--clock-prune-age', type=int, default=3600,
+                        help='Segundos sin escribir una clave (respecto de su última escritura) para podar a un escritor')
+    parser.add_argument('--sync-workers', type=int, default=8, help='Hilos para los envíos en paralelo a los pares')
+    parser.add_argument('--min-sync-delay', type=float, default=0.05,
+                        help='Segundos entre un cambio y la ronda que lo envía (agrupa las ráfagas)')
+    parser.add_argument('--max-sync-interval', type=float, default=30.0,
+                        help='Intervalo máximo entre rondas cuando no hay cambios')
+    parser.add_argument('--max-backoff', type=float, default=60.0,
+                        help='Espera máxima antes de reintentar con un par que no responde')
     
     args = parser.parse_args()
     
@@ -213,7 +556,12 @@ def main():
     if args.peers:
         peer_ports = [int(p) for p in args.peers.split(',')]
     
-    node = Node(args.id, args.port, peer_ports)
+    node = Node(args.id, args.port, peer_ports, sync_mode=args.sync_mode, fanout=args.fanout,
+                rumor_limit=args.rumor_limit, gossip_interval=args.gossip_interval,
+                anti_entropy_every=args.anti_entropy_every, merkle_depth=args.merkle_depth,
+                max_clock_entries=args.max_clock_entries, clock_prune_age=args.clock_prune_age,
+                sync_workers=args.sync_workers, min_sync_delay=args.min_sync_delay,
+                max_sync_interval=args.max_sync_interval, max_backoff=args.max_backoff)
     node.run()
 
 if __name__ == "__main__":
@@ -0,0 +1,115 @@
+# failure_detector.py
+"""
+Detector de fallos phi-accrual (Hayashibara et al.) para los pares de QuorumNode.
+
+En lugar de un veredicto binario por timeout, para cada par se mantiene una ventana
+de los intervalos entre heartbeats y se calcula phi = -log10(P(llegar aún más tarde)),
+suponiendo intervalos con distribución normal. Un phi de 1 significa ~10% de
+probabilidad de equivocarse al declarar caído al par, un phi de 8 ~0.000001%.
+
+    live     phi < suspect_phi
+    suspect  suspect_phi <= phi < dead_phi
+    dead     phi >= dead_phi
+"""
+import math
+import time
+import threading
+from collections import deque
+
+LIVE = "live"
+SUSPECT = "suspect"
+DEAD = "dead"
+
+
+class PhiAccrualDetector:
+    """Historial de llegadas de heartbeats de un solo par."""
+    def __init__(self, expected_interval, window_size=100, min_std_deviation=0.1, acceptable_pause=0.5):
+        self.window = deque(maxlen=window_size)
+        self.min_std_deviation = min_std_deviation
+        # Pausa tolerada (p. ej. GC o un pico de carga) antes de que phi empiece a crecer
+        self.acceptable_pause = acceptable_pause
+        # Semilla: se asume que el primer heartbeat llega tras `expected_interval`, así phi
+        # crece también para un par que nunca respondió desde el arranque
+        self.window.append(expected_interval)
+        self.window.append(expected_interval * 1.25)
+        self.last_arrival = time.monotonic()
+
+    def heartbeat(self, now=None, record_interval=True):
+        now = now if now is not None else time.monotonic()
+        if record_interval:
+            self.window.append(now - self.last_arrival)
+        self.last_arrival = now
+
+    def phi(self, now=None):
+        now = now if now is not None else time.monotonic()
+        elapsed = now - self.last_arrival
+        mean = sum(self.window) / len(self.window)
+        variance = sum((x - mean) ** 2 for x in self.window) / len(self.window)
+        mean += self.acceptable_pause
+        std = max(math.sqrt(variance), self.min_std_deviation)
+        # P(intervalo > elapsed) con la cola de la normal
+        p_later = 0.5 * math.erfc((elapsed - mean) / (std * math.sqrt(2)))
+        if p_later <= 1e-300:
+            return float("inf")
+        return -math.log10(p_later)
+
+
+class FailureDetector:
+    """
+    Tabla de salud de todos los pares. `on_recover(port)` se invoca cuando un par
+    sospechoso o caído vuelve a enviar heartbeats.
+    """
+    def __init__(self, peer_ports, expected_interval=0.5, suspect_phi=8.0, dead_phi=16.0, on_recover=None):
+        self.expected_interval = expected_interval
+        self.suspect_phi = suspect_phi
+        self.dead_phi = dead_phi
+        self.on_recover = on_recover
+        self.detectors = {port: PhiAccrualDetector(expected_interval) for port in peer_ports}
+        self.lock = threading.Lock()
+
+    def heartbeat(self, port):
+        """Registra un heartbeat del par; si estaba sospechoso o caído dispara `on_recover`."""
+        with self.lock:
+            detector = self.detectors.get(port)
+            if detector is None:
+                return
+            previous = self.classify(detector.phi())
+            # La duración de una caída no es un intervalo normal entre heartbeats: no se registra
+            detector.heartbeat(record_interval=previous == LIVE)
+        if previous != LIVE and self.on_recover:
+            print(f"[detector] El nodo {port} volvió a estar activo (antes: {previous}).")
+            self.on_recover(port)
+
+    def classify(self, phi):
+        if phi >= self.dead_phi:
+            return DEAD
+        if phi >= self.suspect_phi:
+            return SUSPECT
+        return LIVE
+
+    def status(self, port):
+        with self.lock:
+            detector = self.detectors.get(port)
+            return self.classify(detector.phi()) if detector else LIVE
+
+    def is_available(self, port):
+        return self.status(port) == LIVE
+
+    def order_by_health(self, ports):
+        """Ordena los pares: activos primero, luego sospechosos y al final los caídos (por phi)."""
+        with self.lock:
+            phis = {port: (self.detectors[port].phi() if port in self.detectors else 0.0) for port in ports}
+        return sorted(ports, key=lambda port: phis[port])
+
+    def table(self):
+        """Vista de la tabla de salud para /health."""
+        now = time.monotonic()
+        with self.lock:
+            return {
+                str(port): {
+                    "status": self.classify(detector.phi(now)),
+                    "phi": round(min(detector.phi(now), 1e6), 2),
+                    "seconds_since_heartbeat": round(now - detector.last_arrival, 3)
+                }
+                for port, detector in self.detectors.items()
+            }
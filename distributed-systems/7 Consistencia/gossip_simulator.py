@@ -0,0 +1,191 @@
+# gossip_simulator.py
+"""
+Simulador de la propagación entre nodos de eventual_consistency.py: compara la sincronización
+con todos los pares (modo all) con el gossip push-pull (modo gossip) según el tamaño del clúster.
+
+Los nodos son instancias reales de Node (misma lógica de deltas, rumores y anti-entropía), pero
+sus mensajes pasan por una red simulada en memoria que los serializa en JSON, cuenta mensajes
+y bytes (solicitud + respuesta) y puede perder una fracción de las solicitudes. El tiempo avanza
+en rondas: en cada una todos los nodos ejecutan `sync_round()` en orden aleatorio.
+
+Para cada tamaño se escriben `--updates` claves en nodos al azar y se mide cuántas rondas (y
+segundos, según el intervalo de cada modo) tarda el clúster en converger, los mensajes y bytes
+transmitidos hasta entonces y los mensajes por ronda una vez convergido (tráfico ocioso).
+
+Con --replica-keys mide además la anti-entropía por árboles de Merkle entre dos réplicas de
+ese tamaño que difieren en pocas claves: los bytes deberían crecer con las diferencias y no
+con el tamaño, a diferencia de enviar el vector clock de cada clave.
+
+Uso:
+    python gossip_simulator.py --sizes 10,25,50,100 --updates 100 --fanout 3
+    python gossip_simulator.py --sizes 50 --loss 0.1 --output gossip.json
+    python gossip_simulator.py --sizes 0 --replica-keys 100000 --diffs 0,1,10,100,1000
+"""
+import json
+import random
+import argparse
+
+from eventual_consistency import Node, SYNC_INTERVAL
+
+
+class Network:
+    def __init__(self, loss=0.0, seed=0):
+        self.nodes = {}
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.messages = 0
+        self.bytes = 0
+
+    def reset_counters(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def deliver(self, sender, port, path, payload):
+        request = json.dumps(payload)
+        self.messages += 1
+        self.bytes += len(request)
+        if self.rng.random() < self.loss:
+            return None # Solicitud perdida: el emisor lo ve como un par que no respondió
+        response = json.dumps(self.nodes[port].handlers[path](json.loads(request)))
+        self.bytes += len(response)
+        return json.loads(response)
+
+
+class SimulatedNode(Node):
+    def __init__(self, network, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.network = network
+
+    def post(self, port, path, payload):
+        return self.network.deliver(self.port, port, path, payload)
+
+    def run_on_peers(self, tasks):
+        # Sin hilos: los envíos de la ronda se completan antes de que siga la simulación
+        for port, task in tasks.items():
+            task(port)
+
+    def log(self, message):
+        pass
+
+
+def simulate(size, mode, updates, fanout, rumor_limit, anti_entropy_every, gossip_interval, loss, max_rounds, seed):
+    random.seed(seed)
+    network = Network(loss, seed)
+    ports = list(range(1, size + 1))
+    nodes = [
+        SimulatedNode(network, port, port, [p for p in ports if p != port], sync_mode=mode, fanout=fanout,
+                      rumor_limit=rumor_limit, gossip_interval=gossip_interval, anti_entropy_every=anti_entropy_every)
+        for port in ports
+    ]
+    network.nodes = {node.port: node for node in nodes}
+
+    # Ronda inicial sin datos (los pares intercambian sus watermarks) antes de medir
+    for node in nodes:
+        node.sync_round()
+    network.reset_counters()
+
+    for i in range(updates):
+        random.choice(nodes).local_put(f"key-{i:05d}", f"value-{i}")
+
+    rounds = None
+    for round_number in range(1, max_rounds + 1):
+        for node in random.sample(nodes, len(nodes)):
+            node.sync_round()
+        if all(len(node.data) == updates for node in nodes):
+            rounds = round_number
+            break
+    messages, sent_bytes = network.messages, network.bytes
+
+    # Tráfico una vez convergido (sin escrituras nuevas)
+    network.reset_counters()
+    idle_rounds = 5
+    for _ in range(idle_rounds):
+        for node in nodes:
+            node.sync_round()
+
+    interval = gossip_interval if mode == "gossip" else SYNC_INTERVAL
+    return {
+        "nodes": size,
+        "mode": mode,
+        "converged": rounds is not None,
+        "rounds": rounds,
+        "seconds": rounds * interval if rounds is not None else None,
+        "messages": messages,
+        "bytes": sent_bytes,
+        "idle_messages_per_round": network.messages / idle_rounds,
+        "idle_bytes_per_round": network.bytes / idle_rounds,
+    }
+
+
+def anti_entropy_cost(keys, diffs, seed):
+    """Bytes y mensajes de una anti-entropía entre dos réplicas de `keys` claves que difieren en `diffs`."""
+    random.seed(seed)
+    network = Network(0.0, seed)
+    a, b = (SimulatedNode(network, port, port, [3 - port]) for port in (1, 2))
+    network.nodes = {1: a, 2: b}
+    for i in range(keys):
+        a.local_put(f"key-{i:07d}", f"value-{i}")
+    with b.lock:
+        for key in a.data:
+            b.merge_remote(key, a.entry(key))
+    for i in random.sample(range(keys), diffs):
+        random.choice((a, b)).local_put(f"key-{i:07d}", f"changed-{i}")
+    # Referencia: enviar el vector clock de todas las claves
+    naive = len(json.dumps({key: a.data[key].context.to_wire() for key in a.data}))
+    a.anti_entropy_with(2)
+    converged = a.data.keys() == b.data.keys() and all(a.data[key] == b.data[key] for key in a.data)
+    return {"keys": keys, "diffs": diffs, "messages": network.messages, "bytes": network.bytes,
+            "all_clocks_bytes": naive, "converged": converged}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulador de sincronización all-to-all vs gossip para eventual_consistency.py')
+    parser.add_argument('--sizes', type=str, default='10,25,50,100', help='Tamaños de clúster, separados por comas')
+    parser.add_argument('--modes', type=str, default='all,gossip', help='Modos a comparar')
+    parser.add_argument('--updates', type=int, default=100, help='Claves escritas antes de medir la convergencia')
+    parser.add_argument('--fanout', type=int, default=3, help='Pares por ronda en modo gossip')
+    parser.add_argument('--rumor-limit', type=int, default=3, help='Pares que ya conocían un rumor antes de descartarlo')
+    parser.add_argument('--anti-entropy-every', type=int, default=10, help='Rondas de gossip entre anti-entropías')
+    parser.add_argument('--gossip-interval', type=float, default=1.0, help='Segundos por ronda de gossip')
+    parser.add_argument('--loss', type=float, default=0.0, help='Fracción de solicitudes perdidas')
+    parser.add_argument('--max-rounds', type=int, default=200, help='Rondas máximas por simulación')
+    parser.add_argument('--seed', type=int, default=1, help='Semilla aleatoria')
+    parser.add_argument('--replica-keys', type=int, help='Claves por réplica para medir la anti-entropía')
+    parser.add_argument('--diffs', type=str, default='0,1,10,100,1000', help='Claves distintas entre las dos réplicas')
+    parser.add_argument('--output', type=str, help='Archivo JSON para los resultados')
+    args = parser.parse_args()
+
+    results = []
+    if args.replica_keys:
+        print(f"Anti-entropía entre dos réplicas de {args.replica_keys} claves")
+        print(f"{'distintas':>10} {'mensajes':>9} {'KB':>10} {'KB (todos los clocks)':>22}")
+        for diffs in [int(d) for d in args.diffs.split(',')]:
+            result = anti_entropy_cost(args.replica_keys, diffs, args.seed)
+            results.append(result)
+            if not result["converged"]:
+                print(f"ERROR: las réplicas no convergieron con {diffs} claves distintas")
+            print(f"{diffs:>10} {result['messages']:>9} {result['bytes'] / 1024:>10.1f} {result['all_clocks_bytes'] / 1024:>22.1f}")
+        print()
+
+    sizes = [int(n) for n in args.sizes.split(',') if int(n) > 1]
+    if sizes:
+        print(f"{args.updates} claves nuevas, fanout {args.fanout}, pérdida {args.loss:.0%}")
+        print(f"{'nodos':>6} {'modo':<7} {'rondas':>7} {'segundos':>9} {'mensajes':>10} {'KB':>10} {'mensajes ociosos/ronda':>23}")
+    for size in sizes:
+        for mode in args.modes.split(','):
+            result = simulate(size, mode, args.updates, args.fanout, args.rumor_limit, args.anti_entropy_every,
+                              args.gossip_interval, args.loss, args.max_rounds, args.seed)
+            results.append(result)
+            rounds = result["rounds"] if result["converged"] else f">{args.max_rounds}"
+            seconds = f"{result['seconds']:.0f}" if result["converged"] else "-"
+            print(f"{size:>6} {mode:<7} {rounds:>7} {seconds:>9} {result['messages']:>10} "
+                  f"{result['bytes'] / 1024:>10.1f} {result['idle_messages_per_round']:>23.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
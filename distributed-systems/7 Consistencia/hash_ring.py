@@ -0,0 +1,102 @@
+# hash_ring.py
+"""
+Anillo de hashing consistente con nodos virtuales.
+
+Cada nodo físico ocupa `vnodes` posiciones en el anillo. La lista de preferencia de
+una clave son los primeros RF nodos físicos distintos que se encuentran recorriendo
+el anillo en sentido horario desde el hash de la clave. Al agregar o quitar un nodo
+solo se mueven las claves de los rangos adyacentes a sus posiciones (~1/N del total).
+"""
+import bisect
+import hashlib
+import argparse
+import threading
+
+
+def ring_hash(value):
+    """Posición en el anillo (entero de 64 bits) de una cadena."""
+    return int.from_bytes(hashlib.md5(str(value).encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, nodes=None, vnodes=64):
+        self.vnodes = vnodes
+        self.positions = []      # posiciones ordenadas de todos los nodos virtuales
+        self.owners = []         # nodo físico dueño de cada posición (mismo índice que positions)
+        self.nodes = set()
+        self.lock = threading.Lock()
+        for node in nodes or []:
+            self.add_node(node)
+
+    def add_node(self, node):
+        with self.lock:
+            if node in self.nodes:
+                return
+            self.nodes.add(node)
+            for i in range(self.vnodes):
+                position = ring_hash(f"{node}#{i}")
+                index = bisect.bisect(self.positions, position)
+                self.positions.insert(index, position)
+                self.owners.insert(index, node)
+
+    def remove_node(self, node):
+        with self.lock:
+            if node not in self.nodes:
+                return
+            self.nodes.discard(node)
+            kept = [(p, o) for p, o in zip(self.positions, self.owners) if o != node]
+            self.positions = [p for p, _ in kept]
+            self.owners = [o for _, o in kept]
+
+    def preference_list(self, key, rf):
+        """Retorna los `rf` nodos físicos distintos responsables de la clave, en orden de preferencia."""
+        with self.lock:
+            rf = min(rf, len(self.nodes))
+            replicas = []
+            if not self.positions:
+                return replicas
+            start = bisect.bisect(self.positions, ring_hash(key))
+            for offset in range(len(self.positions)):
+                owner = self.owners[(start + offset) % len(self.positions)]
+                if owner not in replicas:
+                    replicas.append(owner)
+                    if len(replicas) == rf:
+                        break
+            return replicas
+
+    def ownership(self):
+        """Fracción del anillo que pertenece a cada nodo físico (útil para verificar el balanceo)."""
+        with self.lock:
+            share = {node: 0 for node in self.nodes}
+            total = 2 ** 64
+            for i, position in enumerate(self.positions):
+                previous = self.positions[i - 1] if i > 0 else self.positions[-1] - total
+                share[self.owners[i]] += (position - previous) / total
+            return share
+
+
+def main():
+    """Demostración: balanceo del anillo y claves movidas al agregar un nodo."""
+    parser = argparse.ArgumentParser(description='Demostración del anillo de hashing consistente')
+    parser.add_argument('--nodes', type=int, default=4, help='Nodos iniciales')
+    parser.add_argument('--vnodes', type=int, default=64, help='Nodos virtuales por nodo físico')
+    parser.add_argument('--rf', type=int, default=3, help='Factor de replicación')
+    parser.add_argument('--keys', type=int, default=100000, help='Claves de prueba')
+    args = parser.parse_args()
+
+    ring = HashRing([5000 + i for i in range(args.nodes)], vnodes=args.vnodes)
+    keys = [f"key-{i}" for i in range(args.keys)]
+    before = {key: ring.preference_list(key, args.rf) for key in keys}
+
+    print("Fracción del anillo por nodo:")
+    for node, share in sorted(ring.ownership().items()):
+        print(f"  {node}: {share:.3f}")
+
+    ring.add_node(5000 + args.nodes)
+    moved = sum(1 for key in keys if ring.preference_list(key, args.rf)[0] != before[key][0])
+    print(f"Al agregar un nodo cambió el coordinador primario de {moved / len(keys):.1%} de las claves "
+          f"(ideal: {1 / (args.nodes + 1):.1%}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# hint_log.py
+"""
+Almacenamiento persistente de hints (Hinted Handoff) para QuorumNode.
+
+Cada nodo destino tiene su propio log en disco (hints-<puerto>.log, una línea JSON por hint;
+los hints entregados o descartados se marcan con una línea {"k", "t", "d": 1}).
+En memoria solo se guarda un índice {clave: posición del hint más reciente}, por lo que:
+  - los hints se fusionan por clave: solo se conserva el de timestamp más nuevo,
+  - la memoria crece con las claves distintas, no con la cantidad de escrituras,
+  - el log se compacta cuando la mayor parte de su contenido quedó obsoleto,
+  - hay un tope de bytes y de antigüedad por destino; lo que se descarta lo recupera la anti-entropía.
+
+Los hints son best-effort (igual que en Cassandra/Dynamo): no se hace fsync por escritura.
+"""
+import os
+import json
+import time
+import threading
+from itertools import islice
+
+
+class HintLog:
+    """Log de hints de un solo nodo destino."""
+    def __init__(self, path, max_bytes, max_age):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        # {key: [timestamp, offset, length, created]} en orden de offset (el más antiguo primero):
+        # al reemplazar un hint la clave se reinserta al final
+        self.index = {}
+        self.live_bytes = 0
+        self.dropped = 0
+        self.delivering = False
+        self.last_age_check = time.time()
+        self.load()
+
+    def load(self):
+        """Reconstruye el índice desde el log (se queda con el hint más nuevo por clave)."""
+        offset = 0
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Línea truncada por una caída: se descarta la cola del log
+                        break
+                    if record.get("d"):
+                        self.unindex(record["k"], record["t"])
+                    else:
+                        self.index_record(record["k"], record["t"], offset, len(line), record["c"])
+                    offset += len(line)
+            # Trunca una posible cola corrupta para que los próximos append queden alineados
+            os.truncate(self.path, offset)
+        self.file = open(self.path, "a+b", buffering=0)
+        self.size = offset
+
+    def index_record(self, key, timestamp, offset, length, created):
+        current = self.index.get(key)
+        if current is not None:
+            if current[0] >= timestamp:
+                return False
+            self.live_bytes -= current[2]
+            del self.index[key]
+        self.index[key] = [timestamp, offset, length, created]
+        self.live_bytes += length
+        return True
+
+    def unindex(self, key, timestamp):
+        """Quita la clave del índice si su hint no es más nuevo que `timestamp`."""
+        current = self.index.get(key)
+        if current is not None and current[0] <= timestamp:
+            del self.index[key]
+            self.live_bytes -= current[2]
+            return True
+        return False
+
+    def append(self, data):
+        self.file.write(data)
+        self.size += len(data)
+
+    def mark_removed(self, removed):
+        """Persiste en una sola escritura las marcas de borrado de [(key, timestamp)]."""
+        if removed:
+            self.append(b"".join(
+                json.dumps({"k": key, "t": timestamp, "d": 1}).encode("utf-8") + b"\n" for key, timestamp in removed
+            ))
+
+    def add(self, key, value, timestamp):
+        current = self.index.get(key)
+        if current is not None and current[0] >= timestamp:
+            return
+        created = time.time()
+        line = json.dumps({"k": key, "v": value, "t": timestamp, "c": created}).encode("utf-8") + b"\n"
+        self.index_record(key, timestamp, self.size, len(line), created)
+        self.append(line)
+        self.enforce_limits()
+        if self.size > 1024 * 1024 and self.size > 2 * self.live_bytes:
+            self.compact()
+
+    def read(self, key):
+        """Lee del disco el hint vigente de una clave: (value, timestamp)."""
+        timestamp, offset, length, _ = self.index[key]
+        record = json.loads(os.pread(self.file.fileno(), length, offset))
+        return record["v"], record["t"]
+
+    def enforce_limits(self):
+        """
+        Descarta hints más viejos que `max_age` y, si se supera `max_bytes`, los más antiguos
+        hasta bajar al 90% del tope (así el costo se amortiza entre muchas escrituras).
+        """
+        now = time.time()
+        over_size = self.live_bytes > self.max_bytes
+        check_age = self.max_age and now - self.last_age_check >= min(60, self.max_age)
+        if not over_size and not check_age:
+            return
+        if check_age:
+            self.last_age_check = now
+        cutoff = now - self.max_age if self.max_age else None
+        target_bytes = self.max_bytes * 0.9 if over_size else self.max_bytes
+        removed = []
+        while self.index:
+            key = next(iter(self.index))
+            entry = self.index[key]
+            expired = cutoff is not None and entry[3] < cutoff
+            if not expired and self.live_bytes <= target_bytes:
+                break
+            del self.index[key]
+            self.live_bytes -= entry[2]
+            removed.append((key, entry[0]))
+        self.dropped += len(removed)
+        self.mark_removed(removed)
+
+    def compact(self):
+        """Reescribe el log solo con los hints vigentes."""
+        tmp_path = self.path + ".tmp"
+        new_index = {}
+        offset = 0
+        with open(tmp_path, "wb") as out:
+            for key, (timestamp, old_offset, length, created) in self.index.items():
+                out.write(os.pread(self.file.fileno(), length, old_offset))
+                new_index[key] = [timestamp, offset, length, created]
+                offset += length
+        self.file.close()
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, "a+b", buffering=0)
+        self.index = new_index
+        self.size = offset
+        self.live_bytes = offset
+
+    def ack(self, delivered):
+        """Elimina los hints entregados ({key: timestamp}) que siguen siendo la versión vigente."""
+        removed = [(key, timestamp) for key, timestamp in delivered.items() if self.unindex(key, timestamp)]
+        if not self.index:
+            # Todo entregado: el log se vacía
+            self.file.truncate(0)
+            self.size = 0
+            self.live_bytes = 0
+        else:
+            self.mark_removed(removed)
+
+    def close(self):
+        self.file.close()
+
+
+class HintStore:
+    """Conjunto de logs de hints, uno por nodo destino, en `hints_dir`."""
+    def __init__(self, hints_dir, max_bytes_per_target=64 * 1024 * 1024, max_age=3 * 3600):
+        self.hints_dir = hints_dir
+        self.max_bytes = max_bytes_per_target
+        self.max_age = max_age
+        self.logs = {}
+        self.lock = threading.Lock()
+        os.makedirs(hints_dir, exist_ok=True)
+        for name in os.listdir(hints_dir):
+            if name.startswith("hints-") and name.endswith(".log"):
+                port = int(name[len("hints-"):-len(".log")])
+                self.logs[port] = HintLog(os.path.join(hints_dir, name), self.max_bytes, self.max_age)
+        pending = {port: len(log.index) for port, log in self.logs.items() if log.index}
+        if pending:
+            print(f"[hints] Recuperados hints pendientes desde {hints_dir}: {pending}")
+
+    def log_for(self, port):
+        log = self.logs.get(port)
+        if log is None:
+            log = HintLog(os.path.join(self.hints_dir, f"hints-{port}.log"), self.max_bytes, self.max_age)
+            self.logs[port] = log
+        return log
+
+    def add(self, port, key, value, timestamp):
+        with self.lock:
+            self.log_for(port).add(key, value, timestamp)
+
+    def targets(self):
+        """Destinos con hints pendientes."""
+        with self.lock:
+            return [port for port, log in self.logs.items() if log.index]
+
+    def pending(self, port):
+        with self.lock:
+            log = self.logs.get(port)
+            return len(log.index) if log else 0
+
+    def begin_delivery(self, port):
+        """Marca el destino como 'en entrega'; retorna False si otro hilo ya lo está entregando."""
+        with self.lock:
+            log = self.log_for(port)
+            if log.delivering:
+                return False
+            log.delivering = True
+            return True
+
+    def end_delivery(self, port):
+        with self.lock:
+            self.log_for(port).delivering = False
+
+    def next_batch(self, port, size):
+        """Hasta `size` hints del destino en orden de llegada: {key: (value, timestamp)}."""
+        with self.lock:
+            log = self.logs.get(port)
+            if not log:
+                return {}
+            log.enforce_limits()
+            return {key: log.read(key) for key in islice(log.index, size)}
+
+    def ack(self, port, delivered):
+        """Confirma la entrega de {key: timestamp}."""
+        with self.lock:
+            log = self.logs.get(port)
+            if log:
+                log.ack(delivered)
+
+    def stats(self):
+        with self.lock:
+            return {
+                port: {"keys": len(log.index), "bytes": log.live_bytes, "dropped": log.dropped}
+                for port, log in self.logs.items()
+            }
+
+    def close(self):
+        with self.lock:
+            for log in self.logs.values():
+                log.close()
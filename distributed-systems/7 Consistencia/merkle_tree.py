@@ -0,0 +1,95 @@
+# merkle_tree.py
+"""
+Árboles de Merkle incrementales para anti-entropía entre réplicas de QuorumNode.
+
+El espacio de claves se divide en 2^depth buckets según el hash de la clave. El hash
+de un bucket es el XOR de hash(clave, timestamp) de sus claves, por lo que una escritura
+actualiza la hoja y sus ancestros en O(depth) sin recorrer los datos. Los nodos internos
+también son el XOR de sus hijos.
+
+Con un anillo de hashing consistente dos nodos solo comparten parte de sus claves, por eso
+se mantiene un árbol por par que cubre únicamente las claves que ambos replican.
+"""
+import hashlib
+import threading
+
+
+def entry_hash(key, timestamp):
+    """Hash de 64 bits de una versión (clave, timestamp)."""
+    return int.from_bytes(hashlib.blake2b(f"{key}|{timestamp!r}".encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def key_bucket(key, depth):
+    """Bucket (hoja) de una clave: los `depth` bits superiores de su hash."""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> (64 - depth)
+
+
+class MerkleTree:
+    """Árbol binario completo en un arreglo (índice 1 = raíz, hijos de i en 2i y 2i+1)."""
+    def __init__(self, depth):
+        self.depth = depth
+        self.nodes = [0] * (2 ** (depth + 1))
+
+    def apply(self, bucket, delta):
+        """Aplica un cambio XOR a una hoja y propaga a todos sus ancestros."""
+        index = 2 ** self.depth + bucket
+        while index >= 1:
+            self.nodes[index] ^= delta
+            index //= 2
+
+    def hashes(self, indices):
+        return [self.nodes[i] for i in indices]
+
+
+class MerkleIndex:
+    """
+    Mantiene un MerkleTree por par y el índice bucket -> {clave: timestamp} de las claves locales.
+    `replicas_for(key)` indica con qué pares se comparte cada clave.
+    """
+    def __init__(self, local_port, peer_ports, replicas_for, depth=10):
+        self.local_port = local_port
+        self.depth = depth
+        self.replicas_for = replicas_for
+        self.trees = {port: MerkleTree(depth) for port in peer_ports}
+        self.buckets = {}        # {bucket: {key: timestamp}}
+        self.lock = threading.Lock()
+
+    def record(self, key, old_timestamp, new_timestamp):
+        """
+        Listener del motor de almacenamiento: actualiza el bucket y los árboles de los pares que
+        replican la clave (`new_timestamp` None: la clave se purgó y sale del árbol).
+        """
+        bucket = key_bucket(key, self.depth)
+        delta = entry_hash(key, new_timestamp) if new_timestamp is not None else 0
+        if old_timestamp is not None:
+            delta ^= entry_hash(key, old_timestamp)
+        sharing = [port for port in self.replicas_for(key) if port != self.local_port and port in self.trees]
+        with self.lock:
+            if new_timestamp is None:
+                self.buckets.get(bucket, {}).pop(key, None)
+            else:
+                self.buckets.setdefault(bucket, {})[key] = new_timestamp
+            for port in sharing:
+                self.trees[port].apply(bucket, delta)
+
+    def hashes_for(self, peer, indices):
+        """Hashes de los nodos `indices` del árbol compartido con `peer`."""
+        with self.lock:
+            tree = self.trees.get(peer)
+            return tree.hashes(indices) if tree else [0] * len(indices)
+
+    def bucket_entries(self, peer, bucket):
+        """Claves del bucket compartidas con `peer`: {key: timestamp}."""
+        with self.lock:
+            entries = dict(self.buckets.get(bucket, {}))
+        return {
+            key: timestamp for key, timestamp in entries.items()
+            if peer in self.replicas_for(key)
+        }
+
+    def leaf_index(self, bucket):
+        return 2 ** self.depth + bucket
+
+    def bucket_of_index(self, index):
+        return index - 2 ** self.depth
@@ -0,0 +1,209 @@
+# metrics.py
+"""
+Métricas de QuorumNode: contadores e histogramas de latencia baratos de registrar.
+
+Cada serie reparte sus valores en SHARDS copias con un lock propio cada una. Cada hilo
+escribe siempre en la misma copia (asignada en orden la primera vez que registra algo), así
+que hilos distintos rara vez compiten por un lock, y la memoria no crece con los hilos que
+el servidor crea y descarta. Al leer (/metrics) se suman las copias.
+
+Los histogramas usan buckets fijos con razón √2 entre 50µs y ~37s, por lo que los
+percentiles son estimaciones con un error relativo acotado (< 41%) y costo de registro O(log buckets).
+"""
+import time
+import bisect
+import itertools
+import threading
+from contextlib import contextmanager
+
+# Límites superiores (en segundos) de los buckets de latencia
+LATENCY_BUCKETS = [0.00005 * 2 ** (i / 2) for i in range(40)]
+
+# Copias de los valores de cada serie
+SHARDS = 8
+
+# Copia asignada a cada hilo, común a todas las series
+thread_slots = itertools.count()
+thread_slot = threading.local()
+
+
+def current_slot():
+    slot = getattr(thread_slot, "index", None)
+    if slot is None:
+        slot = thread_slot.index = next(thread_slots) % SHARDS
+    return slot
+
+
+class ShardedValues:
+    """Arreglo de valores numéricos repartido en SHARDS copias, cada una con su lock."""
+    def __init__(self, size):
+        self.size = size
+        self.shards = [[0] * size for _ in range(SHARDS)]
+        self.locks = [threading.Lock() for _ in range(SHARDS)]
+
+    def shard(self):
+        """(lock, valores) de la copia del hilo actual: se escribe en los valores con el lock tomado."""
+        slot = current_slot()
+        return self.locks[slot], self.shards[slot]
+
+    def totals(self):
+        return [sum(column) for column in zip(*self.shards)]
+
+
+class Counter:
+    def __init__(self):
+        self.values = ShardedValues(1)
+
+    def add(self, amount=1):
+        lock, values = self.values.shard()
+        with lock:
+            values[0] += amount
+
+    def value(self):
+        return self.values.totals()[0]
+
+
+class Histogram:
+    """Histograma de latencias: un contador por bucket (+ desborde) y la suma total."""
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        # [bucket 0, ..., bucket n-1, desborde, suma]
+        self.values = ShardedValues(len(bounds) + 2)
+
+    def observe(self, seconds):
+        bucket = bisect.bisect_left(self.bounds, seconds)
+        lock, values = self.values.shard()
+        with lock:
+            values[bucket] += 1
+            values[-1] += seconds
+
+    def summary(self):
+        totals = self.values.totals()
+        counts, total = totals[:-1], totals[-1]
+        count = sum(counts)
+        summary = {"count": count, "sum": round(total, 6), "mean": round(total / count, 6) if count else 0}
+        for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("p999", 0.999)):
+            summary[name] = round(self.quantile(counts, count, q), 6)
+        return summary
+
+    def quantile(self, counts, count, q):
+        """Estimación del cuantil `q` interpolando linealmente dentro del bucket que lo contiene."""
+        if not count:
+            return 0.0
+        rank = q * count
+        cumulative = 0
+        for i, bucket_count in enumerate(counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                if i >= len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                return lower + (self.bounds[i] - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.bounds[-1]
+
+    def cumulative_buckets(self):
+        """[(límite, observaciones <= límite)] para el formato de Prometheus."""
+        totals = self.values.totals()
+        buckets = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.bounds, totals):
+            cumulative += bucket_count
+            buckets.append((bound, cumulative))
+        return buckets, cumulative + totals[len(self.bounds)], totals[-1]
+
+
+class Metrics:
+    """
+    Registro de series por (nombre, etiquetas). Las series se crean al primer uso:
+        metrics.inc("peer_rpc_errors_total", peer=7002, rpc="read_request")
+        metrics.observe("http_request_seconds", 0.004, route="/get/<key>")
+    Los gauges se fijan al momento de leer (p. ej. el backlog de hints).
+    """
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+
+    def series(self, table, factory, name, labels):
+        key = series_key(name, labels)
+        series = table.get(key)
+        if series is None:
+            with self.lock:
+                series = table.setdefault(key, factory())
+        return series
+
+    def inc(self, name, amount=1, **labels):
+        self.series(self.counters, Counter, name, labels).add(amount)
+
+    def observe(self, name, seconds, **labels):
+        self.series(self.histograms, Histogram, name, labels).observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Registra en el histograma `name` la duración del bloque."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def set_gauge(self, name, value, **labels):
+        key = series_key(name, labels)
+        with self.lock:
+            self.gauges[key] = value
+
+    def snapshot(self):
+        """Vista JSON: {"counters"|"gauges"|"histograms": {nombre: [{"labels", ...}]}}."""
+        with self.lock:
+            counters = list(self.counters.items())
+            histograms = list(self.histograms.items())
+            gauges = list(self.gauges.items())
+        view = {"counters": {}, "gauges": {}, "histograms": {}}
+        for (name, labels), counter in counters:
+            view["counters"].setdefault(name, []).append({"labels": dict(labels), "value": counter.value()})
+        for (name, labels), value in gauges:
+            view["gauges"].setdefault(name, []).append({"labels": dict(labels), "value": value})
+        for (name, labels), histogram in histograms:
+            view["histograms"].setdefault(name, []).append({"labels": dict(labels), **histogram.summary()})
+        return view
+
+    def prometheus(self):
+        """Formato de texto de Prometheus."""
+        with self.lock:
+            counters = sorted(self.counters.items(), key=lambda item: item[0])
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            gauges = sorted(self.gauges.items(), key=lambda item: item[0])
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), counter in counters:
+            declare(name, "counter")
+            lines.append(f"{name}{format_labels(labels)} {counter.value()}")
+        for (name, labels), value in gauges:
+            declare(name, "gauge")
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        for (name, labels), histogram in histograms:
+            declare(name, "histogram")
+            buckets, count, total = histogram.cumulative_buckets()
+            for bound, cumulative in buckets:
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', f'{bound:.6g}'),))} {cumulative}")
+            lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def series_key(name, labels):
+    return name, tuple(sorted((label, str(label_value)) for label, label_value in labels.items()))
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{label}="{value}"' for label, value in labels) + "}"
@@ -2,11 +2,36 @@ import time
 import json
 import threading
 import requests
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 import random
 import argparse
 from datetime import datetime
+import base64
+import hashlib
 import concurrent.futures
+import asyncio
+from requests.adapters import HTTPAdapter
+from storage_engine import create_storage, DictStorage, with_ttl, expires_at, unwrap_value, is_live
+from hash_ring import HashRing
+from merkle_tree import MerkleIndex
+from failure_detector import FailureDetector
+from hint_log import HintStore
+from metrics import Metrics
+from read_repair import ReadRepairQueue
+from replica_selection import LatencyTracker, HedgePlan
+from bootstrap import SnapshotBootstrap
+from binary_protocol import BinaryServer, BinaryTransport, TRANSPORT_ERRORS, start_loop_thread
+
+try:
+    import resource
+except ImportError:
+    resource = None # Solo en sistemas Unix: /stats omite el pico de memoria del proceso
+
+try:
+    # Servidor WSGI opcional con soporte de keep-alive (el servidor de Flask cierra cada conexión)
+    from waitress import serve as waitress_serve
+except ImportError:
+    waitress_serve = None
 
 # Define Consistency Levels (usando constantes para claridad)
 CONSISTENCY_LEVELS = {
@@ -15,91 +40,409 @@ CONSISTENCY_LEVELS = {
     "ALL": 3     
 }
 
+# Claves por página de /scan
+SCAN_DEFAULT_LIMIT = 100
+SCAN_MAX_LIMIT = 1000
+# Claves por trozo del snapshot de bootstrap (y cuántas claves recorre la fuente como máximo por trozo)
+BOOTSTRAP_CHUNK_SIZE = 1000
+BOOTSTRAP_SCAN_FACTOR = 4
+
+def value_digest(value):
+    """Hash corto del valor para las lecturas por digest (se compara junto con el timestamp)."""
+    return hashlib.blake2b(json.dumps(value, sort_keys=True).encode("utf-8"), digest_size=8).hexdigest()
+
+def prefix_end(prefix):
+    """Menor cadena mayor que todas las que empiezan con `prefix` (None: sin límite superior)."""
+    stripped = prefix.rstrip("\U0010ffff")
+    return stripped[:-1] + chr(ord(stripped[-1]) + 1) if stripped else None
+
+def encode_scan_token(start):
+    """Token de continuación de /scan: la clave desde la que sigue la próxima página."""
+    return base64.urlsafe_b64encode(json.dumps({"start": start}).encode("utf-8")).decode("ascii")
+
+def decode_scan_token(token):
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode("ascii")))["start"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Token de continuación inválido")
+
+def record_peer_rpc(metrics, port, path, seconds, failed, latency=None):
+    """
+    Métricas de una RPC a un par; el tipo de RPC es el primer segmento de la ruta (sin la clave).
+    Las lecturas alimentan además el LatencyTracker que ordena las réplicas.
+    """
+    rpc = path.split("/")[1].split("?")[0]
+    metrics.observe("peer_rpc_seconds", seconds, peer=port, rpc=rpc)
+    if failed:
+        metrics.inc("peer_rpc_errors_total", peer=port, rpc=rpc)
+    if latency is not None and rpc in ("read_request", "read_request_batch"):
+        latency.record(port, seconds)
+
+class PeerTransport:
+    """
+    Capa de transporte entre nodos: mantiene una sesión HTTP por par con conexiones
+    persistentes (keep-alive) y un pool de tamaño acotado, en lugar de abrir una
+    conexión TCP nueva en cada solicitud.
+    """
+    def __init__(self, pool_size=16, host="localhost", metrics=None, latency=None):
+        self.pool_size = pool_size
+        self.host = host
+        self.metrics = metrics
+        self.latency = latency
+        self.sessions = {}       # {port: requests.Session}
+        self.sessions_lock = threading.Lock()
+
+    def session_for(self, port):
+        """Retorna (creándola si hace falta) la sesión con pool de conexiones del par."""
+        session = self.sessions.get(port)
+        if session is None:
+            with self.sessions_lock:
+                session = self.sessions.get(port)
+                if session is None:
+                    session = requests.Session()
+                    # pool_block=True: si el pool está lleno se espera una conexión libre en vez de abrir otra
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=True, max_retries=0)
+                    session.mount("http://", adapter)
+                    self.sessions[port] = session
+        return session
+
+    def request(self, method, port, path, timeout=3, **kwargs):
+        """Solicitud a un par; registra su latencia y si falló (sin respuesta o 5xx) por par y tipo de RPC."""
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = self.session_for(port).request(method, f"http://{self.host}:{port}{path}", timeout=timeout, **kwargs)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            if self.metrics is not None:
+                record_peer_rpc(self.metrics, port, path, time.perf_counter() - started, failed, self.latency)
+
+    def get(self, port, path, timeout=3, **kwargs):
+        return self.request("GET", port, path, timeout=timeout, **kwargs)
+
+    def post(self, port, path, timeout=3, **kwargs):
+        return self.request("POST", port, path, timeout=timeout, **kwargs)
+
+    def close(self):
+        """Cierra todas las conexiones abiertas."""
+        with self.sessions_lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+
 class QuorumNode:
     """
     Implementa un nodo de almacenamiento distribuido que utiliza el modelo de
-    Consistencia de Quórum (R + W > N) con timestamps para la resolución de conflictos.
+    Consistencia de Quórum (R + W > RF) con timestamps para la resolución de conflictos.
+    Cada clave se replica en RF nodos elegidos con un anillo de hashing consistente;
+    cualquier nodo puede coordinar una operación y la reenvía a las réplicas dueñas.
     Incluye Read Repair, niveles de consistencia y Hinted Handoff.
     """
-    def __init__(self, node_id, port, peer_ports=None, read_quorum=2, write_quorum=2):
+    def __init__(self, node_id, port, peer_ports=None, read_quorum=2, write_quorum=2,
+                 pool_size=16, rpc_workers=32, repair_workers=4, hint_workers=2, server_threads=16, storage=None,
+                 replication_factor=None, vnodes=64, anti_entropy_interval=10, merkle_depth=10, anti_entropy_batch_size=100,
+                 heartbeat_interval=0.5, hints_dir=None, max_hint_bytes=64 * 1024 * 1024, max_hint_age=3 * 3600,
+                 hint_batch_size=100, hint_rate=1000, repair_batch_size=100, repair_bandwidth=1024 * 1024,
+                 read_mode="digest", hedging=True, transport="http", binary_port_offset=10000,
+                 tombstone_grace=3 * 3600, reap_interval=60):
         self.node_id = node_id
         self.port = port
         self.peer_ports = peer_ports or []
-        self.data = {}           # Almacén clave-valor (diccionario)
-        self.timestamps = {}     # Timestamps para cada clave
-        self.lock = threading.Lock()
+        # Almacén clave-valor local con sus timestamps (por defecto en memoria, ver storage_engine.py).
+        # El motor aplica Last-Writer-Wins de forma atómica, por lo que no requiere un lock del nodo.
+        self.store = storage or create_storage("memory")
         
         # N: Número total de nodos en el clúster (local + pares)
         self.N = 1 + len(self.peer_ports) 
+        # RF: réplicas por clave (por defecto todas, como el comportamiento original)
+        self.replication_factor = replication_factor or self.N
         self.read_quorum = read_quorum
         self.write_quorum = write_quorum
+        # 'digest': el valor completo se pide a una sola réplica y a las demás solo (timestamp, hash);
+        # 'full': todas las réplicas envían el valor (comportamiento original)
+        self.read_mode = read_mode
 
-        # Hinted Handoff storage: {port: [{key, value, timestamp}, ...]}
-        self.hints = {}
-        self.hints_lock = threading.Lock() 
+        # Anillo de hashing consistente: los nodos se identifican por su puerto
+        self.ring = HashRing([self.port] + self.peer_ports, vnodes=vnodes)
+
+        # Hinted Handoff: un log en disco por nodo destino, acotado y fusionado por clave (ver hint_log.py)
+        self.hint_store = HintStore(hints_dir or f"hints-node-{node_id}", max_bytes_per_target=max_hint_bytes, max_age=max_hint_age)
+        self.hint_batch_size = hint_batch_size
+        self.hint_rate = hint_rate  # hints por segundo como máximo al entregar
 
         # --- Validación de Consistencia de Quórum ---
-        if self.read_quorum + self.write_quorum <= self.N:
-            print(f"ADVERTENCIA: Quórums (R={self.read_quorum}, W={self.write_quorum}) no garantizan consistencia fuerte (R+W > N={self.N}).")
+        if self.replication_factor > self.N:
+            raise ValueError(f"El factor de replicación ({self.replication_factor}) no puede ser mayor que el número total de nodos ({self.N}).")
+
+        if self.read_quorum + self.write_quorum <= self.replication_factor:
+            print(f"ADVERTENCIA: Quórums (R={self.read_quorum}, W={self.write_quorum}) no garantizan consistencia fuerte (R+W > RF={self.replication_factor}).")
         
         # Validación de mínimo quórum
-        if self.read_quorum > self.N or self.write_quorum > self.N:
-             raise ValueError(f"El quórum de lectura ({self.read_quorum}) o escritura ({self.write_quorum}) no puede ser mayor que el número total de nodos ({self.N}).")
+        if self.read_quorum > self.replication_factor or self.write_quorum > self.replication_factor:
+             raise ValueError(f"El quórum de lectura ({self.read_quorum}) o escritura ({self.write_quorum}) no puede ser mayor que el factor de replicación ({self.replication_factor}).")
         
+        # Transporte con conexiones persistentes y executors de larga vida (propiedad del nodo)
+        # Métricas (ver metrics.py): se registran sin locks y se exponen en /metrics
+        self.metrics = Metrics()
+        # Latencia de lectura por par (EWMA): las lecturas van a las réplicas más rápidas y,
+        # con `hedging`, se cubre con una réplica de reserva a la que supere su p95
+        self.latency = LatencyTracker()
+        self.hedging = hedging
+        self.transport = PeerTransport(pool_size=pool_size, metrics=self.metrics, latency=self.latency)
+        self.server_threads = server_threads
+        self.rpc_executor = concurrent.futures.ThreadPoolExecutor(max_workers=rpc_workers, thread_name_prefix=f"rpc-{node_id}")
+        self.repair_executor = concurrent.futures.ThreadPoolExecutor(max_workers=repair_workers, thread_name_prefix=f"repair-{node_id}")
+        # Hinted Handoff tiene su propio executor: una cola de hints hacia un nodo lento o que se
+        # recupera no debe dejar sin hilos a Read Repair, ni al revés
+        self.hint_executor = concurrent.futures.ThreadPoolExecutor(max_workers=hint_workers, thread_name_prefix=f"hints-{node_id}")
+
+        # transport='binary': read_request/write_request viajan en frames binarios multiplexados sobre
+        # una conexión TCP por par, en el puerto HTTP + binary_port_offset (ver binary_protocol.py).
+        # Todos los nodos del clúster deben usar el mismo transporte.
+        self.binary_port_offset = binary_port_offset
+        self.binary = None
+        if transport == "binary":
+            self.binary_loop = start_loop_thread(f"binary-{node_id}")
+            self.binary = BinaryTransport(self.binary_loop, binary_port_offset, on_rpc=self.record_binary_rpc)
+
+        # Read Repair en segundo plano: deduplicado, en lotes por réplica y con presupuesto de bytes/s (ver read_repair.py)
+        self.read_repair = ReadRepairQueue(
+            self.write_batch_to_node, self.repair_executor,
+            batch_size=repair_batch_size, bytes_per_second=repair_bandwidth, metrics=self.metrics
+        )
+
+        # Árboles de Merkle por par para anti-entropía: se construyen una vez con los datos
+        # existentes y luego el motor los actualiza incrementalmente en cada escritura aplicada
+        self.merkle = MerkleIndex(self.port, self.peer_ports, self.replicas_for, depth=merkle_depth)
+        for key, _, timestamp in self.store.items():
+            self.merkle.record(key, None, timestamp)
+        self.store.add_listener(self.merkle.record)
+
+        # Detector de fallos phi-accrual alimentado por heartbeats: cuando un par vuelve,
+        # se le entregan los hints de inmediato (sin bloquear su hilo de heartbeat)
+        self.heartbeat_interval = heartbeat_interval
+        self.failure_detector = FailureDetector(
+            self.peer_ports,
+            expected_interval=heartbeat_interval,
+            on_recover=lambda port: self.hint_executor.submit(self.deliver_hints, port)
+        )
+
         # Inicializar la aplicación Flask
         self.app = Flask(f"node-{node_id}")
         self.setup_routes()
 
+        # Un hilo de heartbeat por par, así un par lento no retrasa los heartbeats de los demás
+        for port in self.peer_ports:
+            threading.Thread(target=self.heartbeat_loop, args=(port,), daemon=True).start()
+
         # Inicia Hinted Handoff background thread
         self.handoff_thread = threading.Thread(target=self.process_hints, daemon=True)
         self.handoff_thread.start()
+
+        # Bootstrap por snapshot en curso o terminado (ver bootstrap.py)
+        self.bootstrap = None
+        self.bootstrap_lock = threading.Lock()
+
+        # Inicia el servicio de anti-entropía (0 lo desactiva)
+        self.anti_entropy_interval = anti_entropy_interval
+        self.anti_entropy_batch_size = anti_entropy_batch_size  # claves por solicitud al enviarle diferencias a un par
+        if anti_entropy_interval and self.peer_ports:
+            self.anti_entropy_thread = threading.Thread(target=self.anti_entropy_loop, daemon=True)
+            self.anti_entropy_thread.start()
+
+        # Borrados y TTL: las lápidas y los valores expirados se purgan pasado `tombstone_grace`
+        # (debe superar la duración de una caída que todavía se quiera reparar con hints o anti-entropía)
+        self.tombstone_grace = tombstone_grace
+        self.reap_interval = reap_interval
+        if reap_interval:
+            threading.Thread(target=self.reaper_loop, daemon=True).start()
     
     # --- Lógica de Hinted Handoff ---
     def process_hints(self, interval=5):
-        """Intenta entregar las escrituras perdidas a los nodos que han vuelto a estar en línea."""
+        """
+        Red de seguridad: la entrega normal la dispara el detector de fallos cuando el par vuelve;
+        este hilo reintenta periódicamente los hints de los pares que el detector considera activos.
+        """
         print(f"[{self.node_id}] Hilo de Hinted Handoff iniciado.")
         while True:
             time.sleep(interval)
             
-            with self.hints_lock:
-                ports_to_check = list(self.hints.keys())
+            ports_to_check = self.hint_store.targets()
             
             for port in ports_to_check:
-                if self.is_node_up(port):
+                if self.failure_detector.is_available(port):
                     self.deliver_hints(port)
 
-    def is_node_up(self, port):
-        """Verifica si un nodo está activo enviando una solicitud GET simple."""
-        try:
-            requests.get(f"http://localhost:{port}/", timeout=1)
-            return True
-        except requests.exceptions.RequestException:
-            return False
+    def reaper_loop(self):
+        """Purga periódicamente las lápidas y los valores expirados que superaron el período de gracia."""
+        while True:
+            time.sleep(self.reap_interval)
+            try:
+                purged = self.store.purge_expired(time.time(), self.tombstone_grace)
+            except Exception as e:
+                print(f"[{self.node_id}] Error purgando claves expiradas: {e}")
+                continue
+            if purged:
+                self.metrics.inc("reaped_total", purged)
+                print(f"[{self.node_id}] Purgadas {purged} lápidas y claves expiradas.")
 
-    def deliver_hints(self, port):
-        """Entrega los hints al nodo recién recuperado."""
-        with self.hints_lock:
-            # Se usa pop para asegurar que solo un hilo lo procese y se elimine al completarse
-            hints_to_deliver = self.hints.pop(port, [])
+    # --- Detección de fallos ---
+    def heartbeat_loop(self, port):
+        """Envía heartbeats periódicos a un par y registra las respuestas en el detector phi-accrual."""
+        while True:
+            try:
+                response = self.transport.get(port, "/heartbeat", timeout=max(1, 2 * self.heartbeat_interval))
+                if response.status_code == 200:
+                    self.failure_detector.heartbeat(port)
+            except requests.exceptions.RequestException:
+                # Sin respuesta no hay heartbeat: phi seguirá creciendo
+                pass
+            time.sleep(self.heartbeat_interval)
+
+    def plan_peer_requests(self, peers, required):
+        """
+        Decide a qué réplicas remotas contactar: siempre a las activas y a las sospechosas/caídas
+        solo si hacen falta para reunir `required` respuestas (None = todas).
+        Retorna (a_contactar, omitidas).
+        """
+        ordered = self.failure_detector.order_by_health(peers)
+        live = [port for port in ordered if self.failure_detector.is_available(port)]
+        unhealthy = [port for port in ordered if port not in live]
+        needed = len(unhealthy) if required is None else max(0, required - len(live))
+        return live + unhealthy[:needed], unhealthy[needed:]
 
-        if not hints_to_deliver:
+    def plan_read_requests(self, peers, required):
+        """
+        Réplicas remotas de una lectura: las `required` activas más rápidas según su latencia
+        (completando con sospechosas si no alcanzan) y el resto como reservas, en orden de preferencia.
+        Con `required=None` se consulta a todas. Retorna (a_contactar, reservas).
+        """
+        live = self.latency.order([port for port in peers if self.failure_detector.is_available(port)])
+        unhealthy = self.failure_detector.order_by_health([port for port in peers if port not in live])
+        ordered = live + unhealthy
+        if required is None:
+            return ordered, []
+        return ordered[:required], ordered[required:]
+
+    def deliver_hints(self, port):
+        """
+        Entrega los hints al nodo recién recuperado en lotes (una solicitud por lote),
+        limitando la tasa a `hint_rate` hints por segundo para no saturar al nodo que vuelve.
+        """
+        # Solo un hilo entrega a cada destino a la vez
+        if not self.hint_store.begin_delivery(port):
             return
+        try:
+            pending = self.hint_store.pending(port)
+            if not pending:
+                return
 
-        print(f"[{self.node_id}] Entregando {len(hints_to_deliver)} hints al nodo {port}...")
-        
-        success_count = 0
-        for hint in hints_to_deliver:
-            # Reutiliza el método interno de escritura para entregar el hint
-            result = self.write_to_node(port, hint['key'], hint['value'], hint['timestamp'])
-            if result and result.get("status") == "success":
-                success_count += 1
-                
-        print(f"[{self.node_id}] Entrega de hints al nodo {port} completada. Exitosos: {success_count}/{len(hints_to_deliver)}")
+            print(f"[{self.node_id}] Entregando {pending} hints al nodo {port}...")
+            delivered_count = 0
+            while True:
+                batch = self.hint_store.next_batch(port, self.hint_batch_size)
+                if not batch:
+                    break
+                started = time.time()
+                result = self.write_batch_to_node(port, batch)
+                if not result or "results" not in result:
+                    print(f"[{self.node_id}] Entrega de hints al nodo {port} interrumpida: el nodo no responde.")
+                    break
+                # 'outdated' también cuenta como entregado: el destino ya tiene una versión más nueva
+                delivered = {
+                    key: batch[key][1] for key, status in result["results"].items()
+                    if key in batch and status in ("success", "outdated")
+                }
+                self.hint_store.ack(port, delivered)
+                self.metrics.inc("hints_delivered_total", len(delivered), peer=port)
+                delivered_count += len(delivered)
+                if len(delivered) < len(batch):
+                    # Algún hint fue rechazado: se reintenta en la próxima ronda en vez de insistir ahora
+                    break
+                min_duration = len(batch) / self.hint_rate
+                elapsed = time.time() - started
+                if elapsed < min_duration:
+                    time.sleep(min_duration - elapsed)
+
+            print(f"[{self.node_id}] Entrega de hints al nodo {port} completada. Exitosos: {delivered_count}/{pending}")
+        finally:
+            self.hint_store.end_delivery(port)
     
+    # --- Lógica de Anti-Entropía (árboles de Merkle) ---
+    def anti_entropy_loop(self):
+        """Cada intervalo compara el árbol de Merkle compartido con un par elegido al azar."""
+        print(f"[{self.node_id}] Hilo de anti-entropía iniciado (cada {self.anti_entropy_interval}s).")
+        while True:
+            time.sleep(self.anti_entropy_interval)
+            live_peers = [port for port in self.peer_ports if self.failure_detector.is_available(port)]
+            if not live_peers:
+                continue
+            port = random.choice(live_peers)
+            try:
+                self.run_anti_entropy(port)
+            except requests.exceptions.RequestException:
+                # Par caído: Hinted Handoff y la siguiente ronda se encargan
+                pass
+            except Exception as e:
+                print(f"[{self.node_id}] Error en anti-entropía con el nodo {port}: {e}")
+
+    def run_anti_entropy(self, port):
+        """
+        Desciende por el árbol nivel a nivel pidiendo al par solo los hashes de los hijos de
+        nodos distintos; al llegar a las hojas intercambia las claves de los buckets distintos
+        en ambas direcciones. Retorna (claves recibidas, claves enviadas).
+        """
+        depth = self.merkle.depth
+        indices = [1]
+        for level in range(depth + 1):
+            response = self.transport.post(port, "/anti_entropy/hashes", json={"peer": self.port, "indices": indices}, timeout=3)
+            response.raise_for_status()
+            remote_hashes = response.json()["hashes"]
+            local_hashes = self.merkle.hashes_for(port, indices)
+            differing = [i for i, local, remote in zip(indices, local_hashes, remote_hashes) if local != remote]
+            if not differing:
+                return 0, 0
+            if level < depth:
+                indices = [child for i in differing for child in (2 * i, 2 * i + 1)]
+
+        buckets = {}
+        for index in differing:
+            bucket = self.merkle.bucket_of_index(index)
+            buckets[str(bucket)] = self.merkle.bucket_entries(port, bucket)
+        response = self.transport.post(port, "/anti_entropy/bucket", json={"peer": self.port, "buckets": buckets}, timeout=10)
+        response.raise_for_status()
+        exchange = response.json()
+
+        # Dirección par -> local: aplicar las versiones más nuevas (Last-Writer-Wins)
+        received = sum(1 for entry in exchange["entries"] if self.store.put(entry["key"], entry["value"], entry["timestamp"]))
+
+        # Dirección local -> par: enviar las claves que el par tiene desactualizadas, en lotes
+        sent = 0
+        wanted = {}
+        for key in exchange["wanted"]:
+            entry = self.store.get(key)
+            if entry is not None:
+                wanted[key] = entry
+        keys = list(wanted)
+        for start in range(0, len(keys), self.anti_entropy_batch_size):
+            batch = {key: wanted[key] for key in keys[start:start + self.anti_entropy_batch_size]}
+            result = self.write_batch_to_node(port, batch)
+            if not result or "results" not in result:
+                break # El par dejó de responder: la siguiente ronda retoma las diferencias
+            sent += sum(1 for status in result["results"].values() if status == "success")
+
+        print(f"[{self.node_id}] Anti-entropía con el nodo {port}: {len(differing)} buckets distintos, {received} claves recibidas, {sent} enviadas.")
+        return received, sent
+
     # --- Lógica de Consistencia ---
+    def replicas_for(self, key):
+        """Lista de preferencia de la clave: los puertos de las RF réplicas dueñas (puede incluir el local)."""
+        return self.ring.preference_list(key, self.replication_factor)
+
     def get_required_quorum_size(self, level, op_type):
-        """Calcula el tamaño de quórum requerido basado en el nivel de consistencia."""
-        N = self.N
+        """Calcula el tamaño de quórum requerido basado en el nivel de consistencia (relativo a RF)."""
+        N = self.replication_factor
         
         if op_type == 'read':
             default_quorum = self.read_quorum
@@ -120,7 +463,7 @@ class QuorumNode:
             return default_quorum
 
     def perform_read_repair(self, chosen_value, all_results):
-        """Implementa Read Repair: Actualiza los nodos con valores desactualizados."""
+        """Implementa Read Repair: encola la versión elegida para los nodos con valores desactualizados."""
         latest_timestamp = chosen_value['timestamp']
         latest_key = chosen_value['key']
         latest_value = chosen_value['value']
@@ -135,19 +478,10 @@ class QuorumNode:
             # Nota: Si el valor elegido proviene de un par, el nodo local también puede estar desactualizado.
             # Sin embargo, el read repair solo repara pares. El cliente es responsable de usar el valor retornado.
 
-        # Inicia reparaciones asíncronas para los nodos pares desactualizados
-        if outdated_ports:
-            print(f"[{self.node_id}] Iniciando reparación de lectura para nodos desactualizados: {outdated_ports}")
-            
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                for port in outdated_ports:
-                    executor.submit(
-                        self.write_to_node, 
-                        port, 
-                        latest_key, 
-                        latest_value, 
-                        latest_timestamp
-                    )
+        # La cola descarta duplicados y envía en segundo plano: la lectura no espera las reparaciones
+        queued = [port for port in outdated_ports if self.read_repair.enqueue(port, latest_key, latest_value, latest_timestamp)]
+        if queued:
+            print(f"[{self.node_id}] Reparación de lectura encolada para nodos desactualizados: {queued}")
     
     def handle_hinted_handoff(self, key, value, timestamp, write_results):
         """Almacena un 'hint' (pista) para los nodos que fallaron en la escritura."""
@@ -160,19 +494,426 @@ class QuorumNode:
         if failed_ports:
             print(f"[{self.node_id}] Nodos no disponibles para Handoff: {failed_ports}. Almacenando hints.")
             
-            hint = {"key": key, "value": value, "timestamp": timestamp}
-            
-            with self.hints_lock:
-                for port in failed_ports:
-                    if port not in self.hints:
-                        self.hints[port] = []
-                    self.hints[port].append(hint)
+            for port in failed_ports:
+                self.hint_store.add(port, key, value, timestamp)
+                self.metrics.inc("hints_stored_total", peer=port)
+
+    # --- Lógica de las rutas (compartida por el servidor WSGI y el asíncrono de async_node.py) ---
+    # Cada método recibe los datos ya extraídos de la solicitud y retorna (respuesta, código HTTP).
+    def stored_value(self, value, ttl, timestamp):
+        """Valor a guardar para una escritura de cliente: envuelto con su expiración si trae `ttl` (segundos)."""
+        if ttl is None:
+            return value
+        if isinstance(ttl, bool) or not isinstance(ttl, (int, float)) or ttl <= 0:
+            raise ValueError("ttl debe ser un número de segundos positivo")
+        return with_ttl(value, timestamp + ttl)
+
+    def client_view(self, value):
+        """Campos de respuesta de un valor guardado: el valor del cliente y, si tiene TTL, su expiración."""
+        view = {"value": unwrap_value(value)}
+        if expires_at(value) is not None:
+            view["expires_at"] = expires_at(value)
+        return view
+
+    def describe(self):
+        return f"Nodo {self.node_id} activo en puerto {self.port}. Nodos totales (N): {self.N}. Factor de replicación (RF): {self.replication_factor}. Quórum de Lectura (R): {self.read_quorum}. Quórum de Escritura (W): {self.write_quorum}. Rutas principales: /get/<key>, /put, /delete/<key>, /mget, /mput, /scan, /ring, /health, /metrics, /stats, /bootstrap"
+
+    def ring_info(self, key=None):
+        """Reparto del anillo por nodo y, si se indica `key`, la lista de preferencia de esa clave."""
+        info = {
+            "nodes": sorted(self.ring.nodes),
+            "replication_factor": self.replication_factor,
+            "vnodes": self.ring.vnodes,
+            "ownership": {str(node): round(share, 4) for node, share in self.ring.ownership().items()}
+        }
+        if key:
+            info["key"] = key
+            info["replicas"] = self.replicas_for(key)
+        return info
+
+    def new_late_state(self):
+        """Estado compartido entre una lectura y sus respuestas tardías (ver handle_late_read)."""
+        return {"chosen": None, "results": None, "lock": threading.Lock()}
+
+    def resolve_read(self, key, level, required_r, results, late_state):
+        """Elige la versión más reciente entre las respuestas de una lectura y lanza el Read Repair."""
+        # Contar nodos que respondieron y tenían el valor
+        successful_responses = len([r for r in results if r is not None and "error" not in r])
+
+        if successful_responses < required_r:
+            print(f"Error: Falló al alcanzar el quórum de lectura '{level}' (R={required_r}). Respuestas: {successful_responses}")
+            self.metrics.inc("quorum_failures_total", op="read", level=level)
+            return {"error": f"Failed to reach read consistency level {level} ({required_r} nodes needed)"}, 503
+
+        # Filtrar resultados válidos y encontrar el más reciente (ante empates, uno con el valor y no solo su digest)
+        valid_results = [r for r in results if r and "error" not in r]
+        valid_results.sort(key=lambda x: (x['timestamp'], "value" in x), reverse=True)
+        chosen = valid_results[0]
+
+        # Implementar Read Repair (Ejecución asíncrona); las lápidas también se reparan
+        self.perform_read_repair(chosen, valid_results)
+        self.publish_read_outcome(late_state, chosen, valid_results)
+
+        if not is_live(chosen["value"], time.time()):
+            return {"error": "Key not found", "key": key, "timestamp": chosen["timestamp"], "consistency_level": level}, 404
+        return {
+            "key": chosen["key"],
+            **self.client_view(chosen["value"]),
+            "timestamp": chosen["timestamp"],
+            "source_node": chosen.get("node_id", self.node_id),
+            "consistency_level": level
+        }, 200
+
+    def resolve_write(self, key, value, timestamp, level, required_w, results):
+        """Verifica el quórum de una escritura y registra hints para las réplicas que fallaron."""
+        # Contamos las confirmaciones
+        success_count = sum(1 for r in results if r.get("status") == "success")
+
+        if success_count < required_w:
+            print(f"Error: Falló al alcanzar el quórum de escritura '{level}' (W={required_w}). Confirmaciones: {success_count}")
+            self.metrics.inc("quorum_failures_total", op="write", level=level)
+            return {"error": f"Failed to reach write consistency level {level} ({required_w} nodes needed)"}, 503
+
+        # Handle Hinted Handoff for failed nodes
+        self.handle_hinted_handoff(key, value, timestamp, results)
+
+        return {
+            "status": "success",
+            "key": key,
+            **self.client_view(value),
+            "timestamp": timestamp,
+            "confirmed_nodes": success_count,
+            "consistency_level": level
+        }, 200
+
+    def late_batch_read_handler(self, late_states):
+        """Callback para las respuestas tardías de un lote de lectura ({key: resultado})."""
+        def on_late_batch(batch_result):
+            for key, result in batch_result.items():
+                self.handle_late_read(late_states[key], result)
+        return on_late_batch
+
+    def resolve_batch_read(self, keys, level, required_r, results, late_states):
+        """Resuelve cada clave de un /mget por separado; 503 solo si fallan todas."""
+        response = {}
+        failed = 0
+        now = time.time()
+        for key in keys:
+            valid_results = [r for r in results[key] if "error" not in r]
+            if len(valid_results) < required_r:
+                response[key] = {"error": f"Failed to reach read consistency level {level} ({required_r} nodes needed)"}
+                failed += 1
+                continue
+            valid_results.sort(key=lambda x: x['timestamp'], reverse=True)
+            chosen = valid_results[0]
+            self.perform_read_repair(chosen, valid_results)
+            self.publish_read_outcome(late_states[key], chosen, valid_results)
+            if not is_live(chosen["value"], now):
+                response[key] = {"error": "Key not found", "timestamp": chosen["timestamp"]}
+                continue
+            response[key] = {
+                **self.client_view(chosen["value"]),
+                "timestamp": chosen["timestamp"],
+                "source_node": chosen.get("node_id", self.node_id)
+            }
+
+        if failed:
+            print(f"Error: {failed}/{len(keys)} claves no alcanzaron el quórum de lectura '{level}' (R={required_r}).")
+            self.metrics.inc("quorum_failures_total", failed, op="mget", level=level)
+        status = 503 if failed == len(keys) else 200
+        return {"results": response, "consistency_level": level}, status
+
+    def parse_batch_write(self, raw_items):
+        """
+        Valida los elementos de un /mput. Retorna ({key: (value, timestamp)}, respuestas de los
+        elementos inválidos, timestamp común del lote).
+        """
+        response = {}
+        items = {}
+        timestamp = time.time()
+        for item in raw_items:
+            key, value = item.get('key'), item.get('value')
+            if not key or not value:
+                response[str(key)] = {"status": "error", "error": "Missing key or value"}
+                continue
+            try:
+                items[key] = (self.stored_value(value, item.get('ttl'), timestamp), timestamp)
+            except ValueError as e:
+                response[str(key)] = {"status": "error", "error": str(e)}
+        return items, response, timestamp
+
+    def late_batch_write_handler(self, items, timestamp):
+        """Callback para las respuestas tardías de un lote de escritura: las réplicas caídas reciben un hint."""
+        def on_late_batch(batch_result):
+            for key, result in batch_result.items():
+                self.handle_hinted_handoff(key, items[key][0], timestamp, [result])
+        return on_late_batch
+
+    def resolve_batch_write(self, items, timestamp, level, required_w, results, response):
+        """Verifica el quórum de cada clave de un /mput; 503 solo si fallan todas."""
+        for key, key_results in results.items():
+            success_count = sum(1 for r in key_results if r.get("status") == "success")
+            if success_count < required_w:
+                response[key] = {"status": "error", "error": f"Failed to reach write consistency level {level} ({required_w} nodes needed)"}
+                continue
+            self.handle_hinted_handoff(key, items[key][0], timestamp, key_results)
+            response[key] = {"status": "success", "timestamp": timestamp, "confirmed_nodes": success_count}
+
+        failed = sum(1 for r in response.values() if r["status"] != "success")
+        if failed:
+            print(f"Error: {failed}/{len(response)} claves no alcanzaron el quórum de escritura '{level}' (W={required_w}).")
+            self.metrics.inc("quorum_failures_total", failed, op="mput", level=level)
+        status = 503 if failed == len(response) else 200
+        return {"results": response, "consistency_level": level}, status
+
+    def parse_scan(self, args):
+        """
+        Rango de un /scan a partir de sus parámetros (start, end, prefix, limit, continuation):
+        start inclusivo, end exclusivo. Retorna (start, end, limit); lanza ValueError si son inválidos.
+        """
+        start, end, prefix = args.get('start') or None, args.get('end') or None, args.get('prefix') or None
+        limit = int(args.get('limit', SCAN_DEFAULT_LIMIT))
+        if not 1 <= limit <= SCAN_MAX_LIMIT:
+            raise ValueError(f"limit debe estar entre 1 y {SCAN_MAX_LIMIT}")
+        if prefix:
+            start = prefix if start is None else max(start, prefix)
+            upper = prefix_end(prefix)
+            if upper is not None:
+                end = upper if end is None else min(end, upper)
+        token = args.get('continuation')
+        if token:
+            start = decode_scan_token(token)
+        return start, end, limit
+
+    def resolve_scan(self, level, required_r, limit, responses):
+        """
+        Fusiona los recorridos ordenados de los nodos ({puerto: respuesta de /scan_request}):
+        cada clave se resuelve por el timestamp más nuevo y necesita `required_r` réplicas que
+        hayan respondido. Las réplicas desactualizadas se reparan con la cola de Read Repair.
+        """
+        answered = {port: r for port, r in responses.items() if r is not None and "entries" in r}
+        # Cada nodo devolvió a lo sumo `limit` claves: el tramo fusionado solo está completo hasta
+        # la última clave de los nodos que cortaron su respuesta
+        frontier = min((r["entries"][-1]["key"] for r in answered.values() if r["truncated"]), default=None)
+        versions = {}  # {key: {port: (value, timestamp)}}
+        for port, r in answered.items():
+            for entry in r["entries"]:
+                if frontier is None or entry["key"] <= frontier:
+                    versions.setdefault(entry["key"], {})[port] = (entry["value"], entry["timestamp"])
+
+        keys = sorted(versions)[:limit]
+        entries = []
+        now = time.time()
+        for key in keys:
+            replicas = [port for port in self.replicas_for(key) if port in answered]
+            if len(replicas) < required_r:
+                print(f"Error: Falló al alcanzar el quórum de lectura '{level}' (R={required_r}) en el scan. Clave: {key}")
+                self.metrics.inc("quorum_failures_total", op="scan", level=level)
+                return {"error": f"Failed to reach read consistency level {level} ({required_r} nodes needed)"}, 503
+            value, timestamp = max(versions[key].values(), key=lambda version: version[1])
+            # Como en perform_read_repair, solo se reparan los pares (las réplicas sin la clave también)
+            for port in replicas:
+                if port != self.port and versions[key].get(port, (None, 0))[1] < timestamp:
+                    self.read_repair.enqueue(port, key, value, timestamp)
+            if is_live(value, now):
+                entries.append({"key": key, **self.client_view(value), "timestamp": timestamp})
+
+        more = frontier is not None or len(versions) > limit
+        return {
+            "entries": entries,
+            "count": len(entries),
+            "continuation": encode_scan_token(keys[-1] + "\x00") if more and keys else None,
+            "consistency_level": level
+        }, 200
+
+    def anti_entropy_exchange(self, peer, buckets):
+        """
+        Recibe {bucket: {key: timestamp}} del par y responde con las versiones locales más
+        nuevas ("entries") y las claves que el par debe enviar ("wanted").
+        """
+        entries = []
+        wanted = []
+        for bucket, remote_entries in buckets.items():
+            local_entries = self.merkle.bucket_entries(peer, int(bucket))
+            for key, timestamp in local_entries.items():
+                if timestamp > remote_entries.get(key, 0):
+                    entry = self.store.get(key)
+                    if entry is not None:
+                        entries.append({"key": key, "value": entry[0], "timestamp": entry[1]})
+            for key, timestamp in remote_entries.items():
+                if timestamp > local_entries.get(key, 0):
+                    wanted.append(key)
+        return {"entries": entries, "wanted": wanted}
+
+    def local_read(self, key, digest=False):
+        """Valor local de una clave para otro nodo (o solo su digest: timestamp y hash del valor)."""
+        entry = self.store.get(key)
+        if entry is not None:
+            value, timestamp = entry
+            if digest:
+                return {"key": key, "timestamp": timestamp, "digest": value_digest(value)}, 200
+            return {
+                "key": key,
+                "value": value,
+                "timestamp": timestamp
+            }, 200
+        return {"error": "Key not found"}, 404
+
+    def local_write(self, data):
+        """Aplica la escritura enviada por otro nodo."""
+        key = data.get('key')
+        value = data.get('value')
+        timestamp = data.get('timestamp', 0)
+
+        # Un valor None es una lápida (borrado), no un valor faltante
+        if not key or 'value' not in data:
+            return {"status": "error", "message": "Missing key/value"}, 400
+
+        # Solo actualizar si el timestamp es más reciente (Last-Writer-Wins en el motor)
+        if self.store.put(key, value, timestamp):
+            return {"status": "success"}, 200
+        # Indica que el nodo no fue actualizado porque tenía una versión más nueva o igual
+        return {"status": "outdated"}, 200
+
+    def snapshot_chunk(self, target, sources, after, limit):
+        """
+        Trozo del snapshot para el nodo `target`: claves locales posteriores a `after`, en orden,
+        de las que `target` es réplica y este nodo es la primera réplica entre `sources` (así cada
+        clave sale de una sola fuente). `next` es el cursor del trozo siguiente (None: terminado).
+        """
+        scan_limit = limit * BOOTSTRAP_SCAN_FACTOR
+        scanned = self.store.scan(None if after is None else after + "\x00", None, scan_limit)
+        entries = []
+        cursor = scanned[-1][0] if len(scanned) == scan_limit else None
+        for key, value, timestamp in scanned:
+            replicas = self.replicas_for(key)
+            if target in replicas and next((port for port in replicas if port in sources), None) == self.port:
+                entries.append({"key": key, "value": value, "timestamp": timestamp})
+                if len(entries) == limit:
+                    cursor = key
+                    break
+        return {"entries": entries, "next": cursor}
+
+    def start_bootstrap(self, sources=None, delay=0):
+        """
+        Lanza en segundo plano el bootstrap desde `sources` (por defecto, los pares activos tras
+        esperar `delay` segundos a que el detector de fallos los clasifique). 409 si ya hay uno en curso.
+        """
+        with self.bootstrap_lock:
+            if self.bootstrap is not None and self.bootstrap.state not in ("done", "failed"):
+                return {"error": "Bootstrap already running", "progress": self.bootstrap.progress()}, 409
+            self.bootstrap = SnapshotBootstrap(
+                self.fetch_snapshot_chunk,
+                apply=lambda entries: self.store.put_many([(e["key"], e["value"], e["timestamp"]) for e in entries]),
+                catch_up=lambda port: self.run_anti_entropy(port)[0],
+                metrics=self.metrics
+            )
+            bootstrap = self.bootstrap
+
+        def run():
+            time.sleep(delay)
+            bootstrap.run(sources or [port for port in self.peer_ports if self.failure_detector.is_available(port)])
+
+        threading.Thread(target=run, name=f"bootstrap-{self.node_id}", daemon=True).start()
+        return {"status": "started", "sources": sources or "live peers"}, 202
+
+    def bootstrap_status(self):
+        if self.bootstrap is None:
+            return {"state": "idle"}, 200
+        return self.bootstrap.progress(), 200
+
+    def local_scan(self, start, end, limit):
+        """Primeras `limit` claves locales del rango en orden; `truncated` indica que puede haber más."""
+        entries = self.store.scan(start, end, limit)
+        return {
+            "entries": [{"key": key, "value": value, "timestamp": timestamp} for key, value, timestamp in entries],
+            "truncated": len(entries) == limit
+        }
+
+    def local_read_batch(self, keys):
+        """Valores locales de varias claves (las ausentes se omiten)."""
+        entries = {}
+        for key in keys:
+            entry = self.store.get(key)
+            if entry is not None:
+                entries[key] = {"value": entry[0], "timestamp": entry[1]}
+        return {"entries": entries}
+
+    def local_write_batch(self, items):
+        """Aplica varias escrituras (Last-Writer-Wins por clave) y retorna el estado de cada una."""
+        results = {}
+        for item in items:
+            key, value = item.get('key'), item.get('value')
+            if not key or 'value' not in item:
+                continue
+            results[key] = "success" if self.store.put(key, value, item.get('timestamp', 0)) else "outdated"
+        return {"results": results}
+
+    def binary_server(self):
+        """Servidor del protocolo binario con los mismos manejadores que las rutas internas."""
+        return BinaryServer(
+            {"read_request": self.local_read, "write_request": self.local_write},
+            port=self.port + self.binary_port_offset,
+            inline=self.store_is_inline(), executor=self.rpc_executor
+        )
+
+    def store_is_inline(self):
+        """True si las operaciones del almacén local nunca tocan disco (motor en memoria sin presupuesto)."""
+        return isinstance(self.store, DictStorage) and self.store.spill is None
+
+    def record_binary_rpc(self, port, op, seconds, failed):
+        record_peer_rpc(self.metrics, port, f"/{op}", seconds, failed, self.latency)
+
+    def record_request(self, route, status, seconds):
+        """Latencia por ruta (plantilla, sin la clave) y respuestas por código."""
+        self.metrics.observe("http_request_seconds", seconds, route=route)
+        self.metrics.inc("http_responses_total", route=route, status=status)
+
+    def storage_stats(self):
+        """Memoria del almacenamiento local para /stats (estimada por el motor) y pico de memoria del proceso."""
+        stats = {"node_id": self.node_id, "storage": self.store.stats()}
+        if resource is not None:
+            # ru_maxrss está en KB en Linux
+            stats["process_max_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return stats
+
+    def metrics_view(self, prometheus=False):
+        """Métricas para /metrics; los gauges (backlog de hints, phi de los pares, memoria) se leen en este momento."""
+        for port, stats in self.hint_store.stats().items():
+            self.metrics.set_gauge("hint_backlog_keys", stats["keys"], peer=port)
+            self.metrics.set_gauge("hint_backlog_bytes", stats["bytes"], peer=port)
+            self.metrics.set_gauge("hints_dropped", stats["dropped"], peer=port)
+        for port, health in self.failure_detector.table().items():
+            self.metrics.set_gauge("peer_phi", health["phi"], peer=port)
+        for port, pending in self.read_repair.pending_counts().items():
+            self.metrics.set_gauge("read_repair_pending", pending, peer=port)
+        storage = self.store.stats()
+        self.metrics.set_gauge("storage_bytes", storage["total_bytes"])
+        self.metrics.set_gauge("storage_bytes_per_key", storage["bytes_per_key"])
+        if "spilled_keys" in storage:
+            self.metrics.set_gauge("storage_spilled_keys", storage["spilled_keys"])
+        return self.metrics.prometheus() if prometheus else self.metrics.snapshot()
 
     def setup_routes(self):
+
+        @self.app.before_request
+        def start_timer():
+            g.request_started = time.perf_counter()
+
+        @self.app.after_request
+        def record_request(response):
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            self.record_request(route, response.status_code, time.perf_counter() - g.request_started)
+            return response
         
         @self.app.route('/', methods=['GET'])
         def home():
-            return f"Nodo {self.node_id} activo en puerto {self.port}. Nodos totales (N): {self.N}. Quórum de Lectura (R): {self.read_quorum}. Quórum de Escritura (W): {self.write_quorum}. Rutas principales: /get/<key>, /put"
+            return self.describe()
+
+        @self.app.route('/ring', methods=['GET'])
+        def ring_info():
+            """Muestra el anillo (reparto por nodo) y, con ?key=, la lista de preferencia de esa clave."""
+            return jsonify(self.ring_info(request.args.get('key')))
         
         # --- Rutas que implementan el Quórum (Lectura para el Cliente) ---
         @self.app.route('/get/<key>', methods=['GET'])
@@ -181,32 +922,20 @@ class QuorumNode:
             # Obtiene el nivel de consistencia de la query string, o usa 'QUORUM' por defecto
             level = request.args.get('consistency', 'QUORUM').upper()
             required_r = self.get_required_quorum_size(level, 'read')
+            # Modo de lectura: ?read_mode=full|digest (por defecto el del nodo)
+            digest = request.args.get('read_mode', self.read_mode) == 'digest'
 
-            # 1. Obtener todas las respuestas
-            results = self.read_from_peers(key)
-            
-            # Contar nodos que respondieron y tenían el valor
-            successful_responses = len([r for r in results if r is not None and "error" not in r])
-
-            if successful_responses < required_r:
-                print(f"Error: Falló al alcanzar el quórum de lectura '{level}' (R={required_r}). Respuestas: {successful_responses}")
-                return jsonify({"error": f"Failed to reach read consistency level {level} ({required_r} nodes needed)"}), 503
-            
-            # 2. Filtrar resultados válidos y encontrar el más reciente
-            valid_results = [r for r in results if r and "error" not in r]
-            valid_results.sort(key=lambda x: x['timestamp'], reverse=True)
-            chosen = valid_results[0]
-            
-            # 3. Implementar Read Repair (Ejecución asíncrona)
-            self.perform_read_repair(chosen, valid_results)
-
-            return jsonify({
-                "key": chosen["key"],
-                "value": chosen["value"],
-                "timestamp": chosen["timestamp"],
-                "source_node": chosen.get("node_id", self.node_id),
-                "consistency_level": level
-            })
+            # Obtener respuestas hasta alcanzar el quórum (las tardías se procesan en segundo plano)
+            late_state = self.new_late_state()
+            with self.metrics.timer("quorum_wait_seconds", op="read", level=level):
+                results = self.read_from_peers(
+                    key,
+                    required=required_r,
+                    on_late_result=lambda result: self.handle_late_read(late_state, result),
+                    digest=digest
+                )
+            payload, status = self.resolve_read(key, level, required_r, results, late_state)
+            return jsonify(payload), status
         
         # --- Rutas que implementan el Quórum (Escritura para el Cliente) ---
         @self.app.route('/put', methods=['POST'])
@@ -222,106 +951,447 @@ class QuorumNode:
                 return jsonify({"error": "Missing key or value in request"}), 400
                 
             timestamp = time.time()
+            try:
+                # TTL opcional en segundos: la clave deja de leerse al expirar y el reaper la purga
+                value = self.stored_value(value, data.get('ttl'), timestamp)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
             required_w = self.get_required_quorum_size(level, 'write')
             
-            # 1. Escribir en todos los nodos (local + pares)
-            results = self.write_to_peers(key, value, timestamp)
-            
-            # Contamos las confirmaciones
-            success_count = sum(1 for r in results if r.get("status") == "success")
-            
-            # 2. Verificar Quórum
-            if success_count < required_w:
-                print(f"Error: Falló al alcanzar el quórum de escritura '{level}' (W={required_w}). Confirmaciones: {success_count}")
-                return jsonify({"error": f"Failed to reach write consistency level {level} ({required_w} nodes needed)"}), 503
-            
-            # 3. Handle Hinted Handoff for failed nodes (Ejecución asíncrona)
-            self.handle_hinted_handoff(key, value, timestamp, results)
-            
-            return jsonify({
-                "status": "success",
-                "key": key,
-                "value": value,
-                "timestamp": timestamp,
-                "confirmed_nodes": success_count,
-                "consistency_level": level
-            })
+            # Escribir en las réplicas; se responde en cuanto hay W confirmaciones
+            with self.metrics.timer("quorum_wait_seconds", op="write", level=level):
+                results = self.write_to_peers(
+                    key, value, timestamp,
+                    required=required_w,
+                    on_late_result=lambda result: self.handle_hinted_handoff(key, value, timestamp, [result])
+                )
+            payload, status = self.resolve_write(key, value, timestamp, level, required_w, results)
+            return jsonify(payload), status
+
+        @self.app.route('/delete/<key>', methods=['DELETE'])
+        def client_delete(key):
+            """Borrado con quórum: escribe una lápida (valor None) con timestamp, que gana a las versiones anteriores."""
+            level = request.args.get('consistency', 'QUORUM').upper()
+            timestamp = time.time()
+            required_w = self.get_required_quorum_size(level, 'write')
+            with self.metrics.timer("quorum_wait_seconds", op="delete", level=level):
+                results = self.write_to_peers(
+                    key, None, timestamp,
+                    required=required_w,
+                    on_late_result=lambda result: self.handle_hinted_handoff(key, None, timestamp, [result])
+                )
+            payload, status = self.resolve_write(key, None, timestamp, level, required_w, results)
+            return jsonify(payload), status
+
+        # --- Rutas por lotes para el Cliente ---
+        @self.app.route('/mget', methods=['GET', 'POST'])
+        def client_multi_read():
+            """
+            Lectura de varias claves con quórum por clave: una solicitud por réplica en lugar de una por clave.
+            Acepta ?keys=a,b,c o un cuerpo JSON {"keys": [...], "consistency": ...}.
+            """
+            data = request.get_json(silent=True) or {}
+            keys = data.get('keys') or [k for k in request.args.get('keys', '').split(',') if k]
+            level = (data.get('consistency') or request.args.get('consistency', 'QUORUM')).upper()
+            if not keys:
+                return jsonify({"error": "Missing keys in request"}), 400
+
+            keys = list(dict.fromkeys(keys))
+            required_r = self.get_required_quorum_size(level, 'read')
+            late_states = {key: self.new_late_state() for key in keys}
+            with self.metrics.timer("quorum_wait_seconds", op="mget", level=level):
+                results = self.read_batch_from_peers(keys, required_r, on_late_result=self.late_batch_read_handler(late_states))
+            payload, status = self.resolve_batch_read(keys, level, required_r, results, late_states)
+            return jsonify(payload), status
+
+        @self.app.route('/mput', methods=['POST'])
+        def client_multi_write():
+            """
+            Escritura de varias claves con quórum por clave: {"items": [{"key", "value"}, ...], "consistency": ...}.
+            Los fallos parciales se informan por clave.
+            """
+            data = request.json or {}
+            level = data.get('consistency', 'QUORUM').upper()
+            raw_items = data.get('items') or []
+            if not raw_items:
+                return jsonify({"error": "Missing items in request"}), 400
+
+            items, response, timestamp = self.parse_batch_write(raw_items)
+            required_w = self.get_required_quorum_size(level, 'write')
+            with self.metrics.timer("quorum_wait_seconds", op="mput", level=level):
+                results = self.write_batch_to_peers(
+                    items, required_w, on_late_result=self.late_batch_write_handler(items, timestamp)
+                ) if items else {}
+            payload, status = self.resolve_batch_write(items, timestamp, level, required_w, results, response)
+            return jsonify(payload), status
+
+        @self.app.route('/scan', methods=['GET'])
+        def client_scan():
+            """
+            Recorrido ordenado por rango o prefijo: ?start=&end=&prefix=&limit=&consistency=.
+            Si hay más claves, la respuesta trae `continuation` para pedir la página siguiente.
+            """
+            level = request.args.get('consistency', 'QUORUM').upper()
+            try:
+                start, end, limit = self.parse_scan(request.args)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            required_r = self.get_required_quorum_size(level, 'read')
+            with self.metrics.timer("quorum_wait_seconds", op="scan", level=level):
+                responses = self.scan_from_peers(start, end, limit)
+            payload, status = self.resolve_scan(level, required_r, limit, responses)
+            return jsonify(payload), status
+
+        @self.app.route('/metrics', methods=['GET'])
+        def metrics():
+            """Latencias por ruta y por par, espera de quórum, Read Repair, hints y fallos por nivel (?format=prometheus)."""
+            if request.args.get('format') == 'prometheus':
+                return self.metrics_view(prometheus=True), 200, {"Content-Type": "text/plain; version=0.0.4"}
+            return jsonify(self.metrics_view())
+
+        @self.app.route('/heartbeat', methods=['GET'])
+        def heartbeat():
+            """Endpoint interno: respuesta mínima usada por el detector de fallos de los pares."""
+            return jsonify({"node_id": self.node_id, "port": self.port})
+
+        @self.app.route('/health', methods=['GET'])
+        def health():
+            """Tabla de salud de los pares según el detector phi-accrual (live/suspect/dead)."""
+            return jsonify({"node_id": self.node_id, "peers": self.failure_detector.table(), "read_latency": self.latency.table()})
+
+        @self.app.route('/stats', methods=['GET'])
+        def stats():
+            """Memoria del almacenamiento local: bytes por clave, total y valores movidos a disco."""
+            return jsonify(self.storage_stats())
+
+        @self.app.route('/bootstrap', methods=['GET', 'POST'])
+        def bootstrap():
+            """
+            GET: progreso y throughput del bootstrap. POST: lo inicia ({"sources": [puertos]}
+            opcional; por defecto los pares activos).
+            """
+            if request.method == 'POST':
+                payload, status = self.start_bootstrap((request.get_json(silent=True) or {}).get('sources'))
+            else:
+                payload, status = self.bootstrap_status()
+            return jsonify(payload), status
+
+        @self.app.route('/bootstrap/snapshot', methods=['GET'])
+        def bootstrap_snapshot():
+            """Endpoint interno: trozo del snapshot para un nodo en bootstrap (ver snapshot_chunk)."""
+            sources = [int(port) for port in request.args.get('sources', '').split(',') if port]
+            payload = self.snapshot_chunk(int(request.args['target']), sources, request.args.get('after'),
+                                          int(request.args.get('limit', BOOTSTRAP_CHUNK_SIZE)))
+            return jsonify(payload)
+
+        # --- Rutas Internas de Anti-Entropía ---
+        @self.app.route('/anti_entropy/hashes', methods=['POST'])
+        def anti_entropy_hashes():
+            """Endpoint interno: hashes de los nodos pedidos del árbol compartido con el par solicitante."""
+            data = request.json
+            return jsonify({"hashes": self.merkle.hashes_for(data["peer"], data["indices"])})
+
+        @self.app.route('/anti_entropy/bucket', methods=['POST'])
+        def anti_entropy_bucket():
+            """Endpoint interno: intercambio de las claves de los buckets distintos (ver anti_entropy_exchange)."""
+            data = request.json
+            return jsonify(self.anti_entropy_exchange(data["peer"], data["buckets"]))
 
         # --- Rutas Internas (para comunicación entre Nodos) ---
         @self.app.route('/read_request/<key>', methods=['GET'])
         def read_request(key):
             """Endpoint interno para solicitudes de lectura de otros nodos (Devuelve valor local)."""
-            with self.lock:
-                if key in self.data:
-                    return jsonify({
-                        "key": key,
-                        "value": self.data[key],
-                        "timestamp": self.timestamps.get(key, 0)
-                    })
-                else:
-                    return jsonify({"error": "Key not found"}), 404
+            payload, status = self.local_read(key, digest=request.args.get('digest') == '1')
+            return jsonify(payload), status
         
         @self.app.route('/write_request', methods=['POST'])
         def write_request():
             """Endpoint interno para solicitudes de escritura de otros nodos (Actualiza valor local)."""
-            data = request.json
-            key = data.get('key')
-            value = data.get('value')
-            timestamp = data.get('timestamp', 0)
-            
-            if not key or not value:
-                 return jsonify({"status": "error", "message": "Missing key/value"}), 400
-            
-            with self.lock:
-                current_timestamp = self.timestamps.get(key, 0)
-                
-                # Solo actualizar si el timestamp es más reciente
-                if timestamp > current_timestamp:
-                    self.data[key] = value
-                    self.timestamps[key] = timestamp
-                    return jsonify({"status": "success"})
-                else:
-                    # Indica que el nodo no fue actualizado porque tenía una versión más nueva o igual
-                    return jsonify({"status": "outdated"}) 
+            payload, status = self.local_write(request.json)
+            return jsonify(payload), status
+
+        @self.app.route('/scan_request', methods=['GET'])
+        def scan_request():
+            """Endpoint interno: primeras claves locales de un rango (ver local_scan)."""
+            limit = int(request.args.get('limit', SCAN_DEFAULT_LIMIT))
+            return jsonify(self.local_scan(request.args.get('start'), request.args.get('end'), limit))
+
+        @self.app.route('/read_request_batch', methods=['POST'])
+        def read_request_batch():
+            """Endpoint interno: devuelve los valores locales de varias claves (las ausentes se omiten)."""
+            return jsonify(self.local_read_batch(request.json.get('keys', [])))
+
+        @self.app.route('/write_request_batch', methods=['POST'])
+        def write_request_batch():
+            """Endpoint interno: aplica varias escrituras (Last-Writer-Wins por clave) y responde el estado de cada una."""
+            return jsonify(self.local_write_batch(request.json.get('items', [])))
 
     
-    def read_from_peers(self, key):
-        """Solicita el valor de una clave a todos los nodos (local + pares)."""
+    def gather_until(self, tasks, on_result, is_done, on_late_result=None, normalize=None, hedge=None):
+        """
+        Ejecuta en paralelo las solicitudes a los pares ({puerto: función}), entrega cada respuesta
+        a `on_result(puerto, resultado)` y deja de esperar cuando `is_done(puertos_pendientes)` es verdadero.
+        Las solicitudes pendientes siguen en segundo plano y su resultado se entrega a `on_late_result`.
+        Con un HedgePlan, las réplicas lentas o que fallan se cubren con sus reservas, y los puertos
+        pasados a `is_done` incluyen las reservas aún no lanzadas.
+        """
+        normalize = normalize or (lambda port, result: result)
+        if not tasks:
+            return
+
+        # Executor compartido del nodo: los rezagados terminan por su cuenta (cada solicitud tiene su propio timeout)
+        future_to_port = {self.rpc_executor.submit(task): port for port, task in tasks.items()}
+
+        def result_of(future):
+            port = future_to_port[future]
+            try:
+                return normalize(port, future.result())
+            except Exception as e:
+                print(f"Error comunicando con nodo en puerto {port}: {e}")
+                return normalize(port, None)
+
+        pending = set(future_to_port)
+        pending_ports = lambda: {future_to_port[f] for f in pending}
+        reachable_ports = lambda launches=(): hedge.reachable(pending_ports(), launches) if hedge else pending_ports()
+
+        def launch(launches):
+            if launches and not is_done(reachable_ports(launches)):
+                for spare, replaced in launches:
+                    future = self.rpc_executor.submit(hedge.make_task(spare, replaced))
+                    future_to_port[future] = spare
+                    pending.add(future)
+
+        if hedge:
+            hedge.start(tasks.keys(), time.monotonic())
+        while pending and not is_done(reachable_ports()):
+            timeout = hedge.timeout(pending_ports(), time.monotonic()) if hedge else None
+            done, pending = concurrent.futures.wait(pending, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+            # Primero se cuentan todas las respuestas llegadas: una reserva solo se descarta si el
+            # quórum ya no la necesita, contando los aciertos que llegaron junto con el fallo
+            answered = [(future_to_port[future], result_of(future)) for future in done]
+            for port, result in answered:
+                on_result(port, result)
+            if hedge:
+                for port, result in answered:
+                    launch(hedge.on_result(port, result, pending_ports()))
+                launch(hedge.due(pending_ports(), time.monotonic()))
+
+        # Los rezagados alimentan Read Repair / Hinted Handoff cuando terminan
+        for future in pending:
+            future.add_done_callback(
+                lambda f: on_late_result(result_of(f)) if on_late_result else None
+            )
+
+    def quorum_tracker(self, required, is_ack):
+        """
+        Contabilidad del quórum de una operación individual: retorna (resultados, on_result, is_done)
+        para gather_until. Con `required=None` se espera a todos los pares.
+        """
+        results = []
+        acks = [0]
+
+        def on_result(port, result):
+            results.append(result)
+            if result is not None and is_ack(result):
+                acks[0] += 1
+
+        def is_done(pending_ports):
+            if required is None:
+                return False
+            return acks[0] >= required or acks[0] + len(pending_ports) < required
+
+        return results, on_result, is_done
+
+    def batch_quorum_tracker(self, keys_by_port, acks, required, is_ack):
+        """
+        Versión por lotes de quorum_tracker: cada par responde {key: resultado} para sus claves y
+        se termina cuando cada clave alcanzó `required` confirmaciones (partiendo de `acks`,
+        las confirmaciones locales) o ya no puede alcanzarlas.
+        """
+        results = {}
+
+        def on_result(port, batch_result):
+            for key, result in batch_result.items():
+                results.setdefault(key, []).append(result)
+                if result is not None and is_ack(result):
+                    acks[key] = acks.get(key, 0) + 1
+
+        def is_done(pending_ports):
+            pending_per_key = {}
+            for port in pending_ports:
+                for key in keys_by_port[port]:
+                    pending_per_key[key] = pending_per_key.get(key, 0) + 1
+            for key, pending in pending_per_key.items():
+                if acks.get(key, 0) < required and acks.get(key, 0) + pending >= required:
+                    return False
+            return True
+
+        return results, on_result, is_done
+
+    def collect_quorum(self, tasks, required, is_ack, on_late_result=None, normalize=None, hedge=None):
+        """
+        Ejecuta en paralelo las solicitudes a los pares ({puerto: función}) y retorna en cuanto
+        `required` respuestas cumplen `is_ack`, o cuando ya es imposible alcanzarlo.
+        Con `required=None` espera a todos los pares (comportamiento original).
+        """
+        results, on_result, is_done = self.quorum_tracker(required, is_ack)
+        self.gather_until(tasks, on_result, is_done, on_late_result, normalize, hedge)
+        return results
+
+    def collect_batch_quorum(self, tasks, keys_by_port, acks, required, is_ack, on_late_result=None, normalize=None):
+        """Versión por lotes de collect_quorum. Retorna {key: [resultados]}."""
+        results, on_result, is_done = self.batch_quorum_tracker(keys_by_port, acks, required, is_ack)
+        self.gather_until(tasks, on_result, is_done, on_late_result, normalize)
+        return results
+
+    def publish_read_outcome(self, late_state, chosen, valid_results):
+        """Registra el valor elegido por una lectura para que las respuestas tardías puedan repararse."""
+        with late_state["lock"]:
+            late_state["chosen"] = chosen
+            late_state["results"] = list(valid_results)
+            early_results = late_state.pop("early", [])
+        # Respuestas que llegaron entre el quórum y la elección del valor
+        for result in early_results:
+            self.handle_late_read(late_state, result)
+
+    def handle_late_read(self, late_state, result):
+        """Procesa una respuesta de lectura que llegó después de alcanzar el quórum (Read Repair tardío)."""
+        if not result or "error" in result:
+            return
+        with late_state["lock"]:
+            chosen = late_state["chosen"]
+            if chosen is None:
+                # El coordinador aún no eligió el valor; se procesa al publicarlo
+                late_state.setdefault("early", []).append(result)
+                return
+            if "value" not in result and result["timestamp"] > chosen["timestamp"]:
+                # Digest tardío más nuevo: sin su valor no se puede reparar, se pide en segundo plano
+                self.repair_executor.submit(self.refetch_late_read, late_state, result)
+                return
+            if result["timestamp"] > chosen["timestamp"]:
+                # La réplica tardía tiene una versión más nueva: pasa a ser la referencia
+                late_state["chosen"] = result
+            known_results = late_state["results"]
+            known_results.append(result)
+            chosen = late_state["chosen"]
+            known_results = list(known_results)
+
+        if chosen is result:
+            self.perform_read_repair(chosen, known_results)
+        else:
+            self.perform_read_repair(chosen, [result])
+
+    def start_read(self, key, required):
+        """
+        Parte local de una lectura: lee la copia local (si este nodo es réplica) y elige las
+        réplicas remotas a consultar. Retorna (resultados locales, puertos a contactar, reservas, quórum remoto).
+        """
         results = []
+        replicas = self.replicas_for(key)
         
-        # Leer del nodo local (siempre se incluye)
-        with self.lock:
-            if key in self.data:
-                results.append({
-                    "key": key,
-                    "value": self.data[key],
-                    "timestamp": self.timestamps.get(key, 0),
-                    "node_id": self.node_id
-                })
+        # Leer del nodo local (solo si es una de las réplicas de la clave)
+        entry = self.store.get(key) if self.port in replicas else None
+        if entry is not None:
+            results.append({
+                "key": key,
+                "value": entry[0],
+                "timestamp": entry[1],
+                "node_id": self.node_id
+            })
         
-        # Leer de los nodos pares en paralelo
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future_to_port = {
-                executor.submit(self.read_from_node, port, key): port
-                for port in self.peer_ports
-            }
-            
-            for future in concurrent.futures.as_completed(future_to_port):
-                port = future_to_port[future]
-                try:
-                    result = future.result()
-                    if result:
-                        results.append(result)
-                except Exception as e:
-                    print(f"Error leyendo de nodo en puerto {port}: {e}")
+        # Solo se consulta a las réplicas más rápidas necesarias para el quórum; el resto queda de reserva.
+        local_acks = sum(1 for r in results if "error" not in r)
+        remote_required = None if required is None else required - local_acks
+        contact, spares = self.plan_read_requests([port for port in replicas if port != self.port], remote_required)
+        return results, contact, spares, remote_required
+
+    def refetch_late_read(self, late_state, digest_result):
+        """Obtiene el valor de una réplica cuyo digest tardío resultó más nuevo y lo procesa como respuesta tardía."""
+        full = self.read_from_node(digest_result["node_id"], digest_result["key"])
+        if full and "error" not in full:
+            self.handle_late_read(late_state, full)
+
+    def plan_digest_read(self, results, contact):
+        """
+        Réplica a la que se le pide el valor completo en una lectura por digest: ninguna si la
+        copia local ya lo aportó, si no la primera a contactar (las activas van primero).
+        """
+        if any("value" in r for r in results) or not contact:
+            return None
+        return contact[0]
+
+    def pending_refetch(self, results):
+        """
+        Si la versión más nueva entre las respuestas solo llegó como digest, retorna esa respuesta
+        (hay que pedirle el valor a su réplica); None si ya se tiene el valor más nuevo.
+        """
+        valid = [r for r in results if r and "error" not in r]
+        if not valid:
+            return None
+        newest = max(valid, key=lambda r: r["timestamp"])
+        if "value" in newest:
+            return None
+        full = [r for r in valid if "value" in r and r["timestamp"] == newest["timestamp"]]
+        if full:
+            if value_digest(full[0]["value"]) != newest["digest"]:
+                # Mismo timestamp y distinto valor: Last-Writer-Wins no puede ordenarlos, se conserva el completo
+                self.metrics.inc("digest_conflicts_total")
+            return None
+        return newest
+
+    def resolve_digests(self, key, results):
+        """Reemplaza el digest más nuevo por su valor completo (una solicitud extra solo si hubo discrepancia)."""
+        while True:
+            stale = self.pending_refetch(results)
+            if stale is None:
+                return results
+            self.metrics.inc("digest_mismatches_total")
+            full = self.read_from_node(stale["node_id"], key)
+            # Si la réplica ya no responde, su digest deja de contar para el quórum
+            results = [r for r in results if r is not stale]
+            if full and "error" not in full:
+                results.append(full)
+
+    def read_from_peers(self, key, required=None, on_late_result=None, digest=False):
+        """
+        Solicita el valor de una clave a sus réplicas (lista de preferencia del anillo).
+        Si se indica `required`, retorna en cuanto esa cantidad de nodos respondió con el valor;
+        las respuestas posteriores se entregan a `on_late_result`.
+        """
+        results, contact, spares, remote_required = self.start_read(key, required)
+        data_port = self.plan_digest_read(results, contact) if digest else None
+        is_ack = lambda r: r is not None and "error" not in r
+        # Una reserva pide lo mismo que la réplica a la que reemplaza (valor completo o digest)
+        hedge = HedgePlan(
+            spares,
+            lambda spare, replaced: (lambda: self.read_from_node(spare, key, digest=digest and replaced != data_port)),
+            is_ack, self.latency, self.metrics, hedging=self.hedging
+        )
+        results.extend(self.collect_quorum(
+            {port: (lambda port=port: self.read_from_node(port, key, digest=digest and port != data_port)) for port in contact},
+            required=remote_required,
+            is_ack=is_ack,
+            on_late_result=on_late_result,
+            hedge=hedge
+        ))
         
-        return results
+        results = [r for r in results if r is not None]
+        return self.resolve_digests(key, results) if digest else results
     
-    def read_from_node(self, port, key):
-        """Lee una clave de un nodo específico."""
+    def read_from_node(self, port, key, digest=False):
+        """Lee una clave de un nodo específico (con `digest`, solo su timestamp y el hash del valor)."""
+        if self.binary is not None:
+            try:
+                status, data = self.binary.call(port, "read_request", [key, digest], timeout=3)
+            except TRANSPORT_ERRORS:
+                return None
+            if status == 200:
+                data["node_id"] = port
+                return data
+            return {"error": data, "node_id": port, "timestamp": 0}
         try:
             # Aumentamos el timeout para mayor fiabilidad
-            response = requests.get(f"http://localhost:{port}/read_request/{key}", timeout=3)
+            response = self.transport.get(port, f"/read_request/{key}", params={"digest": 1} if digest else None, timeout=3)
             if response.status_code == 200:
                 data = response.json()
                 data["node_id"] = port 
@@ -332,49 +1402,65 @@ class QuorumNode:
             # Retorna None si el nodo no está disponible (caído)
             return None 
     
-    def write_to_peers(self, key, value, timestamp):
-        """Escribe un valor en todos los nodos (local + pares)."""
+    def start_write(self, key, value, timestamp, required):
+        """
+        Parte local de una escritura: escribe la copia local (si este nodo es réplica) y elige las
+        réplicas remotas. Retorna (resultados locales, puertos a contactar, quórum remoto).
+        """
         results = []
+        replicas = self.replicas_for(key)
         
-        # 1. Escribir en el nodo local
-        with self.lock:
-            current_timestamp = self.timestamps.get(key, 0)
-            if timestamp > current_timestamp:
-                self.data[key] = value
-                self.timestamps[key] = timestamp
+        # 1. Escribir en el nodo local (solo si es una de las réplicas; si no, solo coordina)
+        if self.port in replicas:
+            if self.store.put(key, value, timestamp):
                 results.append({"status": "success", "node_id": self.node_id})
             else:
                 results.append({"status": "outdated", "node_id": self.node_id})
 
-        # 2. Escribir en los nodos pares en paralelo
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future_to_port = {
-                executor.submit(self.write_to_node, port, key, value, timestamp): port
-                for port in self.peer_ports
-            }
-            
-            for future in concurrent.futures.as_completed(future_to_port):
-                port = future_to_port[future]
-                try:
-                    result = future.result()
-                    if result:
-                        result["node_id"] = port
-                        results.append(result)
-                    else:
-                        # Si es None, el nodo no respondió (está caído), se registra como error para Hinted Handoff
-                        results.append({"status": "error", "node_id": port})
-                except Exception as e:
-                    print(f"Error escribiendo en nodo en puerto {port}: {e}")
-                    results.append({"status": "error", "node_id": port}) # Contar como fallo
+        # 2. Elegir las réplicas remotas: las sospechosas omitidas se registran como error para que reciban un hint.
+        local_acks = sum(1 for r in results if r.get("status") == "success")
+        remote_required = None if required is None else required - local_acks
+        contact, skipped = self.plan_peer_requests([port for port in replicas if port != self.port], remote_required)
+        results.extend({"status": "error", "node_id": port} for port in skipped)
+        return results, contact, remote_required
+
+    def write_to_peers(self, key, value, timestamp, required=None, on_late_result=None):
+        """
+        Escribe un valor en sus réplicas (lista de preferencia del anillo).
+        Si se indica `required`, retorna en cuanto hay esa cantidad de confirmaciones;
+        las respuestas posteriores se entregan a `on_late_result`.
+        """
+        results, contact, remote_required = self.start_write(key, value, timestamp, required)
+        results.extend(self.collect_quorum(
+            {port: (lambda port=port: self.write_to_node(port, key, value, timestamp)) for port in contact},
+            required=remote_required,
+            is_ack=lambda r: r.get("status") == "success",
+            on_late_result=on_late_result,
+            normalize=self.normalize_write_result
+        ))
 
         return results
     
+    def normalize_write_result(self, port, result):
+        """Agrega el puerto al resultado de escritura; None (nodo caído) se registra como error para Hinted Handoff."""
+        if result:
+            result["node_id"] = port
+            return result
+        return {"status": "error", "node_id": port}
+    
     def write_to_node(self, port, key, value, timestamp):
         """Escribe un valor en un nodo específico."""
+        if self.binary is not None:
+            try:
+                status, data = self.binary.call(port, "write_request", [{"key": key, "value": value, "timestamp": timestamp}], timeout=3)
+            except TRANSPORT_ERRORS:
+                return None
+            return data if status == 200 else {"status": "error", "message": data}
         try:
             # Aumentamos el timeout para mayor fiabilidad
-            response = requests.post(
-                f"http://localhost:{port}/write_request",
+            response = self.transport.post(
+                port,
+                "/write_request",
                 json={"key": key, "value": value, "timestamp": timestamp},
                 timeout=3
             )
@@ -386,8 +1472,203 @@ class QuorumNode:
         except requests.exceptions.RequestException:
             return None # El nodo está caído
     
-    def run(self):
-        self.app.run(host='0.0.0.0', port=self.port, debug=False, use_reloader=False)
+    # --- Operaciones por lotes (una solicitud por réplica para K claves) ---
+    def group_by_replica(self, keys, required):
+        """
+        Agrupa las claves por réplica a contactar: {puerto: [claves]}. Como en las operaciones
+        individuales, las réplicas sospechosas solo se incluyen si hacen falta para el quórum.
+        Retorna (keys_by_port, {key: [puertos omitidos]}).
+        """
+        keys_by_port = {}
+        skipped_by_key = {}
+        for key in keys:
+            replicas = self.replicas_for(key)
+            local = 1 if self.port in replicas else 0
+            contact, skipped = self.plan_peer_requests([p for p in replicas if p != self.port], required - local)
+            for port in contact + ([self.port] if local else []):
+                keys_by_port.setdefault(port, []).append(key)
+            if skipped:
+                skipped_by_key[key] = skipped
+        return keys_by_port, skipped_by_key
+
+    def start_batch_read(self, keys, required):
+        """
+        Parte local de una lectura por lotes. Retorna ({key: [resultados locales]},
+        confirmaciones locales por clave, {puerto remoto: [claves]}).
+        """
+        keys_by_port, _ = self.group_by_replica(keys, required)
+        results = {key: [] for key in keys}
+        acks = {}
+
+        for key in keys_by_port.pop(self.port, []):
+            entry = self.store.get(key)
+            if entry is not None:
+                results[key].append({"key": key, "value": entry[0], "timestamp": entry[1], "node_id": self.node_id})
+                acks[key] = 1
+        return results, acks, keys_by_port
+
+    def read_batch_from_peers(self, keys, required, on_late_result=None):
+        """Lee varias claves con una sola solicitud por réplica. Retorna {key: [resultados válidos y errores]}."""
+        results, acks, keys_by_port = self.start_batch_read(keys, required)
+        remote = self.collect_batch_quorum(
+            {port: (lambda port=port, port_keys=port_keys: self.read_batch_from_node(port, port_keys))
+             for port, port_keys in keys_by_port.items()},
+            keys_by_port, acks, required,
+            is_ack=lambda r: "error" not in r,
+            on_late_result=on_late_result,
+            normalize=lambda port, result: self.normalize_batch_read_result(port, keys_by_port[port], result)
+        )
+        for key, key_results in remote.items():
+            results[key].extend(r for r in key_results if r is not None)
+        return results
+
+    def read_batch_from_node(self, port, keys):
+        """Lee varias claves de un nodo específico en una sola solicitud."""
+        try:
+            response = self.transport.post(port, "/read_request_batch", json={"keys": keys}, timeout=3)
+            if response.status_code == 200:
+                return response.json()
+            return {"error": response.text}
+        except requests.exceptions.RequestException:
+            return None # El nodo está caído
+
+    def normalize_batch_read_result(self, port, keys, result):
+        """Convierte la respuesta de un lote en {key: resultado} (None por clave si el nodo está caído)."""
+        if result is None:
+            return {key: None for key in keys}
+        if "error" in result:
+            return {key: {"error": result["error"], "node_id": port, "timestamp": 0} for key in keys}
+        entries = result.get("entries", {})
+        normalized = {}
+        for key in keys:
+            if key in entries:
+                normalized[key] = {"key": key, "value": entries[key]["value"], "timestamp": entries[key]["timestamp"], "node_id": port}
+            else:
+                normalized[key] = {"error": "Key not found", "node_id": port, "timestamp": 0}
+        return normalized
+
+    def start_batch_write(self, items, required):
+        """
+        Parte local de una escritura por lotes ({key: (value, timestamp)}). Retorna
+        ({key: [resultados locales y réplicas omitidas]}, confirmaciones locales, {puerto remoto: [claves]}).
+        """
+        keys_by_port, skipped_by_key = self.group_by_replica(items.keys(), required)
+        results = {key: [{"status": "error", "node_id": port} for port in skipped_by_key.get(key, [])] for key in items}
+        acks = {}
+
+        for key in keys_by_port.pop(self.port, []):
+            value, timestamp = items[key]
+            if self.store.put(key, value, timestamp):
+                results[key].append({"status": "success", "node_id": self.node_id})
+                acks[key] = 1
+            else:
+                results[key].append({"status": "outdated", "node_id": self.node_id})
+        return results, acks, keys_by_port
+
+    def write_batch_to_peers(self, items, required, on_late_result=None):
+        """
+        Escribe varias claves ({key: (value, timestamp)}) con una sola solicitud por réplica.
+        Retorna {key: [resultados]}.
+        """
+        results, acks, keys_by_port = self.start_batch_write(items, required)
+        remote = self.collect_batch_quorum(
+            {port: (lambda port=port, port_keys=port_keys: self.write_batch_to_node(port, {k: items[k] for k in port_keys}))
+             for port, port_keys in keys_by_port.items()},
+            keys_by_port, acks, required,
+            is_ack=lambda r: r.get("status") == "success",
+            on_late_result=on_late_result,
+            normalize=lambda port, result: self.normalize_batch_write_result(port, keys_by_port[port], result)
+        )
+        for key, key_results in remote.items():
+            results[key].extend(key_results)
+        return results
+
+    def write_batch_to_node(self, port, items):
+        """Escribe varias claves en un nodo específico en una sola solicitud."""
+        try:
+            response = self.transport.post(
+                port,
+                "/write_request_batch",
+                json={"items": [{"key": k, "value": v, "timestamp": t} for k, (v, t) in items.items()]},
+                timeout=3
+            )
+            if response.status_code == 200:
+                return response.json()
+            return {"status": "error", "message": response.text}
+        except requests.exceptions.RequestException:
+            return None # El nodo está caído
+
+    def normalize_batch_write_result(self, port, keys, result):
+        """Convierte la respuesta de un lote en {key: resultado}; un nodo caído cuenta como error para Hinted Handoff."""
+        statuses = (result or {}).get("results", {})
+        return {key: {"status": statuses.get(key, "error"), "node_id": port} for key in keys}
+
+    # --- Recorridos por rango ---
+    def start_scan(self, start, end, limit):
+        """
+        Parte local de un scan. Como las claves están repartidas por todo el anillo, se consulta
+        a todos los pares activos. Retorna ({puerto: respuesta local}, puertos a contactar).
+        """
+        contact, _ = self.plan_peer_requests(self.peer_ports, 0)
+        return {self.port: self.local_scan(start, end, limit)}, contact
+
+    def scan_from_peers(self, start, end, limit):
+        """Recorre el rango en este nodo y en los pares activos; retorna {puerto: respuesta o None}."""
+        responses, contact = self.start_scan(start, end, limit)
+        self.gather_until(
+            {port: (lambda port=port: self.scan_from_node(port, start, end, limit)) for port in contact},
+            on_result=responses.__setitem__,
+            is_done=lambda pending_ports: False
+        )
+        return responses
+
+    def fetch_snapshot_chunk(self, source, after):
+        """Pide a `source` el trozo siguiente del snapshot de este nodo (None si no respondió)."""
+        sources = self.bootstrap.sources
+        try:
+            response = self.transport.get(source, "/bootstrap/snapshot", params={
+                "target": self.port, "sources": ",".join(map(str, sources)), "after": after, "limit": BOOTSTRAP_CHUNK_SIZE
+            }, timeout=10)
+            if response.status_code == 200:
+                chunk = response.json()
+                chunk["bytes"] = len(response.content)
+                return chunk
+        except requests.exceptions.RequestException:
+            pass
+        return None
+
+    def scan_from_node(self, port, start, end, limit):
+        try:
+            response = self.transport.get(port, "/scan_request", params={"start": start, "end": end, "limit": limit}, timeout=3)
+            if response.status_code == 200:
+                return response.json()
+            return {"error": response.text}
+        except requests.exceptions.RequestException:
+            return None # El nodo está caído
+
+    def run(self, bootstrap=False):
+        if bootstrap:
+            # Espera unos heartbeats para elegir como fuentes solo a los pares activos
+            self.start_bootstrap(delay=4 * self.heartbeat_interval)
+        try:
+            if self.binary is not None:
+                asyncio.run_coroutine_threadsafe(self.binary_server().start(), self.binary_loop).result()
+                print(f"[{self.node_id}] Protocolo binario entre nodos en el puerto {self.port + self.binary_port_offset}.")
+            if waitress_serve is not None:
+                # waitress mantiene las conexiones HTTP/1.1 abiertas, así los pares reutilizan su pool
+                waitress_serve(self.app, host='0.0.0.0', port=self.port, threads=self.server_threads)
+                return
+            print(f"[{self.node_id}] waitress no está instalado: usando el servidor de Flask (sin keep-alive entre nodos).")
+            self.app.run(host='0.0.0.0', port=self.port, debug=False, use_reloader=False)
+        finally:
+            self.close()
+
+    def close(self):
+        # Vuelca la memtable y cierra el WAL del motor durable (no-op en memoria)
+        self.store.close()
+        self.hint_store.close()
+        if self.binary is not None:
+            self.binary.close()
 
 def main():
     parser = argparse.ArgumentParser(description='Nodo con consistencia de quórum')
@@ -396,6 +1677,36 @@ def main():
     parser.add_argument('--peers', type=str, help='Puertos de los nodos pares (separados por comas)')
     parser.add_argument('--read-quorum', type=int, default=2, help='Tamaño del quórum de lectura (R)')
     parser.add_argument('--write-quorum', type=int, default=2, help='Tamaño del quórum de escritura (W)')
+    parser.add_argument('--pool-size', type=int, default=16, help='Conexiones persistentes máximas por par')
+    parser.add_argument('--rpc-workers', type=int, default=32, help='Hilos del executor compartido para comunicación entre nodos')
+    parser.add_argument('--replication-factor', type=int, help='Réplicas por clave (RF); por defecto todos los nodos')
+    parser.add_argument('--vnodes', type=int, default=64, help='Nodos virtuales por nodo en el anillo')
+    parser.add_argument('--anti-entropy-interval', type=float, default=10, help='Segundos entre rondas de anti-entropía (0 la desactiva)')
+    parser.add_argument('--heartbeat-interval', type=float, default=0.5, help='Segundos entre heartbeats a cada par')
+    parser.add_argument('--hints-dir', type=str, help='Directorio de los logs de hints (por defecto ./hints-node-<id>)')
+    parser.add_argument('--max-hint-mb', type=int, default=64, help='Tope de hints por nodo destino, en MB')
+    parser.add_argument('--max-hint-age', type=float, default=3 * 3600, help='Antigüedad máxima de un hint, en segundos')
+    parser.add_argument('--hint-rate', type=float, default=1000, help='Hints por segundo como máximo al entregar')
+    parser.add_argument('--read-mode', choices=['digest', 'full'], default='digest',
+                        help='digest: valor completo de una réplica y (timestamp, hash) de las demás; full: valor de todas')
+    parser.add_argument('--no-hedging', action='store_true', help='Desactiva las solicitudes hedge a réplicas de reserva en las lecturas')
+    parser.add_argument('--repair-kbps', type=float, default=1024, help='Presupuesto de Read Repair en KB/s (0 = sin límite)')
+    parser.add_argument('--tombstone-grace', type=float, default=3 * 3600,
+                        help='Segundos que se conservan las lápidas y los valores expirados antes de purgarlos')
+    parser.add_argument('--reap-interval', type=float, default=60, help='Segundos entre pasadas del reaper (0 lo desactiva)')
+    parser.add_argument('--storage', choices=['memory', 'lsm'], default='memory', help='Motor de almacenamiento local')
+    parser.add_argument('--data-dir', type=str, help='Directorio de datos del motor lsm (por defecto ./data-node-<id>)')
+    parser.add_argument('--memory-budget-mb', type=float,
+                        help='Motor memory: MB para claves y valores; por encima, los valores fríos se mueven a disco')
+    parser.add_argument('--spill-dir', type=str, help='Directorio de los valores fríos (por defecto ./spill-node-<id>)')
+    parser.add_argument('--transport', choices=['http', 'binary'], default='http',
+                        help='Transporte de read_request/write_request entre nodos (binary: frames binarios sobre TCP, ver binary_protocol.py)')
+    parser.add_argument('--binary-port-offset', type=int, default=10000,
+                        help='El protocolo binario escucha en el puerto HTTP + este desplazamiento')
+    parser.add_argument('--bootstrap', action='store_true',
+                        help='Al arrancar, copia el snapshot de las claves propias desde los pares activos (nodo nuevo o sin datos)')
+    parser.add_argument('--server', choices=['threaded', 'async'], default='threaded',
+                        help='threaded: Flask/waitress con un hilo por solicitud; async: asyncio + aiohttp (ver async_node.py)')
     
     args = parser.parse_args()
     
@@ -403,9 +1714,32 @@ def main():
     if args.peers:
         peer_ports = [int(p) for p in args.peers.split(',')]
     
+    node_class = QuorumNode
+    if args.server == 'async':
+        try:
+            from async_node import AsyncQuorumNode
+        except ImportError as e:
+            print(f"El modo async requiere aiohttp (pip install aiohttp): {e}")
+            return
+        node_class = AsyncQuorumNode
+
     try:
-        node = QuorumNode(args.id, args.port, peer_ports, args.read_quorum, args.write_quorum)
-        node.run()
+        if args.storage == 'memory':
+            storage = create_storage("memory", memory_budget=int(args.memory_budget_mb * 1024 * 1024) if args.memory_budget_mb else None,
+                                     spill_dir=args.spill_dir or f"spill-node-{args.id}")
+        else:
+            storage = create_storage(args.storage, data_dir=args.data_dir or f"data-node-{args.id}")
+        node = node_class(args.id, args.port, peer_ports, args.read_quorum, args.write_quorum,
+                          pool_size=args.pool_size, rpc_workers=args.rpc_workers, storage=storage,
+                          replication_factor=args.replication_factor, vnodes=args.vnodes,
+                          anti_entropy_interval=args.anti_entropy_interval, heartbeat_interval=args.heartbeat_interval,
+                          hints_dir=args.hints_dir, max_hint_bytes=args.max_hint_mb * 1024 * 1024,
+                          max_hint_age=args.max_hint_age, hint_rate=args.hint_rate,
+                          repair_bandwidth=int(args.repair_kbps * 1024), read_mode=args.read_mode,
+                          hedging=not args.no_hedging, transport=args.transport,
+                          binary_port_offset=args.binary_port_offset,
+                          tombstone_grace=args.tombstone_grace, reap_interval=args.reap_interval)
+        node.run(bootstrap=args.bootstrap)
     except ValueError as e:
         print(f"Error de configuración: {e}")
 
@@ -0,0 +1,133 @@
+# read_repair.py
+"""
+Cola de Read Repair en segundo plano para QuorumNode.
+
+Las lecturas solo encolan (réplica, clave, timestamp) y responden al cliente de inmediato:
+  - se deduplica por (clave, réplica, timestamp): una clave caliente desactualizada genera
+    una sola reparación aunque se lea miles de veces antes de que la reparación llegue,
+  - las reparaciones pendientes de una réplica se envían en lotes (una solicitud por lote),
+  - un token bucket compartido limita los bytes por segundo dedicados a reparaciones,
+  - la cola por réplica está acotada: lo que se descarta lo recupera la anti-entropía.
+"""
+import json
+import time
+import threading
+from collections import OrderedDict
+
+
+class ReadRepairQueue:
+    """
+    `send_batch(port, {key: (value, timestamp)})` envía un lote a una réplica y retorna la
+    respuesta de /write_request_batch ({"results": {key: estado}}) o None si la réplica no respondió.
+    """
+    def __init__(self, send_batch, executor, batch_size=100, bytes_per_second=1024 * 1024,
+                 max_pending_per_target=10000, recent_size=100000, metrics=None):
+        self.send_batch = send_batch
+        self.executor = executor
+        self.batch_size = batch_size
+        self.bytes_per_second = bytes_per_second
+        self.max_pending = max_pending_per_target
+        self.recent_size = recent_size
+        self.metrics = metrics
+        self.pending = {}            # {port: {key: (value, timestamp, bytes)}} en orden de llegada
+        self.draining = set()        # réplicas con un hilo enviando sus lotes
+        # Reparaciones ya enviadas o en curso {(port, key): timestamp}: evita repetirlas
+        # mientras las lecturas siguen viendo la versión vieja
+        self.recent = OrderedDict()
+        self.lock = threading.Lock()
+        self.tokens = bytes_per_second
+        self.last_refill = time.monotonic()
+        self.bucket_lock = threading.Lock()
+
+    def enqueue(self, port, key, value, timestamp):
+        """Encola una reparación; retorna False si era un duplicado o la cola de la réplica está llena."""
+        with self.lock:
+            target = self.pending.setdefault(port, {})
+            queued = target.get(key)
+            if self.recent.get((port, key), -1) >= timestamp or (queued and queued[1] >= timestamp):
+                self.count("read_repair_deduplicated_total", port)
+                return False
+            if queued is None and len(target) >= self.max_pending:
+                self.count("read_repair_dropped_total", port)
+                return False
+            target[key] = (value, timestamp, len(key) + len(json.dumps(value)))
+            start_drain = port not in self.draining
+            if start_drain:
+                self.draining.add(port)
+        if start_drain:
+            self.executor.submit(self.drain, port)
+        return True
+
+    def drain(self, port):
+        """Envía en lotes las reparaciones pendientes de una réplica hasta vaciar su cola."""
+        while True:
+            with self.lock:
+                target = self.pending.get(port, {})
+                keys = [key for key, _ in zip(target, range(self.batch_size))]
+                if not keys:
+                    self.draining.discard(port)
+                    return
+                batch = {key: target.pop(key) for key in keys}
+                for key, (_, timestamp, _) in batch.items():
+                    self.remember(port, key, timestamp)
+
+            size = sum(entry[2] for entry in batch.values())
+            self.throttle(size)
+            try:
+                result = self.send_batch(port, {key: (value, timestamp) for key, (value, timestamp, _) in batch.items()})
+            except Exception as e:
+                print(f"Error enviando Read Repair al nodo {port}: {e}")
+                result = None
+            if not result or "results" not in result:
+                # Réplica caída: se descarta su cola (Hinted Handoff y la anti-entropía la pondrán al día)
+                # y se olvidan las reparaciones para que una lectura posterior pueda reintentarlas
+                with self.lock:
+                    self.forget(port, batch)
+                    failed = len(batch) + len(self.pending.pop(port, {}))
+                    self.draining.discard(port)
+                self.count("read_repair_failed_total", port, failed)
+                return
+            statuses = result["results"]
+            repaired = sum(1 for status in statuses.values() if status == "success")
+            # Las claves que la réplica rechazó se olvidan para que una lectura posterior las reintente;
+            # 'outdated' sí queda recordada: la réplica ya tiene una versión igual o más nueva
+            rejected = {key: entry for key, entry in batch.items() if statuses.get(key) not in ("success", "outdated")}
+            if rejected:
+                with self.lock:
+                    self.forget(port, rejected)
+            self.count("read_repair_total", port, repaired)
+            self.count("read_repair_failed_total", port, len(rejected))
+            self.count("read_repair_bytes_total", port, size)
+
+    def forget(self, port, batch):
+        """Quita de las reparaciones recientes las de `batch` que no se reemplazaron mientras tanto (requiere self.lock)."""
+        for key, (_, timestamp, _) in batch.items():
+            if self.recent.get((port, key)) == timestamp:
+                del self.recent[(port, key)]
+
+    def remember(self, port, key, timestamp):
+        self.recent[(port, key)] = timestamp
+        self.recent.move_to_end((port, key))
+        if len(self.recent) > self.recent_size:
+            self.recent.popitem(last=False)
+
+    def throttle(self, size):
+        """Token bucket de bytes por segundo (ráfaga máxima: un segundo de presupuesto)."""
+        if not self.bytes_per_second:
+            return
+        with self.bucket_lock:
+            now = time.monotonic()
+            self.tokens = min(self.bytes_per_second, self.tokens + (now - self.last_refill) * self.bytes_per_second)
+            self.last_refill = now
+            self.tokens -= size
+            wait = -self.tokens / self.bytes_per_second if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+    def count(self, name, port, amount=1):
+        if self.metrics is not None and amount:
+            self.metrics.inc(name, amount, peer=port)
+
+    def pending_counts(self):
+        with self.lock:
+            return {port: len(target) for port, target in self.pending.items()}
@@ -0,0 +1,132 @@
+# replica_selection.py
+"""
+Selección adaptativa de réplicas y hedging de lecturas para QuorumNode.
+
+LatencyTracker mantiene por par un promedio móvil exponencial (EWMA) de la latencia de las
+lecturas y de su varianza; con ellos se ordenan las réplicas (las más rápidas primero) y
+se estima el p95 de cada par como media + 1.645 desviaciones.
+
+HedgePlan decide cuándo usar las réplicas de reserva de una lectura: si una réplica
+consultada no respondió al llegar a su p95 se envía una solicitud "hedge" a una reserva,
+y si responde con error o sin el valor se la reemplaza de inmediato.
+"""
+import math
+import time
+import threading
+
+
+class LatencyTracker:
+    def __init__(self, alpha=0.1, stale_after=10.0, default_delay=0.05, min_delay=0.002, max_delay=1.0):
+        self.alpha = alpha
+        # Un par sin muestras recientes vuelve a considerarse rápido para que se lo mida de nuevo
+        self.stale_after = stale_after
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.stats = {}          # {port: [media, varianza, última muestra]}
+        self.lock = threading.Lock()
+
+    def record(self, port, seconds):
+        now = time.monotonic()
+        with self.lock:
+            stats = self.stats.get(port)
+            if stats is None or now - stats[2] > self.stale_after:
+                self.stats[port] = [seconds, 0.0, now]
+                return
+            diff = seconds - stats[0]
+            increment = self.alpha * diff
+            stats[0] += increment
+            stats[1] = (1 - self.alpha) * (stats[1] + diff * increment)
+            stats[2] = now
+
+    def fresh_stats(self, port, now):
+        stats = self.stats.get(port)
+        if stats is None or now - stats[2] > self.stale_after:
+            return None
+        return stats
+
+    def order(self, ports):
+        """Ordena los pares por latencia media; los que no tienen muestras recientes van primero."""
+        now = time.monotonic()
+        with self.lock:
+            scores = {port: (self.fresh_stats(port, now) or [0.0])[0] for port in ports}
+        return sorted(ports, key=lambda port: scores[port])
+
+    def hedge_delay(self, port):
+        """p95 estimado de la latencia del par, acotado a [min_delay, max_delay]."""
+        with self.lock:
+            stats = self.fresh_stats(port, time.monotonic())
+            if stats is None:
+                return self.default_delay
+            p95 = stats[0] + 1.645 * math.sqrt(stats[1])
+        return min(self.max_delay, max(self.min_delay, p95))
+
+    def table(self):
+        now = time.monotonic()
+        with self.lock:
+            return {
+                port: {"ewma": round(stats[0], 6), "p95": round(stats[0] + 1.645 * math.sqrt(stats[1]), 6)}
+                for port, stats in self.stats.items() if now - stats[2] <= self.stale_after
+            }
+
+
+class HedgePlan:
+    """
+    Reservas de una lectura. `make_task(reserva, reemplazada)` crea la solicitud a la reserva;
+    los bucles de gather_until consultan al plan qué reservas lanzar y cuándo.
+    """
+    def __init__(self, spares, make_task, is_ack, tracker, metrics, hedging=True):
+        self.spares = list(spares)
+        self.make_task = make_task
+        self.is_ack = is_ack
+        self.tracker = tracker
+        self.metrics = metrics
+        self.hedging = hedging
+        self.deadlines = {}      # {puerto consultado: instante en que se cubre con una reserva}
+        self.hedges = {}         # {reserva: puerto cubierto}
+
+    def start(self, ports, now):
+        if self.hedging and self.spares:
+            self.deadlines = {port: now + self.tracker.hedge_delay(port) for port in ports}
+
+    def reachable(self, pending_ports, launches=()):
+        """
+        Puertos que aún pueden aportar al quórum: los pendientes, las reservas por lanzar y las que
+        aún no se lanzaron. Sin contar estas últimas, el primer fallo haría parecer inalcanzable el
+        quórum y nunca se probaría una reserva.
+        """
+        return set(pending_ports) | {spare for spare, _ in launches} | set(self.spares)
+
+    def timeout(self, pending_ports, now):
+        """Segundos hasta el próximo hedge (None: esperar sin límite)."""
+        if not self.spares:
+            return None
+        waiting = [self.deadlines[port] for port in pending_ports if port in self.deadlines]
+        return max(0.0, min(waiting) - now) if waiting else None
+
+    def due(self, pending_ports, now):
+        """Reservas a lanzar porque una réplica superó su p95: [(reserva, reemplazada)]."""
+        launches = []
+        for port in pending_ports:
+            deadline = self.deadlines.get(port)
+            if deadline is not None and deadline <= now and self.spares:
+                del self.deadlines[port]
+                spare = self.spares.pop(0)
+                self.hedges[spare] = port
+                self.metrics.inc("read_hedges_total", peer=port)
+                launches.append((spare, port))
+        return launches
+
+    def on_result(self, port, result, pending_ports):
+        """Registra una respuesta; si no sirve para el quórum se la reemplaza con una reserva."""
+        self.deadlines.pop(port, None)
+        acked = result is not None and self.is_ack(result)
+        replaced = self.hedges.get(port)
+        if acked and replaced is not None and replaced in pending_ports:
+            # El hedge respondió antes que la réplica lenta a la que cubría
+            self.metrics.inc("read_hedges_won_total", peer=replaced)
+        if not acked and self.spares:
+            spare = self.spares.pop(0)
+            self.metrics.inc("read_spare_requests_total", peer=port)
+            return [(spare, port)]
+        return []
@@ -0,0 +1,199 @@
+# storage_benchmark.py
+"""
+Compara el motor en memoria (DictStorage) con el motor durable (LSMStorage) de storage_engine.py.
+
+Mide escrituras concurrentes (donde el group commit agrupa los fsync), lecturas
+aleatorias y el tiempo de recuperación del motor durable al reabrirlo.
+
+Con --threads compara además, con una carga mixta de lecturas y escrituras desde varios hilos,
+el motor en memoria (lecturas sin lock y escrituras por franjas) con la versión anterior
+de un solo lock global (GlobalLockStorage). Ojo al interpretarla: con el GIL de CPython solo
+un hilo ejecuta bytecode a la vez, así que las franjas no agregan paralelismo; a lo sumo
+evitan que los hilos hagan cola en un mismo lock. Además DictStorage serializa cada registro
+(ver pack_record) y la referencia guarda el objeto tal cual, por lo que en un solo núcleo el
+motor por franjas suele medir menos operaciones por segundo que la referencia. Conviene
+repetir la corrida varias veces: la variación entre corridas es del 10-20%.
+
+Con --footprint mide con tracemalloc los bytes por clave del motor en memoria (registros
+compactos) frente a la representación anterior de dos diccionarios con el objeto JSON recibido.
+
+Uso:
+    python storage_benchmark.py --keys 20000 --writers 8 --value-size 256
+    python storage_benchmark.py --threads 1,4,16 --read-ratio 0.9 --ops 50000
+    python storage_benchmark.py --footprint --keys 200000
+"""
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import tracemalloc
+
+from storage_engine import DictStorage, LSMStorage
+
+
+class GlobalLockStorage:
+    """Referencia: motor en memoria con un solo lock para todas las lecturas y escrituras."""
+    def __init__(self):
+        self.data = {}
+        self.timestamps = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.data:
+                return self.data[key], self.timestamps.get(key, 0)
+            return None
+
+    def put(self, key, value, timestamp):
+        with self.lock:
+            if timestamp > self.timestamps.get(key, 0):
+                self.data[key] = value
+                self.timestamps[key] = timestamp
+                return True
+            return False
+
+
+def run_writes(store, keys, writers, value):
+    """Escribe `keys` claves repartidas entre `writers` hilos y retorna las operaciones por segundo."""
+    def writer(worker_id):
+        for i in range(worker_id, keys, writers):
+            store.put(f"key-{i:08d}", value, time.time())
+
+    threads = [threading.Thread(target=writer, args=(w,)) for w in range(writers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return keys / (time.perf_counter() - started)
+
+
+def run_reads(store, keys, reads):
+    """Lee claves aleatorias (90% existentes, 10% inexistentes para ejercitar el filtro de Bloom)."""
+    started = time.perf_counter()
+    for _ in range(reads):
+        if random.random() < 0.9:
+            store.get(f"key-{random.randrange(keys):08d}")
+        else:
+            store.get(f"missing-{random.randrange(keys)}")
+    return reads / (time.perf_counter() - started)
+
+
+def run_mixed(store, keys, threads, ops, read_ratio, value):
+    """
+    `threads` hilos ejecutan en total `ops` operaciones sobre claves aleatorias (`read_ratio` lecturas).
+    Retorna (operaciones por segundo, p99 de las lecturas en µs).
+    """
+    for i in range(keys):
+        store.put(f"key-{i:08d}", value, 1)
+    read_latencies = []
+
+    def worker(worker_id):
+        rng = random.Random(worker_id)
+        latencies = []
+        for _ in range(ops // threads):
+            key = f"key-{rng.randrange(keys):08d}"
+            if rng.random() < read_ratio:
+                started = time.perf_counter()
+                store.get(key)
+                latencies.append(time.perf_counter() - started)
+            else:
+                store.put(key, value, time.time())
+        read_latencies.extend(latencies)
+
+    workers = [threading.Thread(target=worker, args=(w,)) for w in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    read_latencies.sort()
+    p99 = read_latencies[int(len(read_latencies) * 0.99)] * 1e6 if read_latencies else 0
+    return (ops // threads) * threads / elapsed, p99
+
+
+def run_contention(args, value):
+    print(f"\nCarga mixta: {args.ops} operaciones, {args.read_ratio:.0%} lecturas, {args.keys} claves")
+    print(f"{'hilos':>6} {'motor':<12} {'ops/s':>12} {'p99 lectura':>14}")
+    for threads in [int(t) for t in args.threads.split(',')]:
+        for name, store in (("global-lock", GlobalLockStorage()), ("striped", DictStorage())):
+            ops, p99 = run_mixed(store, args.keys, threads, args.ops, args.read_ratio, value)
+            print(f"{threads:>6} {name:<12} {ops:>12.0f} {p99:>12.1f}µs")
+
+
+def run_footprint(args):
+    """Bytes por clave según tracemalloc, con valores como los de /put (un objeto JSON por clave)."""
+    document = json.dumps({"user": "user-0000", "score": 0, "tags": ["a", "b"], "bio": "x" * args.value_size})
+    print(f"\n{args.keys} claves, objetos JSON de {len(document)} bytes serializados")
+    print(f"{'motor':<14} {'bytes/clave':>12} {'total MB':>10}")
+    for name, factory in (("two-dicts", GlobalLockStorage), ("compact", DictStorage)):
+        tracemalloc.start()
+        store = factory()
+        for i in range(args.keys):
+            store.put(f"key-{i:08d}", json.loads(document), time.time())
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:<14} {size / args.keys:>12.0f} {size / 1e6:>10.1f}")
+        del store
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de motores de almacenamiento de QuorumNode')
+    parser.add_argument('--keys', type=int, default=20000, help='Número de claves a escribir')
+    parser.add_argument('--reads', type=int, default=20000, help='Número de lecturas aleatorias')
+    parser.add_argument('--writers', type=int, default=8, help='Hilos escritores concurrentes')
+    parser.add_argument('--value-size', type=int, default=256, help='Tamaño del valor en bytes')
+    parser.add_argument('--memtable-limit', type=int, default=5000, help='Claves por memtable del motor lsm')
+    parser.add_argument('--no-fsync', action='store_true', help='Desactiva fsync en el motor lsm')
+    parser.add_argument('--threads', type=str, help='Hilos de la carga mixta, separados por comas (p. ej. 1,4,16)')
+    parser.add_argument('--ops', type=int, default=200000, help='Operaciones totales de la carga mixta')
+    parser.add_argument('--read-ratio', type=float, default=0.9, help='Fracción de lecturas de la carga mixta')
+    parser.add_argument('--footprint', action='store_true', help='Mide la memoria por clave del motor en memoria')
+    args = parser.parse_args()
+
+    if args.footprint:
+        run_footprint(args)
+        return
+
+    value = "x" * args.value_size
+    if args.threads:
+        run_contention(args, value)
+        return
+    results = []
+
+    store = DictStorage()
+    write_ops = run_writes(store, args.keys, args.writers, value)
+    read_ops = run_reads(store, args.keys, args.reads)
+    results.append(("memory", write_ops, read_ops, None))
+
+    data_dir = tempfile.mkdtemp(prefix="lsm-bench-")
+    try:
+        store = LSMStorage(data_dir, memtable_limit=args.memtable_limit, fsync=not args.no_fsync)
+        write_ops = run_writes(store, args.keys, args.writers, value)
+        read_ops = run_reads(store, args.keys, args.reads)
+        store.close()
+
+        started = time.perf_counter()
+        store = LSMStorage(data_dir, memtable_limit=args.memtable_limit, fsync=not args.no_fsync)
+        recovery = time.perf_counter() - started
+        missing = sum(1 for i in range(0, args.keys, max(1, args.keys // 1000)) if store.get(f"key-{i:08d}") is None)
+        store.close()
+        if missing:
+            print(f"ERROR: {missing} claves no se recuperaron tras reabrir el motor lsm")
+        results.append(("lsm", write_ops, read_ops, recovery))
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(f"\n{args.keys} claves, {args.writers} escritores, valores de {args.value_size} bytes")
+    print(f"{'motor':<8} {'escrituras/s':>14} {'lecturas/s':>14} {'recuperación':>14}")
+    for name, write_ops, read_ops, recovery in results:
+        recovery_text = f"{recovery:.2f}s" if recovery is not None else "-"
+        print(f"{name:<8} {write_ops:>14.0f} {read_ops:>14.0f} {recovery_text:>14}")
+
+
+if __name__ == "__main__":
+    main()
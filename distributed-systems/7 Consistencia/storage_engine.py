@@ -0,0 +1,1153 @@
+# storage_engine.py
+"""
+Motores de almacenamiento local para QuorumNode.
+
+Todos los motores exponen la misma interfaz y aplican la regla Last-Writer-Wins
+por timestamp que usa `write_request`: una escritura solo se aplica si su
+timestamp es estrictamente mayor que el almacenado.
+
+    get(key)                     -> (value, timestamp) o None
+    put(key, value, timestamp)   -> True si se aplicó, False si estaba desactualizada
+    put_many(records)            -> cantidad aplicada de [(key, value, timestamp)] (carga masiva)
+    items()                      -> iterador ordenado de (key, value, timestamp)
+    scan(start, end, limit)      -> lista ordenada de (key, value, timestamp) con start <= key < end
+    purge_expired(now, grace)    -> elimina lápidas y valores expirados hace más de `grace` segundos
+    stats()                      -> memoria estimada del motor (bytes por clave, total, etc.)
+    add_listener(fn)             -> fn(key, old_timestamp, new_timestamp) tras cada escritura aplicada
+                                    (new_timestamp None: la clave se purgó)
+    close()
+
+Borrados y TTL: una lápida es una versión con valor None y un valor con TTL se guarda envuelto
+con su instante de expiración (ver with_ttl). Los motores las guardan y replican como cualquier
+otra versión, así un borrado gana por Last-Writer-Wins a las copias viejas; solo se purgan
+pasado el período de gracia, cuando ya tuvieron tiempo de llegar a todas las réplicas.
+"""
+import os
+import sys
+import json
+import time
+import heapq
+import bisect
+import struct
+import hashlib
+import threading
+
+
+EXPIRES_FIELD = "$expires_at"
+
+
+def with_ttl(value, expires_at):
+    """Valor con expiración: se guarda y replica así, y se desenvuelve al responder al cliente."""
+    return {EXPIRES_FIELD: expires_at, "value": value}
+
+
+def expires_at(value):
+    """Instante de expiración de un valor con TTL (None si no expira)."""
+    if isinstance(value, dict) and EXPIRES_FIELD in value:
+        return value[EXPIRES_FIELD]
+    return None
+
+
+def unwrap_value(value):
+    return value["value"] if expires_at(value) is not None else value
+
+
+def is_live(value, now):
+    """False para las lápidas y los valores ya expirados."""
+    if value is None:
+        return False
+    expiry = expires_at(value)
+    return expiry is None or expiry > now
+
+
+def dead_since(value, timestamp):
+    """Instante desde el que la versión deja de leerse (None si no expira)."""
+    return timestamp if value is None else expires_at(value)
+
+
+def is_purgeable(value, timestamp, horizon):
+    """Lápida o valor expirado antes de `horizon` (ya pasó su período de gracia)."""
+    since = dead_since(value, timestamp)
+    return since is not None and since < horizon
+
+
+# Registro compacto de DictStorage: [tipo (1 byte)][timestamp (double)][datos]
+#   JSON:     datos = valor en JSON compacto
+#   texto:    datos = valor string en UTF-8 (se decodifica sin pasar por el parser JSON)
+#   en disco: datos = [tipo del valor (1)][id de archivo (4)][offset (8)][largo (4)] (ver SpillFile)
+RECORD_HEADER = struct.Struct("<Bd")
+SPILL_RECORD = struct.Struct("<BdBIQI")
+RECORD_JSON = 0
+RECORD_SPILLED = 1
+RECORD_TEXT = 2
+
+# Al superar el presupuesto de memoria se mueven valores fríos hasta bajar a esta fracción
+SPILL_TARGET = 0.9
+# Registros más chicos no se mueven: el puntero ocuparía casi lo mismo
+SPILL_MIN_RECORD = 64
+SPILL_BATCH = 1000
+SPILL_REWRITE_MIN_BYTES = 16 * 1024 * 1024
+# Las claves usadas se recuerdan por ventanas de SPILL_INTERVAL segundos, hasta HOT_SET_LIMIT claves
+SPILL_INTERVAL = 10
+HOT_SET_LIMIT = 100000
+
+
+def pack_record(value, timestamp):
+    if isinstance(value, str):
+        return RECORD_HEADER.pack(RECORD_TEXT, timestamp) + value.encode("utf-8")
+    return RECORD_HEADER.pack(RECORD_JSON, timestamp) + json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def decode_value(kind, payload):
+    return payload.decode("utf-8") if kind == RECORD_TEXT else json.loads(payload)
+
+
+def unpack_record(record):
+    """(valor, timestamp) de un registro en memoria (no en disco)."""
+    kind, timestamp = RECORD_HEADER.unpack_from(record)
+    return decode_value(kind, record[RECORD_HEADER.size:]), timestamp
+
+
+def record_timestamp(record):
+    return RECORD_HEADER.unpack_from(record)[1]
+
+
+def pack_pointer(kind, timestamp, file_id, offset, length):
+    return SPILL_RECORD.pack(RECORD_SPILLED, timestamp, kind, file_id, offset, length)
+
+
+def spilled_file(pointer):
+    return SPILL_RECORD.unpack(pointer)[3]
+
+
+def spilled_length(pointer):
+    return SPILL_RECORD.unpack(pointer)[5]
+
+
+class StorageEngine:
+    """
+    Base común: registro de listeners notificados cuando se aplica una escritura, bajo el lock
+    que serializa las escrituras de esa clave (el del motor, o el de su franja en DictStorage).
+    """
+    def __init__(self):
+        self.listeners = []
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def notify(self, key, old_timestamp, new_timestamp):
+        for listener in self.listeners:
+            listener(key, old_timestamp, new_timestamp)
+
+
+class SortedKeyIndex:
+    """
+    Índice ordenado de claves: una lista de bloques ordenados de hasta `block_size` claves más
+    la última clave de cada bloque (un B-tree de dos niveles). Insertar o borrar cuesta
+    O(log n + block_size) y un rango se recorre en orden sin tocar las claves fuera de él.
+    """
+    def __init__(self, block_size=512):
+        self.block_size = block_size
+        self.blocks = []      # bloques no vacíos, ordenados entre sí
+        self.maxes = []       # última clave de cada bloque
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, key):
+        if not self.blocks:
+            self.blocks.append([key])
+            self.maxes.append(key)
+            self.size = 1
+            return
+        i = min(bisect.bisect_left(self.maxes, key), len(self.blocks) - 1)
+        block = self.blocks[i]
+        j = bisect.bisect_left(block, key)
+        if j < len(block) and block[j] == key:
+            return
+        block.insert(j, key)
+        self.maxes[i] = block[-1]
+        self.size += 1
+        if len(block) > self.block_size:
+            half = len(block) // 2
+            self.blocks[i:i + 1] = [block[:half], block[half:]]
+            self.maxes[i:i + 1] = [block[half - 1], block[-1]]
+
+    def discard(self, key):
+        i = bisect.bisect_left(self.maxes, key)
+        if i == len(self.blocks):
+            return
+        block = self.blocks[i]
+        j = bisect.bisect_left(block, key)
+        if j == len(block) or block[j] != key:
+            return
+        del block[j]
+        self.size -= 1
+        if block:
+            self.maxes[i] = block[-1]
+        else:
+            del self.blocks[i]
+            del self.maxes[i]
+
+    def irange(self, start=None, end=None):
+        """Claves con start <= key < end (None: sin límite), en orden."""
+        i = 0 if start is None else bisect.bisect_left(self.maxes, start)
+        for block in self.blocks[i:]:
+            j = 0 if start is None else bisect.bisect_left(block, start)
+            for key in block[j:]:
+                if end is not None and key >= end:
+                    return
+                yield key
+
+
+def newest_per_key(records):
+    """De registros ordenados por clave (con repeticiones) deja la versión de timestamp más nuevo."""
+    current = None
+    for key, value, timestamp in records:
+        if current is not None and current[0] != key:
+            yield current
+            current = None
+        if current is None or timestamp > current[2]:
+            current = (key, value, timestamp)
+    if current is not None:
+        yield current
+
+
+class DictStorage(StorageEngine):
+    """
+    Motor en memoria: un diccionario {key: registro} más un índice ordenado de las claves para
+    los recorridos por rango. Cada registro es un único objeto bytes (ver pack_record) con el
+    timestamp y el valor serializado en JSON compacto, en lugar de una tupla con un float y el
+    objeto JSON recibido: una clave cuesta su string, su entrada del diccionario y un bytes.
+
+    Cada escritura publica un registro nuevo en lugar de modificar el existente, y consultar o
+    reemplazar una entrada del diccionario es atómico: las lecturas no toman ningún lock y
+    siempre ven un par (valor, timestamp) coherente. Las escrituras solo toman el lock de la
+    franja de su clave (hash % `stripes`) para el compare-and-set de Last-Writer-Wins, así que
+    escrituras a claves de franjas distintas no se esperan entre sí. El índice ordenado tiene
+    su propio lock y solo se modifica al crear una clave.
+
+    Con `memory_budget` (bytes), cuando los registros superan el presupuesto un hilo en segundo
+    plano mueve los valores fríos (no leídos ni escritos desde la pasada anterior, como en el
+    algoritmo CLOCK) a un archivo en `spill_dir`, y en memoria queda solo un puntero. Leerlos
+    cuesta un pread; una escritura posterior los vuelve a traer a memoria. El archivo no es
+    durable: se descarta al reiniciar, como el resto del motor.
+    """
+    def __init__(self, stripes=64, memory_budget=None, spill_dir=None):
+        super().__init__()
+        self.entries = {}
+        self.index = SortedKeyIndex()
+        self.index_lock = threading.Lock()
+        self.stripes = [threading.Lock() for _ in range(stripes)]
+        # Uso por franja (se actualiza bajo el lock de la franja):
+        # [bytes de claves, bytes de registros, claves en disco, bytes en disco]
+        self.usage = [[0, 0, 0, 0] for _ in range(stripes)]
+
+        self.memory_budget = memory_budget
+        self.spill = None
+        if memory_budget:
+            if not spill_dir:
+                raise ValueError("El presupuesto de memoria requiere un directorio para los valores fríos (spill_dir).")
+            self.spill = SpillFile(spill_dir)
+            self.touched = set()          # claves usadas desde la última pasada del spiller
+            self.spill_needed = threading.Event()
+            threading.Thread(target=self.spill_loop, daemon=True).start()
+
+    def stripe_of(self, key):
+        return hash(key) % len(self.stripes)
+
+    def stripe(self, key):
+        return self.stripes[self.stripe_of(key)]
+
+    def get(self, key):
+        record = self.entries.get(key)
+        if record is None:
+            return None
+        if self.spill is None:
+            return unpack_record(record)
+        self.mark_used(key)
+        while True:
+            if record[0] != RECORD_SPILLED:
+                return unpack_record(record)
+            value = self.spill.read(record)
+            if value is not None:
+                return value
+            # El archivo se reescribió entre la lectura del puntero y el pread: se relee el puntero
+            record = self.entries.get(key)
+            if record is None:
+                return None
+
+    def replace(self, i, key, old, new):
+        """Publica `new` en lugar de `old` (None: clave nueva o purgada) y ajusta el uso de la franja."""
+        usage = self.usage[i]
+        if old is None:
+            usage[0] += sys.getsizeof(key)
+        else:
+            usage[1] -= sys.getsizeof(old)
+            if old[0] == RECORD_SPILLED:
+                usage[2] -= 1
+                usage[3] -= self.spill.release(old)
+        if new is None:
+            usage[0] -= sys.getsizeof(key)
+            del self.entries[key]
+            return
+        usage[1] += sys.getsizeof(new)
+        if new[0] == RECORD_SPILLED:
+            usage[2] += 1
+            usage[3] += spilled_length(new)
+        self.entries[key] = new
+
+    def put(self, key, value, timestamp):
+        i = self.stripe_of(key)
+        with self.stripes[i]:
+            record = self.entries.get(key)
+            old_timestamp = record_timestamp(record) if record is not None else None
+            if timestamp > (old_timestamp or 0):
+                if record is None:
+                    with self.index_lock:
+                        self.index.add(key)
+                self.replace(i, key, record, pack_record(value, timestamp))
+                self.notify(key, old_timestamp, timestamp)
+                applied = True
+            else:
+                applied = False
+        if applied and self.spill is not None:
+            self.mark_used(key)
+            self.check_budget()
+        return applied
+
+    def put_many(self, records):
+        """
+        Carga masiva: mismo Last-Writer-Wins por clave. Como en put, las claves nuevas se indexan
+        con el lock de su franja tomado, así purge_expired no puede desindexarlas en el medio.
+        """
+        applied = 0
+        for key, value, timestamp in records:
+            i = self.stripe_of(key)
+            with self.stripes[i]:
+                record = self.entries.get(key)
+                old_timestamp = record_timestamp(record) if record is not None else None
+                if timestamp <= (old_timestamp or 0):
+                    continue
+                if record is None:
+                    with self.index_lock:
+                        self.index.add(key)
+                self.replace(i, key, record, pack_record(value, timestamp))
+                self.notify(key, old_timestamp, timestamp)
+                applied += 1
+        if applied and self.spill is not None:
+            self.check_budget()
+        return applied
+
+    def items(self):
+        return iter(self.scan())
+
+    def purge_expired(self, now, grace):
+        """Recorre las entradas y elimina las purgables (rechequeadas bajo el lock de su franja)."""
+        horizon = now - grace
+        candidates = []
+        for key, record in list(self.entries.items()):
+            timestamp = record_timestamp(record)
+            # Las lápidas y los valores con TTL nunca van a disco: son pequeños y el reaper los revisa
+            if record[0] != RECORD_SPILLED and is_purgeable(unpack_record(record)[0], timestamp, horizon):
+                candidates.append(key)
+        purged = []
+        for key in candidates:
+            i = self.stripe_of(key)
+            with self.stripes[i]:
+                record = self.entries.get(key)
+                if record is None or record[0] == RECORD_SPILLED:
+                    continue
+                value, timestamp = unpack_record(record)
+                if not is_purgeable(value, timestamp, horizon):
+                    continue
+                self.replace(i, key, record, None)
+                # Bajo el lock de la franja: un put de la misma clave no puede volver a crearla entre
+                # el borrado y la salida del índice (quedaría fuera de scan y de los snapshots)
+                with self.index_lock:
+                    self.index.discard(key)
+                self.notify(key, timestamp, None)
+            purged.append(key)
+        return len(purged)
+
+    def scan(self, start=None, end=None, limit=None):
+        with self.index_lock:
+            keys = []
+            for key in self.index.irange(start, end):
+                if limit is not None and len(keys) >= limit:
+                    break
+                keys.append(key)
+        # Una clave recién indexada puede no estar publicada todavía: se omite
+        return [(key,) + entry for key, entry in ((key, self.get(key)) for key in keys) if entry is not None]
+
+    # --- Presupuesto de memoria ---
+    def memory_usage(self):
+        """Bytes de claves y registros (sin la tabla del diccionario ni el índice)."""
+        return sum(usage[0] + usage[1] for usage in self.usage)
+
+    def mark_used(self, key):
+        if len(self.touched) < HOT_SET_LIMIT:
+            self.touched.add(key)
+
+    def check_budget(self):
+        if self.memory_usage() > self.memory_budget:
+            self.spill_needed.set()
+
+    def spill_loop(self):
+        while True:
+            if not self.spill_needed.wait(SPILL_INTERVAL):
+                # Sin presión de memoria: empieza una ventana nueva de claves usadas
+                self.touched = set()
+                continue
+            self.spill_needed.clear()
+            try:
+                self.spill_cold()
+                if self.spill.needs_rewrite():
+                    self.rewrite_spill()
+            except Exception as e:
+                print(f"[storage] Error moviendo valores fríos a disco: {e}")
+            if self.memory_usage() > self.memory_budget:
+                # No queda nada que mover (claves y valores chicos): no se reintenta en cada escritura
+                print(f"[storage] El presupuesto de memoria ({self.memory_budget / 1e6:.1f} MB) no alcanza para "
+                      f"las claves y los valores chicos ({self.memory_usage() / 1e6:.1f} MB)")
+                time.sleep(SPILL_INTERVAL)
+
+    def spill_cold(self):
+        """
+        Mueve a disco valores fríos hasta bajar al `SPILL_TARGET` del presupuesto. Las claves usadas
+        desde la pasada anterior tienen una segunda oportunidad; si no alcanza, se mueven también.
+        """
+        target = self.memory_budget * SPILL_TARGET
+        touched, self.touched = self.touched, set()
+        moved = 0
+        for second_chance in (False, True):
+            candidates = [
+                (key, record) for key, record in list(self.entries.items())
+                if record[0] != RECORD_SPILLED and len(record) > SPILL_MIN_RECORD
+                and (second_chance or key not in touched)
+            ]
+            for offset in range(0, len(candidates), SPILL_BATCH):
+                if self.memory_usage() <= target:
+                    break
+                moved += self.spill_batch(candidates[offset:offset + SPILL_BATCH])
+            if self.memory_usage() <= target:
+                break
+        if moved:
+            print(f"[storage] {moved} valores fríos movidos a disco; en memoria: {self.memory_usage() / 1e6:.1f} MB "
+                  f"(presupuesto {self.memory_budget / 1e6:.1f} MB)")
+
+    def spill_batch(self, batch):
+        """Escribe un lote de registros en el archivo y publica sus punteros si no cambiaron entre tanto."""
+        pointers = self.spill.append([record for _, record in batch])
+        moved = 0
+        for (key, record), pointer in zip(batch, pointers):
+            i = self.stripe_of(key)
+            with self.stripes[i]:
+                if self.entries.get(key) is record:
+                    self.replace(i, key, record, pointer)
+                    moved += 1
+                else:
+                    self.spill.release(pointer)
+        return moved
+
+    def rewrite_spill(self):
+        """Copia los valores vivos a un archivo nuevo para recuperar el espacio de los reemplazados."""
+        spilled = [(key, record) for key, record in list(self.entries.items()) if record[0] == RECORD_SPILLED]
+        old_id = self.spill.rotate()
+        for offset in range(0, len(spilled), SPILL_BATCH):
+            batch = [(key, record) for key, record in spilled[offset:offset + SPILL_BATCH] if spilled_file(record) == old_id]
+            inline = [(key, self.spill.load(record)) for key, record in batch]
+            pointers = self.spill.append([record for _, record in inline])
+            for (key, record), pointer in zip(batch, pointers):
+                i = self.stripe_of(key)
+                with self.stripes[i]:
+                    if self.entries.get(key) is record:
+                        self.replace(i, key, record, pointer)
+                    else:
+                        self.spill.release(pointer)
+        self.spill.retire(old_id)
+
+    def stats(self):
+        """Memoria estimada del motor: claves, registros, tabla hash e índice ordenado."""
+        key_bytes = sum(usage[0] for usage in self.usage)
+        record_bytes = sum(usage[1] for usage in self.usage)
+        keys = len(self.entries)
+        table_bytes = sys.getsizeof(self.entries)
+        with self.index_lock:
+            index_bytes = sys.getsizeof(self.index.blocks) + sum(sys.getsizeof(block) for block in self.index.blocks)
+        total = key_bytes + record_bytes + table_bytes + index_bytes
+        stats = {
+            "engine": "memory",
+            "keys": keys,
+            "key_bytes": key_bytes,
+            "record_bytes": record_bytes,
+            "table_bytes": table_bytes,
+            "index_bytes": index_bytes,
+            "total_bytes": total,
+            "bytes_per_key": round(total / keys, 1) if keys else 0.0,
+        }
+        if self.spill is not None:
+            stats.update({
+                "memory_budget": self.memory_budget,
+                "spilled_keys": sum(usage[2] for usage in self.usage),
+                "spilled_bytes": sum(usage[3] for usage in self.usage),
+                "spill_file_bytes": self.spill.file_bytes(),
+            })
+        return stats
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close()
+
+
+class SpillFile:
+    """
+    Archivo append-only con los valores movidos a disco por DictStorage. Cada puntero indica
+    el archivo, el offset y el largo del valor; las lecturas usan os.pread sin lock. Cuando los
+    bytes de valores reemplazados superan a los vivos, el archivo se reescribe (rotate/retire):
+    el anterior se borra pero su descriptor sigue abierto hasta la siguiente reescritura, para
+    que un pread en curso con un puntero viejo no falle.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        # Los valores de una ejecución anterior ya no tienen punteros que los referencien
+        for name in os.listdir(directory):
+            if name.startswith("spill-") and name.endswith(".dat"):
+                os.remove(os.path.join(directory, name))
+        self.lock = threading.Lock()
+        self.fds = {}             # {id de archivo: descriptor} (el actual y, como mucho, uno retirado)
+        self.retired = None
+        self.live_bytes = 0
+        self.garbage_bytes = 0
+        self.current = None
+        self.next_id = 0
+        self.open_next()
+
+    def path(self, file_id):
+        return os.path.join(self.directory, f"spill-{file_id:06d}.dat")
+
+    def open_next(self):
+        file_id = self.next_id
+        self.next_id += 1
+        self.current = (file_id, open(self.path(file_id), "ab"))
+        self.fds[file_id] = os.open(self.path(file_id), os.O_RDONLY)
+        return file_id
+
+    def append(self, records):
+        """Escribe el valor serializado de cada registro en línea y retorna sus punteros."""
+        pointers = []
+        with self.lock:
+            file_id, f = self.current
+            offset = f.tell()
+            for record in records:
+                kind, timestamp = RECORD_HEADER.unpack_from(record)
+                payload = memoryview(record)[RECORD_HEADER.size:]
+                f.write(payload)
+                pointers.append(pack_pointer(kind, timestamp, file_id, offset, len(payload)))
+                offset += len(payload)
+                self.live_bytes += len(payload)
+            f.flush()
+        return pointers
+
+    def read(self, pointer):
+        """(valor, timestamp) del registro en disco, o None si su archivo ya se cerró."""
+        _, timestamp, kind, file_id, offset, length = SPILL_RECORD.unpack(pointer)
+        fd = self.fds.get(file_id)
+        if fd is None:
+            return None
+        try:
+            return decode_value(kind, os.pread(fd, length, offset)), timestamp
+        except OSError:
+            return None
+
+    def load(self, pointer):
+        """Registro en línea equivalente a un puntero (para reescribir el archivo)."""
+        _, timestamp, kind, file_id, offset, length = SPILL_RECORD.unpack(pointer)
+        return RECORD_HEADER.pack(kind, timestamp) + os.pread(self.fds[file_id], length, offset)
+
+    def release(self, pointer):
+        """Marca como basura el valor de un puntero reemplazado; retorna su largo."""
+        length = spilled_length(pointer)
+        with self.lock:
+            # La basura de un archivo ya rotado desaparece con él
+            if spilled_file(pointer) == self.current[0]:
+                self.live_bytes -= length
+                self.garbage_bytes += length
+        return length
+
+    def needs_rewrite(self):
+        return self.garbage_bytes > max(SPILL_REWRITE_MIN_BYTES, self.live_bytes)
+
+    def rotate(self):
+        """Empieza un archivo nuevo y retorna el id del anterior (sus punteros se copian al nuevo)."""
+        with self.lock:
+            old_id, f = self.current
+            f.close()
+            self.open_next()
+            # La basura del archivo viejo desaparece con él; los valores vivos se vuelven a contar al copiarlos
+            self.garbage_bytes = 0
+            self.live_bytes = 0
+        return old_id
+
+    def retire(self, file_id):
+        with self.lock:
+            if self.retired is not None:
+                os.close(self.fds.pop(self.retired))
+            self.retired = file_id
+        os.remove(self.path(file_id))
+
+    def file_bytes(self):
+        with self.lock:
+            return self.current[1].tell()
+
+    def close(self):
+        with self.lock:
+            self.current[1].close()
+            for fd in self.fds.values():
+                os.close(fd)
+            self.fds.clear()
+
+
+class BloomFilter:
+    """Filtro de Bloom simple (doble hashing sobre blake2b) para descartar segmentos sin la clave."""
+    def __init__(self, expected_items, bits_per_item=10, num_hashes=7):
+        self.size = max(64, expected_items * bits_per_item)
+        self.num_hashes = num_hashes
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def might_contain(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class Segment:
+    """
+    Archivo inmutable ordenado por clave (una línea JSON por registro).
+    En memoria solo se guarda un índice disperso (offset cada `index_interval` claves)
+    y el filtro de Bloom; las lecturas usan os.pread, por lo que son seguras entre hilos.
+    Quien lee con get() fuera del lock del motor toma una referencia (acquire/release): un
+    segmento borrado por la compactación cierra su descriptor cuando termina la última lectura.
+    """
+    def __init__(self, path, index_interval=16):
+        self.path = path
+        self.index_interval = index_interval
+        self.index_keys = []
+        self.index_offsets = []
+        self.count = 0
+        self.fd = None
+        self.size = 0
+        self.bloom = None
+        # Primer instante en que alguna versión del segmento dejó de leerse: sin él no hay nada que purgar
+        self.dead_since = None
+        self.readers = 0
+        self.retired = False
+        self.ref_lock = threading.Lock()
+        self.load()
+
+    @classmethod
+    def write(cls, path, records, index_interval=16):
+        """Escribe registros (key, value, timestamp) ya ordenados y retorna el segmento abierto."""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for key, value, timestamp in records:
+                f.write(json.dumps({"k": key, "v": value, "t": timestamp}).encode("utf-8") + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        # Rename atómico: un segmento a medio escribir nunca es visible tras un reinicio
+        os.replace(tmp_path, path)
+        return cls(path, index_interval)
+
+    def load(self):
+        """Reconstruye el índice disperso y el filtro de Bloom recorriendo el archivo una vez."""
+        index_keys = []
+        index_offsets = []
+        all_keys = []
+        earliest_dead = None
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                record = json.loads(line)
+                key = record["k"]
+                since = dead_since(record["v"], record["t"])
+                if since is not None and (earliest_dead is None or since < earliest_dead):
+                    earliest_dead = since
+                if len(all_keys) % self.index_interval == 0:
+                    index_offsets.append(offset)
+                    index_keys.append(key)
+                all_keys.append(key)
+                offset += len(line)
+        self.bloom = BloomFilter(len(all_keys))
+        for key in all_keys:
+            self.bloom.add(key)
+        self.count = len(all_keys)
+        self.index_keys = index_keys
+        self.index_offsets = index_offsets
+        self.size = offset
+        self.dead_since = earliest_dead
+        self.fd = os.open(self.path, os.O_RDONLY)
+
+    def get(self, key):
+        """Retorna (value, timestamp) o None."""
+        if not self.index_keys or not self.bloom.might_contain(key):
+            return None
+        block = bisect.bisect_right(self.index_keys, key) - 1
+        if block < 0:
+            return None
+        start = self.index_offsets[block]
+        end = self.index_offsets[block + 1] if block + 1 < len(self.index_offsets) else self.size
+        for line in os.pread(self.fd, end - start, start).splitlines():
+            record = json.loads(line)
+            if record["k"] == key:
+                return record["v"], record["t"]
+            if record["k"] > key:
+                break
+        return None
+
+    def scan(self, start=None):
+        """
+        Itera los registros con clave >= `start` en orden (empieza en el bloque del índice disperso
+        que la contiene). El archivo se abre en el momento de la llamada, así la iteración sigue
+        siendo válida aunque una compactación lo borre después.
+        """
+        f = open(self.path, "rb")
+        if start is not None and self.index_keys:
+            block = bisect.bisect_right(self.index_keys, start) - 1
+            f.seek(self.index_offsets[max(block, 0)])
+
+        def records():
+            with f:
+                for line in f:
+                    record = json.loads(line)
+                    if start is not None and record["k"] < start:
+                        continue
+                    yield record["k"], record["v"], record["t"]
+        return records()
+
+    def acquire(self):
+        with self.ref_lock:
+            self.readers += 1
+
+    def release(self):
+        with self.ref_lock:
+            self.readers -= 1
+            if self.retired and not self.readers:
+                self.close()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def delete(self):
+        """Borra el archivo; el descriptor sigue abierto hasta que terminen las lecturas en curso."""
+        os.remove(self.path)
+        with self.ref_lock:
+            self.retired = True
+            if not self.readers:
+                self.close()
+
+
+class LSMStorage(StorageEngine):
+    """
+    Motor log-structured y durable:
+      - WAL append-only con group commit (un solo fsync cubre todas las escrituras de la ventana).
+      - Memtable en memoria; al superar `memtable_limit` claves se congela y se vuelca a un segmento.
+      - Segmentos ordenados e inmutables con índice disperso y filtro de Bloom.
+      - Compactación en segundo plano cuando hay más de `max_segments` segmentos.
+      - Recuperación al arrancar: carga los segmentos y reproduce los WAL pendientes.
+    """
+    def __init__(self, data_dir, memtable_limit=10000, max_segments=4, sync_interval=0.002, fsync=True):
+        super().__init__()
+        self.data_dir = data_dir
+        self.memtable_limit = memtable_limit
+        self.max_segments = max_segments
+        self.sync_interval = sync_interval
+        self.fsync_enabled = fsync
+        os.makedirs(data_dir, exist_ok=True)
+
+        self.lock = threading.RLock()
+        self.memtable = {}            # {key: (value, timestamp)}
+        self.immutables = []          # memtables congeladas pendientes de volcar (más nueva al final)
+        self.immutable_wals = []      # WAL que cubre cada memtable congelada
+        self.segments = []            # segmentos en disco (más nuevo al final)
+        self.next_file_id = 0
+
+        # Group commit: los escritores esperan a que el hilo de commit haga fsync de su registro
+        self.wal_lock = threading.Lock()
+        self.commit_cond = threading.Condition(self.wal_lock)
+        self.written_seq = 0
+        self.durable_seq = 0
+        self.closed = False
+
+        self.flush_cond = threading.Condition(self.lock)
+        # Una sola compactación a la vez (las lanzan el hilo de volcado y el reaper)
+        self.compaction_lock = threading.Lock()
+        # Las compactaciones descartan las lápidas y valores expirados antes de este instante
+        self.purge_horizon = None
+        self.recover()
+
+        self.commit_thread = threading.Thread(target=self.commit_loop, daemon=True)
+        self.commit_thread.start()
+        self.flush_thread = threading.Thread(target=self.flush_loop, daemon=True)
+        self.flush_thread.start()
+
+    # --- Archivos ---
+    def file_path(self, prefix, file_id):
+        return os.path.join(self.data_dir, f"{prefix}-{file_id:08d}.{'log' if prefix == 'wal' else 'seg'}")
+
+    def list_files(self, prefix):
+        files = []
+        for name in os.listdir(self.data_dir):
+            if name.startswith(prefix + "-") and not name.endswith(".tmp"):
+                files.append((int(name.split("-")[1].split(".")[0]), os.path.join(self.data_dir, name)))
+        return sorted(files)
+
+    def open_wal(self):
+        path = self.file_path("wal", self.next_file_id)
+        self.next_file_id += 1
+        self.wal_path = path
+        self.wal_file = open(path, "ab")
+        return path
+
+    # --- Recuperación ---
+    def recover(self):
+        """Carga los segmentos existentes y reproduce los WAL que aún no se volcaron."""
+        for name in os.listdir(self.data_dir):
+            if name.endswith(".tmp"):
+                os.remove(os.path.join(self.data_dir, name))
+
+        for file_id, path in self.list_files("seg"):
+            self.segments.append(Segment(path))
+            self.next_file_id = max(self.next_file_id, file_id + 1)
+
+        recovered = 0
+        self.memtable_wals = []
+        for file_id, path in self.list_files("wal"):
+            self.next_file_id = max(self.next_file_id, file_id + 1)
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Registro truncado por una caída a mitad de escritura: se descarta la cola
+                        break
+                    self.apply_to_memtable(record["k"], record["v"], record["t"])
+                    recovered += 1
+            self.memtable_wals.append(path)
+
+        self.open_wal()
+        self.memtable_wals.append(self.wal_path)
+        if recovered or self.segments:
+            print(f"[storage] Recuperados {len(self.segments)} segmentos y {recovered} registros del WAL en {self.data_dir}")
+
+    # --- Lectura ---
+    def lookup(self, key):
+        """Busca la versión más reciente: memtable, memtables congeladas y segmentos (nuevo -> viejo)."""
+        with self.lock:
+            entry = self.memtable.get(key)
+            if entry is not None:
+                return entry
+            for immutable in reversed(self.immutables):
+                entry = immutable.get(key)
+                if entry is not None:
+                    return entry
+            segments = list(self.segments)
+            for segment in segments:
+                segment.acquire()
+        # Los segmentos son inmutables: se leen fuera del lock (con una referencia, así una
+        # compactación no les cierra el descriptor). Como put() solo acepta timestamps más
+        # nuevos, la primera coincidencia (del segmento más nuevo al más viejo) es la vigente.
+        try:
+            for segment in reversed(segments):
+                entry = segment.get(key)
+                if entry is not None:
+                    return entry
+            return None
+        finally:
+            for segment in segments:
+                segment.release()
+
+    def get(self, key):
+        return self.lookup(key)
+
+    def items(self):
+        """Vista combinada y ordenada de todas las claves (versión con timestamp más nuevo)."""
+        return self.iter_range()
+
+    def scan(self, start=None, end=None, limit=None):
+        entries = []
+        for entry in self.iter_range(start, end):
+            if limit is not None and len(entries) >= limit:
+                break
+            entries.append(entry)
+        return entries
+
+    def iter_range(self, start=None, end=None):
+        """Fusiona segmentos (desde `start`) y memtables (solo las claves del rango) por clave."""
+        in_range = lambda key: (start is None or key >= start) and (end is None or key < end)
+        with self.lock:
+            sources = [segment.scan(start) for segment in self.segments]
+            sources += [iter(sorted((k, v, t) for k, (v, t) in table.items() if in_range(k))) for table in self.immutables]
+            sources.append(iter(sorted((k, v, t) for k, (v, t) in self.memtable.items() if in_range(k))))
+        for entry in newest_per_key(heapq.merge(*sources, key=lambda item: item[0])):
+            if end is not None and entry[0] >= end:
+                return
+            yield entry
+
+    # --- Escritura ---
+    def apply_to_memtable(self, key, value, timestamp):
+        entry = self.memtable.get(key)
+        if entry is None or timestamp > entry[1]:
+            self.memtable[key] = (value, timestamp)
+
+    def put(self, key, value, timestamp):
+        with self.lock:
+            current = self.lookup(key)
+            if current is not None and timestamp <= current[1]:
+                return False
+            record = json.dumps({"k": key, "v": value, "t": timestamp}).encode("utf-8") + b"\n"
+            with self.wal_lock:
+                self.wal_file.write(record)
+                self.written_seq += 1
+                seq = self.written_seq
+            self.memtable[key] = (value, timestamp)
+            self.notify(key, current[1] if current is not None else None, timestamp)
+            if len(self.memtable) >= self.memtable_limit:
+                self.freeze_memtable()
+        self.wait_durable(seq)
+        return True
+
+    def put_many(self, records):
+        """Carga masiva: todos los registros van al WAL y se espera un solo group commit al final."""
+        applied = 0
+        seq = None
+        with self.lock:
+            for key, value, timestamp in records:
+                current = self.lookup(key)
+                if current is not None and timestamp <= current[1]:
+                    continue
+                record = json.dumps({"k": key, "v": value, "t": timestamp}).encode("utf-8") + b"\n"
+                with self.wal_lock:
+                    self.wal_file.write(record)
+                    self.written_seq += 1
+                    seq = self.written_seq
+                self.memtable[key] = (value, timestamp)
+                self.notify(key, current[1] if current is not None else None, timestamp)
+                applied += 1
+                if len(self.memtable) >= self.memtable_limit:
+                    self.freeze_memtable()
+        if seq is not None:
+            self.wait_durable(seq)
+        return applied
+
+    def wait_durable(self, seq):
+        """Bloquea hasta que el hilo de group commit haya hecho fsync del registro `seq`."""
+        with self.commit_cond:
+            self.commit_cond.notify_all()
+            while self.durable_seq < seq and not self.closed:
+                self.commit_cond.wait()
+
+    def commit_loop(self):
+        """Group commit: agrupa las escrituras de una ventana de `sync_interval` en un solo fsync."""
+        while True:
+            with self.commit_cond:
+                while self.written_seq == self.durable_seq and not self.closed:
+                    self.commit_cond.wait()
+                if self.closed and self.written_seq == self.durable_seq:
+                    return
+            time.sleep(self.sync_interval)
+            with self.commit_cond:
+                seq = self.written_seq
+                self.wal_file.flush()
+                # Se duplica el descriptor para hacer fsync sin bloquear a los escritores (y sin
+                # depender de que el WAL no se rote mientras tanto)
+                fd = os.dup(self.wal_file.fileno())
+            try:
+                if self.fsync_enabled:
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+            with self.commit_cond:
+                self.durable_seq = max(self.durable_seq, seq)
+                self.commit_cond.notify_all()
+
+    def freeze_memtable(self):
+        """Congela la memtable actual y rota el WAL; el volcado a disco ocurre en segundo plano."""
+        with self.wal_lock:
+            self.wal_file.flush()
+            if self.fsync_enabled:
+                os.fsync(self.wal_file.fileno())
+            self.durable_seq = self.written_seq
+            self.commit_cond.notify_all()
+            self.wal_file.close()
+            frozen_wals = self.memtable_wals
+            self.open_wal()
+            self.memtable_wals = [self.wal_path]
+        self.immutables.append(self.memtable)
+        self.immutable_wals.append(frozen_wals)
+        self.memtable = {}
+        self.flush_cond.notify_all()
+
+    # --- Volcado y compactación en segundo plano ---
+    def flush_loop(self):
+        while True:
+            with self.lock:
+                while not self.immutables and not self.closed:
+                    self.flush_cond.wait()
+                if self.closed and not self.immutables:
+                    return
+                table = self.immutables[0]
+                wals = self.immutable_wals[0]
+                file_id = self.next_file_id
+                self.next_file_id += 1
+
+            try:
+                segment = Segment.write(
+                    self.file_path("seg", file_id),
+                    sorted((k, v, t) for k, (v, t) in table.items())
+                )
+            except Exception as e:
+                # La memtable sigue congelada (y su WAL intacto): se reintenta el volcado
+                print(f"[storage] Error volcando la memtable a disco, se reintentará: {e}")
+                time.sleep(1)
+                continue
+            with self.lock:
+                self.segments.append(segment)
+                self.immutables.pop(0)
+                self.immutable_wals.pop(0)
+                needs_compaction = len(self.segments) > self.max_segments
+            try:
+                # El segmento ya es durable: los WAL que cubría se pueden borrar
+                for path in wals:
+                    if os.path.exists(path):
+                        os.remove(path)
+                if needs_compaction:
+                    self.compact()
+            except Exception as e:
+                # El hilo de volcado no debe morir: sin él las memtables congeladas se acumulan
+                print(f"[storage] Error tras el volcado de un segmento: {e}")
+
+    def purge_expired(self, now, grace):
+        """
+        Los segmentos son inmutables: la purga ocurre al compactar. Como la compactación fusiona
+        todos los segmentos, al descartar una lápida no queda ninguna versión anterior de la clave.
+        Las lápidas que siguen en la memtable se purgan en una compactación posterior.
+        """
+        self.purge_horizon = now - grace
+        with self.lock:
+            due = any(s.dead_since is not None and s.dead_since < self.purge_horizon for s in self.segments)
+        return self.compact(min_segments=1) if due else 0
+
+    def compact(self, min_segments=2):
+        """
+        Fusiona todos los segmentos en uno solo, conservando la versión más nueva (LWW) de cada clave
+        y descartando las purgables. Retorna cuántas claves se purgaron.
+        """
+        with self.compaction_lock:
+            return self.compact_segments(min_segments)
+
+    def compact_segments(self, min_segments):
+        """Cuerpo de compact (requiere self.compaction_lock): los segmentos se leen ya con el lock tomado."""
+        with self.lock:
+            to_merge = list(self.segments)
+            if len(to_merge) < min_segments:
+                return 0
+            file_id = self.next_file_id
+            self.next_file_id += 1
+
+        started = time.time()
+        horizon = self.purge_horizon
+        purged = []
+
+        def live_records():
+            for key, value, timestamp in newest_per_key(heapq.merge(*(s.scan() for s in to_merge), key=lambda item: item[0])):
+                if horizon is not None and is_purgeable(value, timestamp, horizon):
+                    purged.append((key, timestamp))
+                    continue
+                yield key, value, timestamp
+
+        new_segment = Segment.write(self.file_path("seg", file_id), live_records())
+        with self.lock:
+            # Los segmentos volcados durante la compactación se conservan después del nuevo
+            remaining = [s for s in self.segments if s not in to_merge]
+            self.segments = [new_segment] + remaining
+            # Solo se notifica la purga si ninguna versión más nueva quedó en memoria o en otro segmento
+            for key, timestamp in purged:
+                if self.lookup(key) is None:
+                    self.notify(key, timestamp, None)
+        for segment in to_merge:
+            segment.delete()
+        print(f"[storage] Compactación: {len(to_merge)} segmentos -> 1 ({new_segment.count} claves, "
+              f"{len(purged)} purgadas) en {time.time() - started:.2f}s")
+        return len(purged)
+
+    def stats(self):
+        """Memoria estimada de las memtables y de los índices y filtros de los segmentos, y tamaño en disco."""
+        with self.lock:
+            tables = [self.memtable] + list(self.immutables)
+            segments = list(self.segments)
+        memtable_keys = sum(len(table) for table in tables)
+        # Estimación superficial: clave, tupla, timestamp y el objeto del valor (sin sus hijos)
+        memtable_bytes = sum(
+            sys.getsizeof(table) + sum(sys.getsizeof(key) + sys.getsizeof(entry) + sys.getsizeof(entry[0]) + sys.getsizeof(entry[1])
+                                       for key, entry in list(table.items()))
+            for table in tables
+        )
+        index_bytes = sum(sys.getsizeof(s.index_keys) + sys.getsizeof(s.index_offsets)
+                          + sum(sys.getsizeof(key) for key in s.index_keys) for s in segments)
+        bloom_bytes = sum(len(s.bloom.bits) for s in segments)
+        segment_keys = sum(s.count for s in segments)
+        total = memtable_bytes + index_bytes + bloom_bytes
+        versions = memtable_keys + segment_keys
+        return {
+            "engine": "lsm",
+            "memtable_keys": memtable_keys,
+            "memtable_bytes": memtable_bytes,
+            "segments": len(segments),
+            "segment_keys": segment_keys,
+            "segment_file_bytes": sum(s.size for s in segments),
+            "index_bytes": index_bytes,
+            "bloom_bytes": bloom_bytes,
+            "total_bytes": total,
+            # Por versión guardada: una clave en la memtable y en un segmento cuenta dos veces
+            "bytes_per_key": round(total / versions, 1) if versions else 0.0,
+        }
+
+    def close(self):
+        """Vuelca todo a disco y cierra los archivos."""
+        with self.lock:
+            if self.memtable:
+                self.freeze_memtable()
+        with self.commit_cond:
+            self.closed = True
+            self.commit_cond.notify_all()
+        with self.lock:
+            self.flush_cond.notify_all()
+        self.flush_thread.join()
+        self.commit_thread.join()
+        with self.wal_lock:
+            self.wal_file.close()
+        for segment in self.segments:
+            segment.close()
+
+
+def create_storage(kind="memory", data_dir=None, **options):
+    """Crea el motor indicado: 'memory' (diccionarios) o 'lsm' (durable en `data_dir`)."""
+    if kind == "memory":
+        return DictStorage(**options)
+    if kind == "lsm":
+        if not data_dir:
+            raise ValueError("El motor 'lsm' requiere un directorio de datos (--data-dir).")
+        return LSMStorage(data_dir, **options)
+    raise ValueError(f"Motor de almacenamiento desconocido: '{kind}'")
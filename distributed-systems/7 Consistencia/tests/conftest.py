@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos del capítulo se importan entre sí por nombre (p. ej. `from merkle_tree import ...`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
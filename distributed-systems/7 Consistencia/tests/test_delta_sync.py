@@ -0,0 +1,23 @@
+from gossip_simulator import Network, SimulatedNode
+
+
+def make_nodes(count, **kwargs):
+    network = Network()
+    nodes = [SimulatedNode(network, i, 9000 + i, [], **kwargs) for i in range(1, count + 1)]
+    network.nodes = {node.port: node for node in nodes}
+    return nodes
+
+
+def test_all_mode_does_not_relay_received_versions():
+    a, b, c = make_nodes(3)
+    a.local_put("k", "x")
+    with b.lock:
+        assert b.merge_remote("k", a.entry("k"), a.port)
+    assert b.build_delta(0)["entries"] == {}
+
+    # Una fusión con hermanos es una versión nueva: sí se envía
+    b.local_put("j", "y")
+    c.local_put("j", "z")
+    with b.lock:
+        assert b.merge_remote("j", c.entry("j"), c.port)
+    assert set(b.build_delta(0)["entries"]) == {"j"}
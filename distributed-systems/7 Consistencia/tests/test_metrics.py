@@ -0,0 +1,23 @@
+import threading
+
+from metrics import SHARDS, Counter, Histogram
+
+
+def test_short_lived_threads_do_not_grow_the_shards():
+    counter, histogram = Counter(), Histogram()
+
+    def record():
+        for _ in range(100):
+            counter.add()
+            histogram.observe(0.001)
+
+    for _ in range(10):
+        threads = [threading.Thread(target=record) for _ in range(50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert counter.value() == 50000
+    assert histogram.summary()["count"] == 50000
+    assert len(counter.values.shards) == len(histogram.values.shards) == SHARDS
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from async_node import AsyncQuorumNode
+from quorum_consistency import QuorumNode
+
+# Puertos sin nada escuchando: los pares nunca responden a heartbeats ni a solicitudes reales
+COORDINATOR = 59100
+PEERS = [59101, 59102, 59103]
+
+
+@pytest.fixture(params=[QuorumNode, AsyncQuorumNode])
+def node(request, tmp_path):
+    return request.param(0, COORDINATOR, PEERS, read_quorum=2, write_quorum=2, replication_factor=3,
+                         anti_entropy_interval=0, reap_interval=0, hints_dir=str(tmp_path / "hints"))
+
+
+def key_not_owned_by(node):
+    return next(f"key-{i}" for i in range(1000) if node.port not in node.replicas_for(f"key-{i}"))
+
+
+@pytest.mark.parametrize("failure", [
+    None,                                                    # réplica caída que el detector aún no marcó
+    {"error": "Key not found", "timestamp": 0},              # réplica a la que le falta la clave
+])
+def test_spare_replica_completes_quorum_after_contacted_replica_fails(node, failure):
+    key = key_not_owned_by(node)
+    _, contact, spares, required = node.start_read(key, 2)
+    assert required == 2 and len(contact) == 2 and len(spares) == 1
+
+    # Falla la primera réplica consultada (el orden puede cambiar con lo que vea el detector de fallos)
+    calls = []
+
+    def read_from_node(port, key, digest=False):
+        calls.append(port)
+        if port == calls[0]:
+            return None if failure is None else dict(failure, node_id=port)
+        return {"key": key, "value": "v", "timestamp": 1.0, "node_id": port}
+
+    if isinstance(node, AsyncQuorumNode):
+        async def read_from_node_async(port, key, digest=False):
+            return read_from_node(port, key, digest)
+
+        node.read_from_node_async = read_from_node_async
+        results = asyncio.run(node.read_from_peers_async(key, required=2))
+    else:
+        node.read_from_node = read_from_node
+        results = node.read_from_peers(key, required=2)
+
+    acks = [r for r in results if "error" not in r]
+    assert len(acks) == 2
+    assert sorted(calls) == PEERS
+
+
+def test_anti_entropy_pushes_wanted_keys_in_batches(node):
+    node.anti_entropy_batch_size = 2
+    for i in range(5):
+        node.store.put(f"key-{i}", i, 1.0 + i)
+    node.merkle.hashes_for = lambda port, indices: ["distinto"] * len(indices)
+
+    class Response:
+        def __init__(self, body):
+            self.body = body
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return self.body
+
+    def post(port, path, json, timeout):
+        if path == "/anti_entropy/hashes":
+            return Response({"hashes": ["igual"] * len(json["indices"])})
+        return Response({"entries": [], "wanted": [f"key-{i}" for i in range(5)]})
+
+    batches = []
+
+    def write_batch_to_node(port, items):
+        batches.append(sorted(items))
+        return {"results": {key: "success" for key in items}}
+
+    node.transport.post = post
+    node.write_batch_to_node = write_batch_to_node
+    node.write_to_node = lambda *args: pytest.fail("anti-entropía envió una clave por solicitud")
+
+    assert node.run_anti_entropy(PEERS[0]) == (0, 5)
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert sorted(key for batch in batches for key in batch) == [f"key-{i}" for i in range(5)]
@@ -0,0 +1,36 @@
+from read_repair import ReadRepairQueue
+
+
+class DeferredExecutor:
+    """Guarda las tareas y las ejecuta al llamar a run(): el lote incluye todo lo encolado antes."""
+    def __init__(self):
+        self.tasks = []
+
+    def submit(self, fn, *args):
+        self.tasks.append((fn, args))
+
+    def run(self):
+        while self.tasks:
+            fn, args = self.tasks.pop(0)
+            fn(*args)
+
+
+def test_keys_rejected_by_the_replica_can_be_repaired_again():
+    sent = []
+
+    def send_batch(port, items):
+        sent.append(sorted(items))
+        return {"results": {"ok": "success", "stale": "outdated", "bad": "error"}}
+
+    executor = DeferredExecutor()
+    queue = ReadRepairQueue(send_batch, executor, bytes_per_second=0)
+    for key in ("ok", "stale", "bad"):
+        assert queue.enqueue(7002, key, "v", 1.0)
+    executor.run()
+    assert sent == [["bad", "ok", "stale"]]
+
+    assert not queue.enqueue(7002, "ok", "v", 1.0)
+    assert not queue.enqueue(7002, "stale", "v", 1.0)
+    assert queue.enqueue(7002, "bad", "v", 1.0)
+    executor.run()
+    assert sent[-1] == ["bad"]
@@ -0,0 +1,119 @@
+import time
+import threading
+
+from storage_engine import DictStorage, LSMStorage
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_concurrent_compactions_are_serialized(tmp_path):
+    store = LSMStorage(str(tmp_path), memtable_limit=50, max_segments=100, fsync=False)
+    for i in range(300):
+        store.put(f"key-{i:04d}", i, 1.0 + i)
+    assert wait_until(lambda: not store.immutables)
+    assert len(store.segments) >= 5
+
+    barrier = threading.Barrier(2)
+    errors = []
+
+    def compact():
+        barrier.wait()
+        try:
+            store.compact(min_segments=1)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=compact) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(store.segments) == 1
+    assert all(store.get(f"key-{i:04d}")[0] == i for i in range(300))
+    store.close()
+
+
+def test_flush_thread_survives_failed_compaction(tmp_path):
+    store = LSMStorage(str(tmp_path), memtable_limit=10, max_segments=1, fsync=False)
+    attempts = []
+
+    def failing_compact(min_segments=2):
+        attempts.append(min_segments)
+        raise OSError("disco lleno")
+
+    store.compact = failing_compact
+    for i in range(50):
+        store.put(f"key-{i:04d}", i, 1.0 + i)
+
+    assert wait_until(lambda: not store.immutables)
+    assert attempts
+    assert store.flush_thread.is_alive()
+    store.close()
+
+
+def test_purge_does_not_unindex_a_key_rewritten_concurrently():
+    store = DictStorage()
+    store.put("key", None, 1.0)         # lápida vieja, ya purgable
+    purger = threading.current_thread()
+    index_lock = store.index_lock
+    writers = []
+
+    class RacingIndexLock:
+        """Al sacar la clave del índice, otro hilo vuelve a escribirla (si el lock de su franja lo deja)."""
+        def __enter__(self):
+            if threading.current_thread() is purger and not writers:
+                writer = threading.Thread(target=store.put, args=("key", "nuevo", time.time()))
+                writers.append(writer)
+                writer.start()
+                writer.join(0.2)
+            index_lock.acquire()
+
+        def __exit__(self, *exc):
+            index_lock.release()
+
+    store.index_lock = RacingIndexLock()
+    assert store.purge_expired(time.time(), 0) == 1
+    writers[0].join()
+
+    assert store.get("key")[0] == "nuevo"
+    assert [key for key, _, _ in store.scan()] == ["key"]
+
+
+def test_read_in_progress_survives_compaction_of_its_segment(tmp_path):
+    store = LSMStorage(str(tmp_path), memtable_limit=50, max_segments=100, fsync=False)
+    for i in range(200):
+        store.put(f"key-{i:04d}", i, 1.0 + i)
+    assert wait_until(lambda: not store.immutables)
+    oldest = store.segments[0]
+
+    # La lectura queda detenida justo antes del pread mientras la compactación borra el segmento
+    reading, compacted = threading.Event(), threading.Event()
+    original_get = oldest.get
+
+    def slow_get(key):
+        reading.set()
+        compacted.wait(5)
+        return original_get(key)
+
+    oldest.get = slow_get
+    results = []
+    reader = threading.Thread(target=lambda: results.append(store.get("key-0000")))
+    reader.start()
+    assert reading.wait(5)
+    store.compact(min_segments=1)
+    assert oldest not in store.segments and oldest.fd is not None
+    compacted.set()
+    reader.join()
+
+    assert results == [(0, 1.0)]
+    assert oldest.fd is None
+    store.close()
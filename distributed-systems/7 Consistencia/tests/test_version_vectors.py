@@ -0,0 +1,82 @@
+from gossip_simulator import Network, SimulatedNode, simulate
+from version_vectors import VersionVector, VersionedValue
+
+
+def make_nodes(count, **kwargs):
+    network = Network()
+    nodes = [SimulatedNode(network, i, 9000 + i, [], **kwargs) for i in range(1, count + 1)]
+    network.nodes = {node.port: node for node in nodes}
+    return nodes
+
+
+def sync(source, target, key):
+    with target.lock:
+        return target.merge_remote(key, source.entry(key))
+
+
+def test_version_vector_wire_round_trip_and_dict_form():
+    vector = VersionVector.from_entries([(3, 7, 100), (1, 2, 50)])
+    assert VersionVector.from_wire(vector.to_wire()).entries() == [(1, 2, 50), (3, 7, 100)]
+    assert VersionVector.from_wire({"3": 7, "1": 2}) == vector
+    assert vector.descends(VersionVector.from_wire({"1": 2}))
+    assert not VersionVector.from_wire({"1": 2}).descends(vector)
+
+
+def test_concurrent_writes_become_siblings_until_a_covering_write():
+    a, b, c = make_nodes(3)
+    a.local_put("k", "x")
+    b.local_put("k", "y")
+    sync(a, b, "k")
+    sync(b, a, "k")
+    assert a.data["k"] == b.data["k"]
+    assert sorted(a.data["k"].values()) == ["x", "y"]
+
+    # Un cliente que leyó ambos hermanos escribe en c con ese contexto: los reemplaza
+    context = a.client_view(a.data["k"])["vector_clock"]
+    c.local_put("k", "z", context)
+    sync(c, a, "k")
+    assert a.data["k"].values() == ["z"]
+
+    # Una versión vieja recibida después no revive
+    assert not a.merge_remote("k", {"context": [1, 1, 0], "siblings": [[1, 1, "x"]]})
+
+
+def test_pruning_is_bounded_and_deterministic():
+    x = y = VersionedValue()
+    for writer in range(15):
+        x = x.update(x.context, writer, 1, writer, writer * 4000)
+    for writer in range(15, 25):
+        y = y.update(y.context, writer, 1, writer, writer * 4000)
+    merged_xy = x.merge(y).pruned(10, 3600)
+    merged_yx = y.merge(x).pruned(10, 3600)
+    assert merged_xy == merged_yx
+    assert len(merged_xy.context) == 10
+    # Las entradas que respaldan a un hermano vigente no se podan
+    assert {node for node, _ in merged_xy.dots()} <= set(merged_xy.context.counters())
+
+
+def test_write_after_own_entry_was_pruned_is_not_lost():
+    one, two, three, four = make_nodes(4, max_clock_entries=2, clock_prune_age=0)
+    one.local_put("k", "a")
+    sync(one, four, "k")               # four recuerda el dot (1, 1)
+
+    # Dos escritores más sobrescriben la clave; al fusionarlas, node 1 poda su propia entrada
+    sync(one, two, "k")
+    two.local_put("k", "b")
+    sync(two, one, "k")
+    sync(two, three, "k")
+    three.local_put("k", "c")
+    sync(three, one, "k")
+    assert one.data["k"].values() == ["c"]
+    assert one.node_id not in one.data["k"].context.counters()
+
+    one.local_put("k", "NEW-FROM-1")
+    assert sync(one, four, "k")
+    assert "NEW-FROM-1" in four.data["k"].values()
+
+
+def test_simulated_clusters_converge():
+    for mode in ("all", "gossip"):
+        result = simulate(10, mode, updates=30, fanout=3, rumor_limit=3, anti_entropy_every=5,
+                          gossip_interval=1.0, loss=0.0, max_rounds=50, seed=1)
+        assert result["converged"], mode
@@ -0,0 +1,183 @@
+# version_vectors.py
+"""
+Vectores de versión compactos y dotted version vectors para el Node de eventual_consistency.py.
+
+VersionVector guarda sus entradas (índice entero del nodo, contador, último segundo en que
+avanzó) empaquetadas en un único bytes de 16 bytes por entrada, ordenadas por nodo, en lugar
+de un diccionario con claves string. Es inmutable: las operaciones retornan vectores nuevos.
+
+VersionedValue es el estado de una clave como dotted version vector: un contexto causal
+(todo lo que la réplica ya vio) y los hermanos vigentes, cada uno con su "dot" (nodo,
+contador) que identifica exactamente la escritura que lo creó. Una escritura descarta los
+hermanos que su contexto cubre; al sincronizar, se conserva de cada lado lo que el contexto
+del otro no cubre. Así dos escrituras concurrentes quedan como hermanos sin falsos
+conflictos, y una escritura que vio a ambos los reemplaza.
+
+Poda: cuando un contexto supera `max_entries` entradas se descartan las de los nodos que
+llevan más tiempo sin escribir la clave (al menos `min_age` segundos antes que la entrada
+más reciente), salvo las que respaldan a un hermano vigente. La decisión depende solo del
+estado, así todas las réplicas podan igual. El costo es que una versión vieja de un escritor
+podado puede reaparecer como hermano (un falso conflicto).
+
+La poda no debe hacer que un escritor repita un dot: si su contador se calculara con el
+contexto de la clave, tras podar su entrada volvería a empezar en 1 y las réplicas que aún
+recuerdan la entrada darían por vista (y descartarían) la escritura nueva. Por eso `update`
+recibe el contador del dot y el Node lo toma de un contador propio para todas sus claves,
+que siempre supera a los dots que ya emitió.
+"""
+import json
+import struct
+
+ENTRY = struct.Struct("<IQI")     # nodo, contador, segundo de la última escritura
+
+
+class VersionVector:
+    __slots__ = ("packed",)
+
+    def __init__(self, packed=b""):
+        self.packed = packed
+
+    @classmethod
+    def from_entries(cls, entries):
+        """De [(nodo, contador, segundo)] en cualquier orden (sin nodos repetidos)."""
+        return cls(b"".join(ENTRY.pack(node, counter, stamp) for node, counter, stamp in sorted(entries)))
+
+    @classmethod
+    def from_wire(cls, wire):
+        """
+        Acepta la lista plana del protocolo entre nodos [nodo, contador, segundo, ...] o, como
+        envían los clientes, un diccionario {"nodo": contador}.
+        """
+        if not wire:
+            return cls()
+        if isinstance(wire, dict):
+            return cls.from_entries((int(node), int(counter), 0) for node, counter in wire.items())
+        return cls.from_entries(zip(wire[0::3], wire[1::3], wire[2::3]))
+
+    def entries(self):
+        return list(ENTRY.iter_unpack(self.packed))
+
+    def to_wire(self):
+        return [field for entry in ENTRY.iter_unpack(self.packed) for field in entry]
+
+    def to_dict(self):
+        """Forma legible para los clientes: {"nodo": contador}."""
+        return {str(node): counter for node, counter, _ in ENTRY.iter_unpack(self.packed)}
+
+    def __len__(self):
+        return len(self.packed) // ENTRY.size
+
+    def __eq__(self, other):
+        return isinstance(other, VersionVector) and self.counters() == other.counters()
+
+    def __hash__(self):
+        return hash(tuple(self.counters().items()))
+
+    def counters(self):
+        return {node: counter for node, counter, _ in ENTRY.iter_unpack(self.packed)}
+
+    def get(self, node):
+        for entry_node, counter, _ in ENTRY.iter_unpack(self.packed):
+            if entry_node == node:
+                return counter
+        return 0
+
+    def covers(self, dot):
+        return self.get(dot[0]) >= dot[1]
+
+    def descends(self, other):
+        """True si este vector vio todo lo que vio `other`."""
+        mine = self.counters()
+        return all(mine.get(node, 0) >= counter for node, counter, _ in ENTRY.iter_unpack(other.packed))
+
+    def merge(self, other):
+        merged = {node: (counter, stamp) for node, counter, stamp in ENTRY.iter_unpack(self.packed)}
+        for node, counter, stamp in ENTRY.iter_unpack(other.packed):
+            current = merged.get(node)
+            if current is None:
+                merged[node] = (counter, stamp)
+            else:
+                merged[node] = (max(current[0], counter), max(current[1], stamp))
+        return VersionVector.from_entries((node, counter, stamp) for node, (counter, stamp) in merged.items())
+
+    def advanced(self, node, counter, stamp):
+        """Vector con la entrada de `node` en `counter`."""
+        entries = {entry_node: (c, s) for entry_node, c, s in ENTRY.iter_unpack(self.packed)}
+        entries[node] = (counter, stamp)
+        return VersionVector.from_entries((n, c, s) for n, (c, s) in entries.items())
+
+    def pruned(self, max_entries, min_age, keep=()):
+        """Descarta las entradas más viejas si hay más de `max_entries` (ver el docstring del módulo)."""
+        if not max_entries or len(self) <= max_entries:
+            return self
+        entries = self.entries()
+        newest = max(stamp for _, _, stamp in entries)
+        candidates = sorted(
+            (stamp, node) for node, _, stamp in entries
+            if node not in keep and stamp <= newest - min_age
+        )
+        drop = {node for _, node in candidates[:len(entries) - max_entries]}
+        if not drop:
+            return self
+        return VersionVector.from_entries(entry for entry in entries if entry[0] not in drop)
+
+
+class VersionedValue:
+    """Estado de una clave: contexto causal y hermanos [(nodo, contador, valor)] ordenados por dot."""
+    __slots__ = ("context", "siblings")
+
+    def __init__(self, context=None, siblings=()):
+        self.context = context if context is not None else VersionVector()
+        self.siblings = tuple(siblings)
+
+    @classmethod
+    def from_wire(cls, wire):
+        return cls(VersionVector.from_wire(wire["context"]),
+                   sorted((node, counter, value) for node, counter, value in wire["siblings"]))
+
+    def to_wire(self):
+        return {"context": self.context.to_wire(), "siblings": [list(sibling) for sibling in self.siblings]}
+
+    def __eq__(self, other):
+        return isinstance(other, VersionedValue) and self.context == other.context and self.dots() == other.dots()
+
+    def dots(self):
+        return [(node, counter) for node, counter, _ in self.siblings]
+
+    def values(self):
+        return [value for _, _, value in self.siblings]
+
+    def winner(self):
+        """Valor a mostrar entre hermanos concurrentes: el del dot del nodo con el ID más alto."""
+        return self.siblings[-1][2] if self.siblings else None
+
+    def signature(self):
+        """Identifica la versión (contexto y dots, sin los segundos de la poda) para los árboles de Merkle."""
+        return json.dumps([sorted(self.context.counters().items()), self.dots()])
+
+    def update(self, client_context, node, counter, value, stamp):
+        """
+        Escritura coordinada por `node`: reemplaza los hermanos que `client_context` cubre y
+        agrega el valor nuevo con el dot (node, counter). `counter` debe superar a todos los dots
+        anteriores de `node` para esta clave, incluidos los que la poda ya olvidó.
+        """
+        survivors = [sibling for sibling in self.siblings if not client_context.covers(sibling[:2])]
+        context = self.context.merge(client_context).advanced(node, counter, stamp)
+        return VersionedValue(context, sorted(survivors + [(node, counter, value)]))
+
+    def merge(self, other):
+        """Sincronización: de cada lado sobreviven los hermanos que el otro tiene o que su contexto no cubre."""
+        theirs = set(other.dots())
+        mine = set(self.dots())
+        siblings = {
+            sibling[:2]: sibling for sibling in self.siblings
+            if sibling[:2] in theirs or not other.context.covers(sibling[:2])
+        }
+        for sibling in other.siblings:
+            if sibling[:2] not in siblings and (sibling[:2] in mine or not self.context.covers(sibling[:2])):
+                siblings[sibling[:2]] = sibling
+        return VersionedValue(self.context.merge(other.context), sorted(siblings.values()))
+
+    def pruned(self, max_entries, min_age):
+        context = self.context.pruned(max_entries, min_age, keep={node for node, _, _ in self.siblings})
+        return self if context is self.context else VersionedValue(context, self.siblings)